@@ -0,0 +1,321 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+
+import probe_cache
+import probe_memo
+import nvsmi_query
+from stats_util import welch_t
+
+# 数据库结构版本，结构变化时递增；打开由更新版本创建的数据库时报错
+SCHEMA_VERSION = 1
+
+CONFIG_FIELDS = ('host', 'gpu_uuid', 'driver', 'cuda', 'torch')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS configs (
+    id INTEGER PRIMARY KEY,
+    host TEXT NOT NULL,
+    gpu_uuid TEXT NOT NULL,
+    driver TEXT NOT NULL,
+    cuda TEXT NOT NULL,
+    torch TEXT NOT NULL,
+    UNIQUE (host, gpu_uuid, driver, cuda, torch)
+);
+CREATE INDEX IF NOT EXISTS configs_machine ON configs (host, gpu_uuid);
+CREATE TABLE IF NOT EXISTS metrics (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    higher_better INTEGER NOT NULL
+);
+-- 按 (指标, 配置, 时间) 聚簇存储，取某配置某指标最近N条记录只需一次范围扫描
+CREATE TABLE IF NOT EXISTS samples (
+    metric_id INTEGER NOT NULL,
+    config_id INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (metric_id, config_id, ts)
+) WITHOUT ROWID;
+"""
+
+
+def default_path():
+    """历史数据库的默认位置 (与检测结果缓存位于同一目录)"""
+    return os.path.join(probe_cache.cache_dir(), 'history.sqlite')
+
+
+def connect(path=None):
+    """打开 (必要时创建) 历史数据库
+
+    使用 WAL 模式，写入时不阻塞并发的查询；synchronous=NORMAL 在 WAL 下仍能保证数据库不损坏，
+    只是断电时可能丢失最后几次提交。
+    """
+    path = path or default_path()
+    if path != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    db = sqlite3.connect(path, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        db.close()
+        raise RuntimeError(f"历史数据库 {path} 由更新的版本创建 (结构版本 {version})")
+    db.executescript(_SCHEMA)
+    db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return db
+
+
+def _config_id(db, config):
+    values = tuple(str(config.get(field) or '') for field in CONFIG_FIELDS)
+    db.execute("INSERT OR IGNORE INTO configs (host, gpu_uuid, driver, cuda, torch) VALUES (?, ?, ?, ?, ?)", values)
+    return db.execute("SELECT id FROM configs WHERE host=? AND gpu_uuid=? AND driver=? AND cuda=? AND torch=?",
+                      values).fetchone()[0]
+
+
+def _metric_ids(db, names):
+    """{指标名: 是否越大越好} -> {指标名: id}"""
+    db.executemany("INSERT OR IGNORE INTO metrics (name, higher_better) VALUES (?, ?)",
+                   [(name, int(higher)) for name, higher in names.items()])
+    ids = {}
+    for name in names:
+        ids[name] = db.execute("SELECT id FROM metrics WHERE name=?", (name,)).fetchone()[0]
+    return ids
+
+
+def record(db, config, values, ts=None):
+    """写入一次运行的全部指标
+
+    values 为 {指标名: (数值, 是否越大越好)}；同一次运行的指标使用相同的时间戳，
+    并在一个事务中提交。
+    """
+    ts = time.time() if ts is None else ts
+    with db:
+        config_id = _config_id(db, config)
+        ids = _metric_ids(db, {name: higher for name, (_, higher) in values.items()})
+        db.executemany("INSERT OR REPLACE INTO samples (metric_id, config_id, ts, value) VALUES (?, ?, ?, ?)",
+                       [(ids[name], config_id, ts, float(value)) for name, (value, _) in values.items()
+                        if value is not None])
+    return len(values)
+
+
+def current_config(device='cuda', torch=None, timeout=None):
+    """当前机器的配置键: 主机名、GPU UUID、驱动、torch 内置的CUDA版本和torch版本
+
+    CPU 上的测试以 "cpu" 作为 GPU UUID；torch 为 None 时按需导入 (使用进程内缓存)。
+    """
+    if torch is None:
+        torch = probe_memo.import_module('torch')
+    records, _ = nvsmi_query.query_gpus(timeout)
+    config = {
+        'host': socket.gethostname(),
+        'gpu_uuid': 'cpu',
+        'driver': records[0].driver_version if records else '',
+        'cuda': getattr(torch.version, 'cuda', None) or '',
+        'torch': torch.__version__,
+    }
+    if str(device).startswith('cuda'):
+        index = int(str(device).partition(':')[2] or torch.cuda.current_device())
+        uuid = getattr(torch.cuda.get_device_properties(index), 'uuid', None)
+        if uuid is not None:
+            config['gpu_uuid'] = str(uuid) if str(uuid).startswith('GPU-') else f"GPU-{uuid}"
+        elif records and index < len(records):
+            config['gpu_uuid'] = records[index].uuid
+    return config
+
+
+def benchmark_values(results):
+    """把 compute_benchmark 的结果转换为指标: GFLOPS (越大越好)"""
+    return {f"matmul/{r['device'].split(':')[0]}/{r['dtype']}/{r['size']}/gflops": (r['gflops'], True)
+            for r in results if r.get('gflops') is not None}
+
+
+def record_benchmark(results, torch=None, path=None):
+    """保存一组矩阵乘法基准结果，返回写入的指标数"""
+    if not results:
+        return 0
+    config = current_config(results[0]['device'], torch)
+    db = connect(path)
+    try:
+        return record(db, config, benchmark_values(results))
+    finally:
+        db.close()
+
+
+def ingest_events(lines):
+    """读取 --format json/ndjson 输出的事件，返回 (配置, 指标)
+
+    各检测项耗时作为越小越好的指标；配置取自汇总事件和 nvidia_smi 检测项的数据，
+    其中CUDA版本与 record 一致，取torch内置的版本。
+    """
+    events = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        document = json.loads(line)
+        events.extend(document.get('probes', []) if document.get('event') == 'report' else [])
+        events.append(document)
+    config, values = {}, {}
+    for event in events:
+        if event.get('event') == 'probe':
+            if event.get('status') == 'ok':
+                values[f"probe/{event['tool']}/{event['probe']}/duration_ms"] = (event['duration_ms'], False)
+            config.setdefault('host', event.get('host'))
+            gpus = event['data'].get('gpus') if event.get('probe') == 'nvidia_smi' else None
+            if gpus:
+                config['gpu_uuid'] = gpus[0].get('uuid') or config.get('gpu_uuid')
+        elif event.get('event') in ('summary', 'report'):
+            data = event.get('data') or {}
+            config.update(host=event.get('host'), driver=data.get('driver'),
+                          cuda=data.get('torch_cuda'), torch=data.get('torch'))
+    config.setdefault('gpu_uuid', 'cpu')
+    return config, values
+
+
+def _machines(db, host=None):
+    """按 (主机, GPU) 分组的配置 id 列表"""
+    query = "SELECT id, host, gpu_uuid, driver, cuda, torch FROM configs"
+    rows = db.execute(query + (" WHERE host=?" if host else ""), (host,) if host else ()).fetchall()
+    machines = {}
+    for row in rows:
+        machines.setdefault((row[1], row[2]), {})[row[0]] = dict(zip(CONFIG_FIELDS, row[1:]))
+    return machines
+
+
+def compare(db, window=20, recent=3, alpha=0.01, min_change=0.05, same_config=False, host=None, metric=None):
+    """检查每台机器每个指标最近 recent 次运行相对其之前 window 次运行 (滚动基线) 是否显著退化
+
+    默认基线包含同一主机和GPU上的旧配置，以便发现驱动或torch升级引起的退化；
+    same_config 为真时只与完全相同的配置比较。退化需同时满足: Welch t 检验 p < alpha
+    且均值向不利方向变化超过 min_change。返回结果列表，每项含 regression 标志。
+    """
+    metrics = db.execute("SELECT id, name, higher_better FROM metrics" + (" WHERE name LIKE ?" if metric else ""),
+                         (metric,) if metric else ()).fetchall()
+    results = []
+    for (host_name, gpu_uuid), configs in sorted(_machines(db, host).items()):
+        groups = [[config_id] for config_id in configs] if same_config else [list(configs)]
+        for config_ids in groups:
+            marks = ",".join("?" * len(config_ids))
+            for metric_id, name, higher_better in metrics:
+                rows = db.execute(f"SELECT ts, value, config_id FROM samples WHERE metric_id=? AND config_id IN ({marks})"
+                                  " ORDER BY ts DESC LIMIT ?", (metric_id, *config_ids, recent + window)).fetchall()
+                if len(rows) < recent + 2:
+                    continue
+                candidate = [value for _, value, _ in rows[:recent]]
+                baseline = [value for _, value, _ in rows[recent:]]
+                if len(candidate) < 2 or len(baseline) < 2:
+                    continue
+                t, df, p = welch_t(candidate, baseline)
+                base_mean = sum(baseline) / len(baseline)
+                change = (sum(candidate) / len(candidate) - base_mean) / base_mean if base_mean else 0.0
+                worse = change < -min_change if higher_better else change > min_change
+                latest = configs[rows[0][2]]
+                changed = sorted({field for _, _, cid in rows[recent:] for field in CONFIG_FIELDS
+                                  if configs[cid][field] != latest[field]})
+                results.append({
+                    'host': host_name, 'gpu_uuid': gpu_uuid, 'metric': name, 'config': latest,
+                    'baseline_mean': base_mean, 'recent_mean': sum(candidate) / len(candidate),
+                    'change': change, 't': t, 'df': df, 'p': p,
+                    'baseline_runs': len(baseline), 'recent_runs': len(candidate),
+                    'changed_fields': changed,
+                    'regression': worse and p < alpha,
+                })
+    return results
+
+
+def format_result(result):
+    mark = "✗" if result['regression'] else "✓"
+    text = (f"{mark} {result['host']} {result['gpu_uuid']} {result['metric']}: "
+            f"{result['baseline_mean']:.4g} -> {result['recent_mean']:.4g} ({result['change']:+.1%}, p={result['p']:.2g})")
+    if result['regression'] and result['changed_fields']:
+        config = result['config']
+        text += " 基线之后配置有变化: " + ", ".join(f"{f}={config[f]}" for f in result['changed_fields'])
+    return text
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="保存基准测试和检测耗时的历史记录，并检测性能退化")
+    parser.add_argument("--db", metavar="PATH", help=f"历史数据库路径，默认 {default_path()}")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    bench = commands.add_parser("record", help="运行矩阵乘法基准测试并保存结果")
+    bench.add_argument("--device", default="cuda", help="测试设备，默认 cuda (不可用时改用 cpu)")
+    bench.add_argument("--sizes", type=int, nargs="+", default=[1024, 2048], help="矩阵边长列表")
+    bench.add_argument("--max-time", type=float, default=1.0, help="每个用例的最长计时时间 (秒)，默认 1")
+
+    ingest = commands.add_parser("ingest", help="导入 gpu_check/pytorch_version_check --format json|ndjson 的输出")
+    ingest.add_argument("files", nargs="*", help="输出文件，省略时读取标准输入")
+
+    check = commands.add_parser("compare", help="与滚动基线比较，报告显著的性能退化")
+    check.add_argument("--window", type=int, default=20, help="基线使用的历史运行次数，默认 20")
+    check.add_argument("--recent", type=int, default=3, help="参与比较的最近运行次数，默认 3")
+    check.add_argument("--alpha", type=float, default=0.01, help="显著性水平，默认 0.01")
+    check.add_argument("--min-change", type=float, default=0.05, help="视为退化的最小相对变化，默认 0.05")
+    check.add_argument("--same-config", action="store_true", help="只与完全相同的配置 (驱动/CUDA/torch) 比较")
+    check.add_argument("--host", help="只检查指定主机")
+    check.add_argument("--metric", help="只检查匹配的指标 (SQL LIKE 模式，如 matmul/%%)")
+    check.add_argument("--all", action="store_true", help="同时列出未退化的指标")
+    check.add_argument("--json", action="store_true", help="以JSON格式输出")
+
+    show = commands.add_parser("show", help="列出已记录的配置和指标")
+    show.add_argument("--host", help="只列出指定主机")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    if args.command == "record":
+        import compute_benchmark
+        torch = probe_memo.import_module('torch')
+        device = args.device if args.device == 'cpu' or torch.cuda.is_available() else 'cpu'
+        results = compute_benchmark.run_suite(device, sizes=args.sizes, max_time=args.max_time)
+        compute_benchmark.print_results(results)
+        count = record_benchmark(results, torch, args.db)
+        print(f"✓ 已保存 {count} 项指标到 {args.db or default_path()}")
+        return 0
+
+    db = connect(args.db)
+    try:
+        if args.command == "ingest":
+            total = 0
+            for name in args.files or ['-']:
+                stream = sys.stdin if name == '-' else open(name, encoding='utf-8')
+                with stream:
+                    config, values = ingest_events(stream)
+                total += record(db, config, values) if values else 0
+            print(f"✓ 已导入 {total} 项指标")
+            return 0
+        if args.command == "show":
+            for (host, gpu_uuid), configs in sorted(_machines(db, args.host).items()):
+                print(f"{host} {gpu_uuid}")
+                for config_id, config in configs.items():
+                    count, first, last = db.execute("SELECT COUNT(*), MIN(ts), MAX(ts) FROM samples WHERE config_id=?",
+                                                    (config_id,)).fetchone()
+                    span = (f"{time.strftime('%Y-%m-%d', time.localtime(first))} ~ "
+                            f"{time.strftime('%Y-%m-%d', time.localtime(last))}") if count else ""
+                    print(f"  - 驱动 {config['driver'] or '-'} CUDA {config['cuda'] or '-'} torch {config['torch'] or '-'}"
+                          f": {count} 条记录 {span}")
+            return 0
+
+        results = compare(db, args.window, args.recent, args.alpha, args.min_change,
+                          args.same_config, args.host, args.metric)
+    finally:
+        db.close()
+    regressions = [r for r in results if r['regression']]
+    if args.json:
+        print(json.dumps(results if args.all else regressions, ensure_ascii=False, indent=2))
+    else:
+        for result in results if args.all else regressions:
+            print(format_result(result))
+        print(f"共比较 {len(results)} 项指标，发现 {len(regressions)} 项显著退化")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+import os
+
+
+def read_text(path):
+    """读取文本文件并去掉首尾空白；文件不存在或无权读取时返回 None"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_paths(root="/", pid="self"):
+    """进程所在的 cgroup 路径 {控制器: 路径}，v2 的控制器记为空字符串
+
+    无法读取 /proc/PID/cgroup (如进程不在本PID命名空间中) 时返回空字典。
+    """
+    text = read_text(os.path.join(root, "proc", str(pid), "cgroup")) or ""
+    paths = {}
+    for line in text.splitlines():
+        parts = line.split(":", 2)
+        if len(parts) != 3:
+            continue
+        for controller in parts[1].split(","):
+            paths[controller] = parts[2]
+    return paths
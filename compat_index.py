@@ -0,0 +1,332 @@
+import sys
+import json
+import bisect
+import argparse
+import platform
+
+# 离线兼容性数据的版本 (数据整理日期)，数据更新时修改
+INDEX_VERSION = "2025.08"
+
+# CUDA 运行时版本所需的最低驱动版本 (Linux, Windows)，来自各版本CUDA工具包发行说明
+MIN_DRIVER = {
+    '10.2': ('440.33', '441.22'),
+    '11.0': ('450.36.06', '451.22'),
+    '11.1': ('455.23', '456.38'),
+    '11.2': ('460.27.03', '460.82'),
+    '11.3': ('465.19.01', '465.89'),
+    '11.4': ('470.42.01', '471.11'),
+    '11.5': ('495.29.05', '496.04'),
+    '11.6': ('510.39.01', '511.23'),
+    '11.7': ('515.43.04', '516.01'),
+    '11.8': ('520.61.05', '520.06'),
+    '12.0': ('525.60.13', '527.41'),
+    '12.1': ('530.30.02', '531.14'),
+    '12.2': ('535.54.03', '536.25'),
+    '12.3': ('545.23.06', '545.84'),
+    '12.4': ('550.54.14', '551.61'),
+    '12.5': ('555.42.02', '555.85'),
+    '12.6': ('560.28.03', '560.76'),
+    '12.8': ('570.26', '570.65'),
+    '12.9': ('575.51.03', '576.02'),
+    '13.0': ('580.65.06', '580.88'),
+}
+# 次版本兼容 (minor version compatibility) 允许的最低驱动版本
+MINOR_COMPAT_DRIVER = {
+    '11': ('450.80.02', '452.39'),
+    '12': ('525.60.13', '527.41'),
+    '13': ('580.65.06', '580.88'),
+}
+
+# torch 版本 -> (download.pytorch.org 提供的CUDA构建, PyPI 上 Linux 默认构建, torchvision, torchaudio)
+TORCH_RELEASES = {
+    '1.12': (('cu102', 'cu113', 'cu116'), 'cu102', '0.13', '0.12'),
+    '1.13': (('cu116', 'cu117'), 'cu117', '0.14', '0.13'),
+    '2.0': (('cu117', 'cu118'), 'cu117', '0.15', '2.0'),
+    '2.1': (('cu118', 'cu121'), 'cu121', '0.16', '2.1'),
+    '2.2': (('cu118', 'cu121'), 'cu121', '0.17', '2.2'),
+    '2.3': (('cu118', 'cu121'), 'cu121', '0.18', '2.3'),
+    '2.4': (('cu118', 'cu121', 'cu124'), 'cu121', '0.19', '2.4'),
+    '2.5': (('cu118', 'cu121', 'cu124'), 'cu124', '0.20', '2.5'),
+    '2.6': (('cu118', 'cu124', 'cu126'), 'cu124', '0.21', '2.6'),
+    '2.7': (('cu118', 'cu126', 'cu128'), 'cu126', '0.22', '2.7'),
+    '2.8': (('cu126', 'cu128', 'cu129'), 'cu128', '0.23', '2.8'),
+}
+
+# 官方 wheel 编译进的GPU架构 (torch.cuda.get_arch_list())；键为 (torch版本, 构建)，
+# 找不到时使用 (None, 构建) 的通用值
+ARCH_LISTS = {
+    (None, 'cu102'): ('sm_37', 'sm_50', 'sm_60', 'sm_70'),
+    (None, 'cu113'): ('sm_37', 'sm_50', 'sm_60', 'sm_70', 'sm_75', 'sm_80', 'sm_86'),
+    (None, 'cu116'): ('sm_37', 'sm_50', 'sm_60', 'sm_70', 'sm_75', 'sm_80', 'sm_86'),
+    (None, 'cu117'): ('sm_37', 'sm_50', 'sm_60', 'sm_70', 'sm_75', 'sm_80', 'sm_86'),
+    (None, 'cu118'): ('sm_50', 'sm_60', 'sm_70', 'sm_75', 'sm_80', 'sm_86', 'sm_90'),
+    (None, 'cu121'): ('sm_50', 'sm_60', 'sm_70', 'sm_75', 'sm_80', 'sm_86', 'sm_90'),
+    (None, 'cu124'): ('sm_50', 'sm_60', 'sm_70', 'sm_75', 'sm_80', 'sm_86', 'sm_90'),
+    (None, 'cu126'): ('sm_50', 'sm_60', 'sm_70', 'sm_75', 'sm_80', 'sm_86', 'sm_90'),
+    ('2.7', 'cu128'): ('sm_75', 'sm_80', 'sm_86', 'sm_90', 'sm_100', 'sm_120', 'compute_120'),
+    (None, 'cu128'): ('sm_70', 'sm_75', 'sm_80', 'sm_86', 'sm_90', 'sm_100', 'sm_120'),
+    (None, 'cu129'): ('sm_70', 'sm_75', 'sm_80', 'sm_86', 'sm_90', 'sm_100', 'sm_120'),
+}
+
+# 计算能力 -> (支持它的最低CUDA版本, 支持它的最高CUDA版本；None 表示至今仍支持)
+COMPUTE_CAPABILITY = {
+    '3.5': ('5.0', '11.8'),
+    '3.7': ('6.5', '11.8'),
+    '5.0': ('6.0', '12.9'),
+    '5.2': ('6.5', '12.9'),
+    '5.3': ('7.0', '12.9'),
+    '6.0': ('8.0', '12.9'),
+    '6.1': ('8.0', '12.9'),
+    '6.2': ('8.0', '12.9'),
+    '7.0': ('9.0', '12.9'),
+    '7.2': ('10.0', '12.9'),
+    '7.5': ('10.0', None),
+    '8.0': ('11.0', None),
+    '8.6': ('11.1', None),
+    '8.7': ('11.4', None),
+    '8.9': ('11.8', None),
+    '9.0': ('11.8', None),
+    '10.0': ('12.8', None),
+    '10.3': ('12.9', None),
+    '11.0': ('13.0', None),
+    '12.0': ('12.8', None),
+    '12.1': ('12.9', None),
+}
+
+INDEX_URL = "https://download.pytorch.org/whl/"
+
+
+def version_tuple(version):
+    """"2.5.1" -> (2, 5, 1)，用于比较版本号"""
+    return tuple(int(p) for p in str(version).split('.') if p.isdigit())
+
+
+def column(system=None):
+    """MIN_DRIVER 等表中对应平台的列: Linux 为 0，Windows 为 1"""
+    return 1 if (system or platform.system()) == "Windows" else 0
+
+
+def _tag_cuda(tag):
+    """cu121 -> 12.1"""
+    digits = tag[2:]
+    return f"{digits[:-1]}.{digits[-1]}"
+
+
+def _release(version):
+    """2.5.1+cu124 -> 2.5"""
+    if not version:
+        return None
+    return '.'.join(version.split('+')[0].split('.')[:2])
+
+
+# 按驱动版本排序的 (最低驱动, CUDA版本) 表，每个平台一份，用于二分查找
+_DRIVER_STEPS = [
+    sorted((version_tuple(drivers[col]), cuda) for cuda, drivers in MIN_DRIVER.items())
+    for col in (0, 1)
+]
+
+
+def max_cuda_for_driver(driver, system=None):
+    """驱动完整支持的最高CUDA运行时版本；驱动过旧或未知时返回 None"""
+    if not driver:
+        return None
+    steps = _DRIVER_STEPS[column(system)]
+    position = bisect.bisect_right(steps, (version_tuple(driver), '~'))
+    return steps[position - 1][1] if position else None
+
+
+def driver_compatibility(cuda, driver, system=None):
+    """判断 torch 内置的CUDA版本与驱动是否兼容，返回 (是否可用, 说明)"""
+    if not cuda:
+        return None, "CPU版本"
+    if not driver:
+        return False, "未检测到驱动"
+    col = column(system)
+    have = version_tuple(driver)
+    required = MIN_DRIVER.get(cuda)
+    if required and have >= version_tuple(required[col]):
+        return True, "兼容"
+    floor = MINOR_COMPAT_DRIVER.get(cuda.split('.')[0])
+    if floor and have >= version_tuple(floor[col]):
+        if required is None:
+            return True, "兼容 (次版本兼容)"
+        return True, f"次版本兼容 (完整支持需驱动 ≥ {required[col]})"
+    need = required[col] if required else (floor[col] if floor else "未知")
+    return False, f"驱动过旧 (需要 ≥ {need})"
+
+
+def arch_list(release, tag):
+    """官方 wheel 编译进的GPU架构列表，未知时返回 None"""
+    return ARCH_LISTS.get((release, tag)) or ARCH_LISTS.get((None, tag))
+
+
+def arch_supported(capability, archs):
+    """archs 中是否有能在该计算能力上运行的代码
+
+    sm_XY 的二进制可在主版本相同、次版本不低于 Y 的GPU上运行；
+    compute_XY (PTX) 可在计算能力不低于 X.Y 的GPU上即时编译运行。
+    """
+    major, minor = version_tuple(capability)[:2]
+    for arch in archs:
+        kind, _, digits = arch.partition('_')
+        digits = digits.rstrip('af')
+        if not digits.isdigit():
+            continue
+        arch_major, arch_minor = int(digits[:-1]), int(digits[-1])
+        if kind == 'sm' and arch_major == major and arch_minor <= minor:
+            return True
+        if kind == 'compute' and (arch_major, arch_minor) <= (major, minor):
+            return True
+    return False
+
+
+def _capability_range(capability):
+    return COMPUTE_CAPABILITY.get(capability, (None, None))
+
+
+def build_supports(release, tag, capabilities, driver, system=None):
+    """某个 torch 构建能否在该驱动和这些GPU上运行，返回不满足的原因列表
+
+    驱动的判断与 driver_compatibility 一致，接受CUDA次版本兼容。
+    """
+    reasons = []
+    cuda = _tag_cuda(tag)
+    ok, note = driver_compatibility(cuda, driver, system)
+    if not ok:
+        reasons.append(f"{tag}: {note}")
+    archs = arch_list(release, tag)
+    for capability in capabilities:
+        low, high = _capability_range(capability)
+        if low and version_tuple(cuda) < version_tuple(low):
+            reasons.append(f"计算能力 {capability} 需要CUDA ≥ {low}")
+        elif high and version_tuple(cuda) > version_tuple(high):
+            reasons.append(f"CUDA {cuda} 已不支持计算能力 {capability} (最高支持到 CUDA {high})")
+        elif archs and not arch_supported(capability, archs):
+            reasons.append(f"{tag} 构建未包含计算能力 {capability} 的代码")
+    return reasons
+
+
+def recommend(release, capabilities, driver, system=None):
+    """选择可用的最佳构建，返回 (torch版本, 构建) 或 None
+
+    优先保持当前 torch 版本，选其中CUDA版本最高且满足驱动 (含次版本兼容) 和GPU的构建；
+    都不满足时依次尝试更新的 torch 版本。
+    """
+    releases = sorted(TORCH_RELEASES, key=version_tuple)
+    if release in TORCH_RELEASES:
+        ordered = [release] + [r for r in releases if version_tuple(r) > version_tuple(release)]
+    else:
+        ordered = releases[::-1]
+    for candidate in ordered:
+        for tag in sorted(TORCH_RELEASES[candidate][0], key=lambda t: version_tuple(_tag_cuda(t)), reverse=True):
+            if not build_supports(candidate, tag, capabilities, driver, system):
+                return candidate, tag
+    return None
+
+
+def install_command(release, tag, system=None, replace=False):
+    """对应构建的 pip 安装命令；Linux 上 PyPI 默认即为该构建时不指定 --index-url
+
+    replace 为真时先卸载已安装的版本，否则 pip 会认为同版本号的其他构建 (如 +cpu) 已满足要求。
+    """
+    _, default, vision, audio = TORCH_RELEASES[release]
+    command = f"pip install torch=={release}.* torchvision=={vision}.* torchaudio=={audio}.*"
+    if replace:
+        command = f"pip uninstall -y torch torchvision torchaudio && {command}"
+    if tag == default and column(system) == 0:
+        return command
+    return f"{command} --index-url {INDEX_URL}{tag}"
+
+
+def diagnose(driver, torch_version=None, torch_cuda=None, capabilities=(), archs=None, system=None):
+    """离线诊断驱动、torch 构建与GPU是否匹配
+
+    capabilities 为各GPU的计算能力 (如 "8.6")；archs 为 torch.cuda.get_arch_list() 的结果，
+    未导入torch时为 None，使用索引中官方 wheel 的架构列表。
+    返回 {'ok', 'problems': [...], 'max_cuda', 'recommended': (torch版本, 构建) 或 None, 'command',
+    'replace': 是否需要先卸载已安装的torch}。
+    """
+    capabilities = list(dict.fromkeys(c if isinstance(c, str) else '.'.join(str(p) for p in c)
+                                      for c in capabilities))
+    release = _release(torch_version)
+    tag = f"cu{torch_cuda.replace('.', '')}" if torch_cuda else None
+    max_cuda = max_cuda_for_driver(driver, system)
+    problems = []
+
+    if not driver:
+        if capabilities:
+            problems.append("检测到GPU但NVIDIA驱动未加载")
+        elif torch_cuda:
+            problems.append("未检测到NVIDIA驱动，CUDA版PyTorch只能使用CPU")
+    elif torch_version and not torch_cuda:
+        problems.append(f"已安装的是CPU版PyTorch ({torch_version})，无法使用GPU")
+    elif torch_cuda:
+        ok, note = driver_compatibility(torch_cuda, driver, system)
+        if not ok:
+            problems.append(f"PyTorch内置CUDA {torch_cuda}，当前驱动 {driver} {note}；"
+                            f"该驱动最高支持CUDA {max_cuda or '无'}")
+        if archs is None:
+            archs = arch_list(release, tag)
+        for capability in capabilities:
+            low, high = _capability_range(capability)
+            if low and version_tuple(torch_cuda) < version_tuple(low):
+                problems.append(f"GPU计算能力 {capability} 需要CUDA ≥ {low}，而PyTorch内置CUDA {torch_cuda}")
+            elif high and version_tuple(torch_cuda) > version_tuple(high):
+                problems.append(f"CUDA {torch_cuda} 已不支持计算能力 {capability} 的GPU (最高到 CUDA {high})")
+            elif archs and not arch_supported(capability, archs):
+                problems.append(f"PyTorch未编译计算能力 {capability} 的代码 (包含: {' '.join(archs)})")
+
+    # 已安装且没有问题时不需要推荐；未安装torch时给出安装命令
+    recommended = None
+    if driver and (problems or not torch_version):
+        recommended = recommend(release, capabilities, driver, system)
+    command = None
+    replace = bool(recommended and torch_version)
+    if recommended:
+        command = install_command(*recommended, system=system, replace=replace)
+    return {
+        'ok': not problems,
+        'problems': problems,
+        'max_cuda': max_cuda,
+        'recommended': recommended,
+        'command': command,
+        'replace': replace,
+        'index_version': INDEX_VERSION,
+    }
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="离线查询驱动、CUDA、PyTorch与GPU计算能力的兼容性")
+    parser.add_argument("--driver", help="NVIDIA驱动版本，如 535.104.05")
+    parser.add_argument("--torch", help="PyTorch版本，如 2.3.1+cu121")
+    parser.add_argument("--cuda", help="PyTorch内置的CUDA版本，如 12.1")
+    parser.add_argument("--capability", action="append", default=[],
+                        help="GPU计算能力，如 8.6，可重复指定")
+    parser.add_argument("--windows", action="store_true", help="按Windows驱动版本判断")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    system = "Windows" if args.windows else None
+    result = diagnose(args.driver, args.torch, args.cuda, args.capability, system=system)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0 if result['ok'] else 1
+    print(f"兼容性索引版本: {INDEX_VERSION}")
+    if args.driver:
+        print(f"驱动 {args.driver} 最高支持 CUDA {result['max_cuda'] or '无'}")
+    if result['ok']:
+        print("✓ 未发现不兼容的地方")
+    for problem in result['problems']:
+        print(f"✗ {problem}")
+    if result['command']:
+        print(f"推荐安装: {result['command']}")
+    return 0 if result['ok'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import sys
+import time
+import argparse
+
+import probe_trace
+from stats_util import percentile, mean_ci
+
+DEFAULT_SIZES = (256, 512, 1024, 2048)
+DEFAULT_DTYPES = ('float32', 'float16', 'bfloat16')
+
+
+def synchronize(torch, device):
+    """等待设备上已提交的运算全部完成"""
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+
+
+def supported_dtypes(torch, device, names=DEFAULT_DTYPES):
+    """用一次小矩阵乘法试探当前设备支持的数据类型"""
+    supported = []
+    for name in names:
+        dtype = getattr(torch, name, None)
+        if dtype is None:
+            continue
+        try:
+            a = torch.ones(8, 8, dtype=dtype, device=device)
+            torch.matmul(a, a)
+            synchronize(torch, device)
+        except (RuntimeError, TypeError):
+            continue
+        supported.append(name)
+    return supported
+
+
+def time_callable(fn, sync, warmup=3, min_iters=5, max_iters=1000, max_time=2.0, target_ci=0.02):
+    """重复计时直到均值95%置信区间的相对半宽不超过 target_ci
+
+    每次计时都在 sync() 之后结束，返回每次运行的纳秒耗时列表。
+    """
+    with probe_trace.span('warmup', 'benchmark'):
+        for _ in range(warmup):
+            fn()
+        sync()
+
+    samples = []
+    started = time.perf_counter_ns()
+    budget_ns = max_time * 1e9
+    while len(samples) < max_iters:
+        t0 = time.perf_counter_ns()
+        fn()
+        sync()
+        t1 = time.perf_counter_ns()
+        samples.append(t1 - t0)
+        if len(samples) >= min_iters:
+            mean, half = mean_ci(samples)
+            if mean and half / mean <= target_ci:
+                break
+            if t1 - started >= budget_ns:
+                break
+    return samples
+
+
+def bench_matmul(torch, device, size, dtype_name, **timing):
+    """测试 size x size 矩阵乘法，返回延迟统计和实际达到的 GFLOPS"""
+    dtype = getattr(torch, dtype_name)
+    a = torch.rand(size, size, device=device).to(dtype)
+    b = torch.rand(size, size, device=device).to(dtype)
+    with probe_trace.span(f"matmul {dtype_name} {size}", 'benchmark'):
+        samples = time_callable(lambda: torch.matmul(a, b), lambda: synchronize(torch, device), **timing)
+
+    ordered = sorted(samples)
+    median_ns = percentile(ordered, 50)
+    mean, half = mean_ci(samples)
+    return {
+        'op': 'matmul',
+        'device': str(device),
+        'size': size,
+        'dtype': dtype_name,
+        'iterations': len(samples),
+        'median_ms': median_ns / 1e6,
+        'p95_ms': percentile(ordered, 95) / 1e6,
+        'ci_rel': half / mean if mean else None,
+        'gflops': 2.0 * size ** 3 / median_ns if median_ns else None,
+    }
+
+
+def run_suite(device='cpu', sizes=DEFAULT_SIZES, dtypes=DEFAULT_DTYPES, **timing):
+    """在指定设备上遍历矩阵大小和数据类型，返回结果列表"""
+    import torch
+
+    device = torch.device(device)
+    results = []
+    for dtype_name in supported_dtypes(torch, device, dtypes):
+        for size in sizes:
+            results.append(bench_matmul(torch, device, size, dtype_name, **timing))
+    return results
+
+
+def print_results(results, indent="  "):
+    """以表格形式打印基准测试结果"""
+    # 中文表头每个字符占两列宽度，对齐时相应减少填充
+    print(f"{indent}{'数据类型':<6}{'矩阵大小':>6}{'次数':>6}{'中位数(ms)':>9}{'p95(ms)':>10}{'±CI':>8}{'GFLOPS':>10}")
+    for r in results:
+        ci = f"{r['ci_rel'] * 100:.1f}%" if r['ci_rel'] is not None else "N/A"
+        print(f"{indent}{r['dtype']:<10}{r['size']:>10}{r['iterations']:>8}"
+              f"{r['median_ms']:>12.3f}{r['p95_ms']:>10.3f}{ci:>8}{r['gflops']:>10.1f}")
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="矩阵乘法基准测试 - 预热、设备同步并重复至置信区间收敛")
+    parser.add_argument("--device", default="cpu", help="测试设备，如 cpu、cuda、cuda:1，默认 cpu")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="矩阵边长列表")
+    parser.add_argument("--dtypes", nargs="+", default=list(DEFAULT_DTYPES),
+                        help="数据类型列表 (不支持的类型自动跳过)")
+    parser.add_argument("--warmup", type=int, default=3, help="预热次数，默认 3")
+    parser.add_argument("--max-time", type=float, default=2.0,
+                        help="每个用例的最长计时时间 (秒)，默认 2")
+    parser.add_argument("--target-ci", type=float, default=0.02,
+                        help="95%%置信区间相对半宽的目标值，默认 0.02")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    try:
+        results = run_suite(args.device, args.sizes, args.dtypes, warmup=args.warmup,
+                            max_time=args.max_time, target_ci=args.target_ci)
+    except ImportError:
+        print("✗ PyTorch未安装")
+        return 1
+    except Exception as e:
+        print(f"✗ 基准测试失败: {e}")
+        return 1
+    print(f"设备: {args.device}")
+    print_results(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
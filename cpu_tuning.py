@@ -0,0 +1,193 @@
+import os
+import sys
+import math
+import argparse
+
+import compute_benchmark
+from cgroup_util import cgroup_paths, read_text
+from stats_util import percentile
+
+
+def cgroup_cpu_quota(root="/"):
+    """读取 cgroup 的CPU配额 (可用CPU数，可为小数)，未限制时返回 None"""
+    base = os.path.join(root, "sys", "fs", "cgroup")
+    paths = cgroup_paths(root)
+
+    # cgroup v2: cpu.max 内容为 "<quota> <period>" 或 "max <period>"
+    candidates = []
+    if "" in paths:
+        candidates.append(os.path.join(base, paths[""].lstrip("/"), "cpu.max"))
+    candidates.append(os.path.join(base, "cpu.max"))
+    for path in candidates:
+        text = read_text(path)
+        if text:
+            quota, _, period = text.partition(" ")
+            if quota == "max":
+                return None
+            try:
+                return int(quota) / int(period)
+            except ValueError:
+                return None
+
+    # cgroup v1: cpu.cfs_quota_us / cpu.cfs_period_us，配额为 -1 表示不限制
+    for name in ("cpu", "cpu,cpuacct", "cpuacct,cpu"):
+        directory = os.path.join(base, name)
+        for sub in (paths.get("cpu", "").lstrip("/"), ""):
+            quota = read_text(os.path.join(directory, sub, "cpu.cfs_quota_us"))
+            period = read_text(os.path.join(directory, sub, "cpu.cfs_period_us"))
+            if quota and period:
+                try:
+                    quota, period = int(quota), int(period)
+                except ValueError:
+                    continue
+                return quota / period if quota > 0 and period > 0 else None
+    return None
+
+
+def affinity_cpus():
+    """当前进程可调度的CPU数量"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def effective_cpus(root="/"):
+    """综合CPU亲和性与 cgroup 配额得到的实际可用CPU数"""
+    cpus = affinity_cpus()
+    quota = cgroup_cpu_quota(root)
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return cpus
+
+
+def threading_info(torch):
+    """PyTorch 线程和并行后端信息"""
+    backends = torch.backends
+    info = {
+        'num_threads': torch.get_num_threads(),
+        'num_interop_threads': torch.get_num_interop_threads(),
+        'mkl': backends.mkl.is_available() if hasattr(backends, 'mkl') else None,
+        'mkldnn': backends.mkldnn.is_available() if hasattr(backends, 'mkldnn') else None,
+        'openmp': backends.openmp.is_available() if hasattr(backends, 'openmp') else None,
+        'parallel_info': torch.__config__.parallel_info().strip(),
+        'env': {name: os.environ.get(name) for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS')},
+    }
+    return info
+
+
+def candidate_threads(limit):
+    """待测试的线程数: 2 的幂次以及上限本身"""
+    counts = {1, limit}
+    n = 2
+    while n < limit:
+        counts.add(n)
+        n *= 2
+    return sorted(counts)
+
+
+def _workloads(torch):
+    """返回 {名称: 可调用对象}，每个调用执行一次待测运算"""
+    a = torch.rand(512, 512)
+    b = torch.rand(512, 512)
+    x = torch.rand(8, 64, 56, 56)
+    w = torch.rand(64, 64, 3, 3)
+    conv2d = torch.nn.functional.conv2d
+    return {
+        'matmul_512': lambda: torch.matmul(a, b),
+        'conv2d_3x3': lambda: conv2d(x, w, padding=1),
+    }
+
+
+def sweep_threads(torch, counts, max_time=1.0):
+    """对每个线程数测试 matmul 和 conv2d，返回 {线程数: {运算: 中位数毫秒}}"""
+    original = torch.get_num_threads()
+    workloads = _workloads(torch)
+    results = {}
+    try:
+        with torch.no_grad():
+            for count in counts:
+                torch.set_num_threads(count)
+                results[count] = {}
+                for name, fn in workloads.items():
+                    samples = compute_benchmark.time_callable(fn, lambda: None, max_time=max_time)
+                    results[count][name] = percentile(sorted(samples), 50) / 1e6
+    finally:
+        torch.set_num_threads(original)
+    return results
+
+
+def recommend(results, tolerance=0.05):
+    """按各运算相对最优耗时的几何平均打分，在最优值 tolerance 以内选择线程最少者"""
+    names = next(iter(results.values())).keys()
+    best = {name: min(r[name] for r in results.values()) for name in names}
+    scores = {
+        count: math.exp(sum(math.log(r[name] / best[name]) for name in names) / len(best))
+        for count, r in results.items()
+    }
+    top = min(scores.values())
+    return min(count for count, score in scores.items() if score <= top * (1 + tolerance)), scores
+
+
+def run_report(torch=None, max_time=1.0, root="/"):
+    """打印CPU诊断报告并返回推荐的线程数"""
+    if torch is None:
+        import torch
+
+    info = threading_info(torch)
+    quota = cgroup_cpu_quota(root)
+    limit = effective_cpus(root)
+
+    print("\nCPU 线程诊断:")
+    print(f"  - 可调度CPU数量 (亲和性): {affinity_cpus()}")
+    print(f"  - cgroup CPU配额: {f'{quota:.2f} 核' if quota is not None else '未限制'}")
+    print(f"  - 实际可用CPU数量: {limit}")
+    print(f"  - torch.get_num_threads(): {info['num_threads']}")
+    print(f"  - torch.get_num_interop_threads(): {info['num_interop_threads']}")
+    print(f"  - MKL: {info['mkl']} | oneDNN (mkldnn): {info['mkldnn']} | OpenMP: {info['openmp']}")
+    for name, value in info['env'].items():
+        print(f"  - {name}: {value if value is not None else '未设置'}")
+    print("  - parallel_info:")
+    for line in info['parallel_info'].splitlines():
+        if line.strip():
+            print(f"      {line.strip()}")
+    if info['num_threads'] > limit:
+        print(f"  ✗ 当前线程数 {info['num_threads']} 超过实际可用CPU数 {limit}，容易因配额节流而变慢")
+
+    counts = candidate_threads(max(limit, 1))
+    print(f"\n正在测试线程数 {counts} 下的 matmul/conv2d 性能...")
+    results = sweep_threads(torch, counts, max_time)
+    best, scores = recommend(results)
+    names = list(next(iter(results.values())))
+    print("  线程数  " + "  ".join(f"{name:>12}" for name in names) + "      相对耗时")
+    for count in counts:
+        row = "  ".join(f"{results[count][name]:>10.3f}ms" for name in names)
+        print(f"  {count:>6}  {row}  {scores[count]:>10.2f}x")
+
+    print(f"\n✓ 推荐线程数: {best}")
+    print(f"  - 环境变量: export OMP_NUM_THREADS={best}")
+    print(f"  - 代码中: torch.set_num_threads({best})")
+    return best
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="CPU版PyTorch线程诊断 - 报告并行后端与cgroup配额并推荐线程数")
+    parser.add_argument("--max-time", type=float, default=1.0,
+                        help="每个线程数下每种运算的最长计时时间 (秒)，默认 1")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    try:
+        import torch
+    except ImportError:
+        print("✗ PyTorch未安装")
+        return 1
+    run_report(torch, args.max_time)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import os
+import re
+import sys
+import json
+import argparse
+import platform
+
+import probe_trace
+
+# 各平台默认的CUDA工具包安装位置
+LINUX_BASES = ('/usr/local', '/opt')
+WINDOWS_BASES = ('C:\\Program Files\\NVIDIA GPU Computing Toolkit\\CUDA', 'C:\\CUDA')
+
+# 需要统计版本的库: 名称 -> 文件名正则 (Linux 从 .so.X.Y.Z 取版本，Windows 从 64_X.dll 取主版本)
+LIBRARIES = {
+    'cudart': re.compile(r'^(?:libcudart\.so\.(\d[\d.]*)|cudart64_(\d+)\.dll)$'),
+    'cublas': re.compile(r'^(?:libcublas\.so\.(\d[\d.]*)|cublas64_(\d+)\.dll)$'),
+    'cudnn': re.compile(r'^(?:libcudnn\.so\.(\d[\d.]*)|cudnn64_(\d+)\.dll)$'),
+    'nccl': re.compile(r'^(?:libnccl\.so\.(\d[\d.]*))$'),
+}
+
+_LIB_DIRS = ('lib64', 'lib', 'bin', os.path.join('lib', 'x64'))
+_CUDNN_HEADER_RE = re.compile(r'#define\s+CUDNN_(MAJOR|MINOR|PATCHLEVEL)\s+(\d+)')
+
+
+def _is_windows():
+    return platform.system() == "Windows"
+
+
+def _nvcc_name():
+    return 'nvcc.exe' if _is_windows() else 'nvcc'
+
+
+def _scandir(path):
+    try:
+        with os.scandir(path) as entries:
+            return list(entries)
+    except OSError:
+        return []
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _looks_like_toolkit(path):
+    """目录中有 nvcc，或有注明CUDA版本的 version.json/version.txt (仅有同名文件不算)"""
+    return (os.path.isfile(os.path.join(path, 'bin', _nvcc_name()))
+            or read_version(path)[0] is not None)
+
+
+def _env_paths(env, name):
+    return [p for p in (env.get(name) or '').split(os.pathsep) if p]
+
+
+def candidate_roots(bases=None, env=None):
+    """列出所有可能的工具包根目录 (含 cuda 符号链接和环境变量指向的目录)"""
+    env = os.environ if env is None else env
+    if bases is None:
+        bases = WINDOWS_BASES if _is_windows() else LINUX_BASES
+
+    candidates = []
+    for base in bases:
+        for entry in _scandir(base):
+            name = entry.name.lower()
+            # v12.1 这样的目录名只是 Windows 安装程序的约定，在 /opt 等目录下不代表工具包
+            versioned = _is_windows() and name.startswith('v') and name[1:2].isdigit()
+            if name == 'cuda' or name.startswith('cuda-') or versioned:
+                candidates.append(entry.path)
+    for name in ('CUDA_HOME', 'CUDA_PATH'):
+        if env.get(name):
+            candidates.append(env[name])
+    for path in _env_paths(env, 'PATH'):
+        if os.path.isfile(os.path.join(path, _nvcc_name())):
+            candidates.append(os.path.dirname(path.rstrip('/\\')))
+    for path in _env_paths(env, 'LD_LIBRARY_PATH'):
+        candidates.append(os.path.dirname(path.rstrip('/\\')))
+    return [path for path in candidates if _looks_like_toolkit(path)]
+
+
+def read_version(root):
+    """从 version.json 或 version.txt 读取版本，返回 (版本, 来源文件, 组件版本字典)"""
+    text = _read(os.path.join(root, 'version.json'))
+    if text:
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = {}
+        components = {name: item.get('version') for name, item in data.items()
+                      if isinstance(item, dict) and item.get('version')}
+        version = components.get('cuda')
+        if version:
+            return version, 'version.json', components
+    text = _read(os.path.join(root, 'version.txt'))
+    if text:
+        match = re.search(r'CUDA Version\s+([\d.]+)', text)
+        if match:
+            return match.group(1), 'version.txt', {}
+    return None, None, {}
+
+
+def _better(old, new):
+    """同一个库有多个文件时保留版本号最完整的"""
+    if old is None:
+        return new
+    return new if len(new.split('.')) > len(old.split('.')) else old
+
+
+def scan_libraries(root):
+    """扫描工具包 lib 目录，返回 {库名: 版本}"""
+    found = {}
+    directories = [os.path.join(root, d) for d in _LIB_DIRS]
+    for target in _scandir(os.path.join(root, 'targets')):
+        directories.append(os.path.join(target.path, 'lib'))
+    for directory in directories:
+        for entry in _scandir(directory):
+            for lib, pattern in LIBRARIES.items():
+                match = pattern.match(entry.name)
+                if match:
+                    found[lib] = _better(found.get(lib), match.group(1) or match.group(2))
+
+    # cuDNN 的完整版本号写在头文件中
+    header = _read(os.path.join(root, 'include', 'cudnn_version.h'))
+    if header:
+        parts = dict(_CUDNN_HEADER_RE.findall(header))
+        if 'MAJOR' in parts:
+            found['cudnn'] = '.'.join(parts[k] for k in ('MAJOR', 'MINOR', 'PATCHLEVEL') if k in parts)
+    return found
+
+
+def _under(path, root):
+    path = os.path.realpath(path)
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+@probe_trace.traced(category='probe')
+def inventory(bases=None, env=None):
+    """列出全部CUDA工具包及其版本、库版本和生效情况 (不启动任何子进程)"""
+    env = os.environ if env is None else env
+    toolkits = {}
+    for path in candidate_roots(bases, env):
+        real = os.path.realpath(path)
+        toolkit = toolkits.get(real)
+        if toolkit is None:
+            version, source, components = read_version(real)
+            toolkit = toolkits[real] = {
+                'path': real,
+                'aliases': [],
+                'version': version,
+                'source': source,
+                'components': components,
+                'libraries': scan_libraries(real),
+                'active': [],
+            }
+        if path != real and path not in toolkit['aliases']:
+            toolkit['aliases'].append(path)
+
+    # PATH 中第一个 nvcc 与 LD_LIBRARY_PATH 中第一个工具包目录才会生效
+    for path in _env_paths(env, 'PATH'):
+        if os.path.isfile(os.path.join(path, _nvcc_name())):
+            for real, toolkit in toolkits.items():
+                if _under(path, real):
+                    toolkit['active'].append('PATH')
+            break
+    for path in _env_paths(env, 'LD_LIBRARY_PATH'):
+        owners = [toolkit for real, toolkit in toolkits.items() if _under(path, real)]
+        if owners:
+            owners[0]['active'].append('LD_LIBRARY_PATH')
+            break
+    for name in ('CUDA_HOME', 'CUDA_PATH'):
+        if env.get(name):
+            real = os.path.realpath(env[name])
+            if real in toolkits:
+                toolkits[real]['active'].append(name)
+
+    def sort_key(toolkit):
+        version = toolkit['version'] or ''
+        return tuple(int(p) for p in version.split('.') if p.isdigit()), toolkit['path']
+
+    return sorted(toolkits.values(), key=sort_key)
+
+
+def format_toolkit(toolkit):
+    """把单个工具包格式化为多行文字"""
+    lines = [f"CUDA {toolkit['version'] or '版本未知'}: {toolkit['path']}"]
+    if toolkit['aliases']:
+        lines.append(f"  别名: {', '.join(toolkit['aliases'])}")
+    libs = toolkit['libraries']
+    if libs:
+        lines.append("  库: " + ", ".join(f"{name} {libs[name]}" for name in sorted(libs)))
+    if toolkit['active']:
+        lines.append(f"  生效于: {', '.join(toolkit['active'])}")
+    return lines
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="列出本机全部CUDA工具包及其cuDNN/NCCL/cuBLAS版本")
+    parser.add_argument("--base", action="append", dest="bases",
+                        help="工具包所在的父目录，可重复指定 (默认 /usr/local 和 /opt)")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    toolkits = inventory(args.bases)
+    if args.json:
+        print(json.dumps(toolkits, ensure_ascii=False, indent=2))
+        return 0
+    if not toolkits:
+        print("✗ 未找到任何CUDA工具包")
+        return 1
+    for toolkit in toolkits:
+        mark = "✓" if toolkit['active'] else " "
+        lines = format_toolkit(toolkit)
+        print(f"{mark} {lines[0]}")
+        for line in lines[1:]:
+            print(f"  {line}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
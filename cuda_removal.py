@@ -0,0 +1,269 @@
+import os
+import sys
+import json
+import queue
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cuda_inventory
+import torch_build_info
+
+
+def scan_sizes(roots, workers=16):
+    """并发统计各目录树的占用空间、文件数和目录数
+
+    工作线程共用一个目录队列，每个线程 os.scandir 一个目录后把子目录放回队列，
+    因此文件集中在少数深层目录时也能均衡负载。不跟随符号链接。
+    返回 {根目录: {'bytes', 'files', 'dirs', 'errors'}}。
+    """
+    totals = {root: {'bytes': 0, 'files': 0, 'dirs': 0, 'errors': 0} for root in roots}
+    pending = queue.Queue()
+    lock = threading.Lock()
+    for root in roots:
+        pending.put((root, root))
+
+    def worker():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            root, path = item
+            size = files = dirs = errors = 0
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                dirs += 1
+                                pending.put((root, entry.path))
+                                continue
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            errors += 1
+                            continue
+                        files += 1
+                        # 优先按实际占用的磁盘块计算，稀疏文件不会被高估
+                        blocks = getattr(st, 'st_blocks', None)
+                        size += blocks * 512 if blocks is not None else st.st_size
+            except OSError:
+                errors += 1
+            with lock:
+                total = totals[root]
+                total['bytes'] += size
+                total['files'] += files
+                total['dirs'] += dirs
+                total['errors'] += errors
+            pending.task_done()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+    pending.join()
+    for _ in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
+    return totals
+
+
+def _major_minor(version):
+    return '.'.join((version or '').split('.')[:2])
+
+
+def mapped_roots(roots, proc_root="/proc"):
+    """正在被运行中的进程加载的工具包，返回 {根目录: [PID, ...]}
+
+    读取各进程的 /proc/PID/maps；无权读取的进程会被跳过。仅支持 Linux，其他平台返回空字典。
+    """
+    users = {}
+    prefixes = [(root, root.rstrip(os.sep) + os.sep) for root in roots]
+    try:
+        pids = [name for name in os.listdir(proc_root) if name.isdigit()]
+    except OSError:
+        return users
+    for pid in pids:
+        try:
+            with open(os.path.join(proc_root, pid, "maps"), encoding='utf-8', errors='replace') as f:
+                text = f.read()
+        except OSError:
+            continue
+        for root, prefix in prefixes:
+            if prefix in text:
+                users.setdefault(root, []).append(int(pid))
+    return users
+
+
+def protection_reasons(toolkits, torch_info=None, proc_root="/proc"):
+    """各工具包不能删除的原因，返回 {根目录: [原因, ...]}
+
+    受保护的工具包: 在 PATH/LD_LIBRARY_PATH/CUDA_HOME/CUDA_PATH 中生效的；由 cuda 符号链接
+    (如 /usr/local/cuda) 指向的默认工具包；torch 未自带CUDA运行库 (非 PyPI 的 nvidia-* 依赖)
+    时与其CUDA版本一致的；以及正被运行中的进程加载的。
+    """
+    torch_info = torch_build_info.build_info() if torch_info is None else torch_info
+    reasons = {toolkit['path']: [] for toolkit in toolkits}
+    for toolkit in toolkits:
+        path = toolkit['path']
+        if toolkit['active']:
+            reasons[path].append(f"生效于 {', '.join(toolkit['active'])}")
+        links = [alias for alias in toolkit['aliases'] if os.path.basename(alias.rstrip('/\\')).lower() == 'cuda']
+        if links:
+            reasons[path].append(f"默认工具包 ({', '.join(links)} 指向此处)")
+
+    torch_cuda = torch_info.get('cuda') if torch_info.get('installed') else None
+    if torch_cuda and not torch_info.get('libraries', {}).get('cudart'):
+        for toolkit in toolkits:
+            if _major_minor(toolkit['version']) == _major_minor(torch_cuda):
+                reasons[toolkit['path']].append(f"torch {torch_info['version']} 使用系统的 CUDA {torch_cuda} 运行库")
+
+    for root, pids in mapped_roots(list(reasons), proc_root).items():
+        shown = ', '.join(str(pid) for pid in pids[:5]) + (" 等" if len(pids) > 5 else "")
+        reasons[root].append(f"正被进程 {shown} 加载")
+    return reasons
+
+
+def plan(bases=None, env=None, keep=(), only=(), workers=16, torch_info=None, proc_root="/proc"):
+    """生成删除计划 (不做任何修改)
+
+    keep 和 only 中的条目可为路径或版本号 (如 11.8)；only 非空时只考虑其中的工具包。
+    返回工具包列表，每项含 path、version、aliases、bytes、files、protected、unrecognized、reasons、remove。
+    版本未知的目录无法确认是CUDA工具包，标记为 unrecognized 并一律保留。
+    """
+    toolkits = cuda_inventory.inventory(bases, env)
+
+    def matches(toolkit, items):
+        return any(os.path.realpath(item) == toolkit['path'] or item == toolkit['version']
+                   or item == _major_minor(toolkit['version']) for item in items)
+
+    if only:
+        toolkits = [toolkit for toolkit in toolkits if matches(toolkit, only)]
+    reasons = protection_reasons(toolkits, torch_info, proc_root)
+    sizes = scan_sizes([toolkit['path'] for toolkit in toolkits], workers)
+    entries = []
+    for toolkit in toolkits:
+        why = list(reasons[toolkit['path']])
+        if matches(toolkit, keep):
+            why.append("由 --keep 指定保留")
+        unrecognized = not toolkit['version']
+        entries.append(dict(sizes[toolkit['path']], path=toolkit['path'], version=toolkit['version'],
+                            aliases=toolkit['aliases'], protected=bool(why), unrecognized=unrecognized,
+                            reasons=why + (["无法识别为CUDA工具包 (未找到版本信息)"] if unrecognized else []),
+                            remove=not why and not unrecognized))
+    return entries
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+        return None
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        return (path, str(e))
+
+
+def remove_tree(root, pool):
+    """用线程池并发删除目录树中的文件，再自底向上删除空目录，返回错误列表
+
+    删除大量小文件时耗时主要在逐个文件的系统调用上，并发执行可充分利用存储的队列深度；
+    目录的删除必须在其内容之后，因此按遍历的逆序串行进行。
+    """
+    files, dirs = [], []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirs.append(dirpath)
+        # 指向目录的符号链接只删除链接本身
+        links = [name for name in dirnames if os.path.islink(os.path.join(dirpath, name))]
+        for name in links:
+            dirnames.remove(name)
+        files.extend(os.path.join(dirpath, name) for name in filenames + links)
+    errors = [error for error in pool.map(_unlink, files, chunksize=256) if error]
+    for path in reversed(dirs):
+        try:
+            os.rmdir(path)
+        except OSError as e:
+            errors.append((path, str(e)))
+    return errors
+
+
+def execute(entries, workers=16):
+    """按计划删除标记为 remove 的工具包及指向它们的符号链接，返回 {路径: 错误列表}"""
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for entry in entries:
+            if not entry['remove']:
+                continue
+            errors = remove_tree(entry['path'], pool)
+            for alias in entry['aliases']:
+                if os.path.islink(alias):
+                    error = _unlink(alias)
+                    if error:
+                        errors.append(error)
+            results[entry['path']] = errors
+    return results
+
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+
+
+def print_plan(entries):
+    total = 0
+    for entry in entries:
+        action = "删除" if entry['remove'] else ("未识别" if entry['unrecognized'] else "保留")
+        print(f"[{action}] CUDA {entry['version'] or '版本未知'}: {entry['path']} "
+              f"({_format_size(entry['bytes'])}，{entry['files']} 个文件)")
+        for alias in entry['aliases']:
+            print(f"    别名: {alias}")
+        for reason in entry['reasons']:
+            print(f"    - {reason}")
+        if entry['remove']:
+            total += entry['bytes']
+    print(f"\n计划删除 {sum(e['remove'] for e in entries)} 个工具包，可释放 {_format_size(total)}")
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="生成并执行旧CUDA工具包的删除计划 (默认只显示计划)")
+    parser.add_argument("--base", action="append", dest="bases",
+                        help="工具包所在的父目录，可重复指定 (默认 /usr/local 和 /opt)")
+    parser.add_argument("--keep", action="append", default=[], metavar="路径|版本",
+                        help="额外保留的工具包，可重复指定")
+    parser.add_argument("--only", action="append", default=[], metavar="路径|版本",
+                        help="只考虑这些工具包，可重复指定")
+    parser.add_argument("--workers", type=int, default=16, help="扫描和删除的并发线程数，默认 16")
+    parser.add_argument("--yes", action="store_true", help="按计划执行删除 (默认只显示计划)")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出计划")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    entries = plan(args.bases, keep=args.keep, only=args.only, workers=args.workers)
+    if args.json:
+        print(json.dumps(entries, ensure_ascii=False, indent=2))
+    elif entries:
+        print_plan(entries)
+    else:
+        print("✗ 未找到任何CUDA工具包")
+    if not args.yes:
+        if not args.json and any(e['remove'] for e in entries):
+            print("(仅为计划，未做任何修改；确认后加 --yes 执行删除)")
+        return 0
+
+    failed = False
+    for path, errors in execute(entries, args.workers).items():
+        if errors:
+            failed = True
+            print(f"✗ 删除 {path} 时有 {len(errors)} 项失败，例如 {errors[0][0]}: {errors[0][1]}")
+        else:
+            print(f"✓ 已删除 {path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
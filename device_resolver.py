@@ -0,0 +1,354 @@
+import os
+import re
+import sys
+import json
+import errno
+import argparse
+import subprocess
+
+import gpu_discovery
+import nvsmi_query
+import probe_memo
+from cgroup_util import cgroup_paths, read_text
+
+# /dev/nvidiaN 的主设备号；次设备号 255 为 nvidiactl，254 为 nvidia-modeset
+NVIDIA_MAJOR = 195
+
+_GPU_LINE_RE = re.compile(r'^GPU\s+(\d+):\s*(.*?)\s*\(UUID:\s*(GPU-[0-9a-fA-F-]+)\)')
+_MIG_LINE_RE = re.compile(r'^\s+MIG\s+(\S+)\s+Device\s+(\d+):\s*\(UUID:\s*(MIG-[^)\s]+)\)')
+
+
+def parse_gpu_list(text):
+    """解析 nvidia-smi -L 的输出，返回GPU列表，每块GPU含其MIG实例"""
+    gpus = []
+    for line in text.splitlines():
+        match = _GPU_LINE_RE.match(line)
+        if match:
+            gpus.append({'index': int(match.group(1)), 'name': match.group(2),
+                         'uuid': match.group(3), 'mig': []})
+            continue
+        match = _MIG_LINE_RE.match(line)
+        if match and gpus:
+            gpus[-1]['mig'].append({'index': int(match.group(2)), 'profile': match.group(1),
+                                    'uuid': match.group(3)})
+    return gpus
+
+
+def list_gpus(timeout=None, nvidia_smi='nvidia-smi'):
+    """运行 nvidia-smi -L，返回 (GPU列表, 错误信息)"""
+    try:
+        result = probe_memo.run([nvidia_smi, '-L'], timeout)
+    except FileNotFoundError:
+        return None, "未找到nvidia-smi命令"
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return None, f"无法运行 nvidia-smi -L: {e}"
+    if result.returncode != 0:
+        return None, (result.stdout.strip() or result.stderr.strip()).split('\n')[0]
+    return parse_gpu_list(result.stdout), None
+
+
+def mig_instances_present(minor, root="/"):
+    """该GPU上是否已创建MIG实例 (/proc/driver/nvidia/capabilities/gpuN/mig/gi*)
+
+    没有 procfs 时 (非Linux系统，不支持MIG) 返回 False；
+    驱动未提供 capabilities 目录或不知道次设备号时无法判断，返回 None。
+    """
+    if not os.path.isdir(os.path.join(root, "proc")):
+        return False
+    base = os.path.join(root, "proc", "driver", "nvidia", "capabilities")
+    if minor is None or not os.path.isdir(base):
+        return None
+    try:
+        names = os.listdir(os.path.join(base, f"gpu{minor}", "mig"))
+    except OSError:
+        return False
+    return any(name.startswith('gi') for name in names)
+
+
+def gpus_from_records(records, proc_gpus, root="/"):
+    """由 nvsmi_query.query_gpus 的结果构造 parse_gpu_list 格式的GPU列表，省去 nvidia-smi -L
+
+    MIG 实例的UUID只能由 nvidia-smi -L 得到，因此有GPU已创建MIG实例或无法判断时返回 None。
+    proc_gpus 为 {小写UUID: gpu_discovery.read_proc_gpus 的条目}。
+    """
+    gpus = []
+    for record in records:
+        if not record.uuid:
+            return None
+        proc = proc_gpus.get(record.uuid.lower(), {})
+        if mig_instances_present(proc.get('minor'), root) is not False:
+            return None
+        gpus.append({'index': record.index, 'name': record.name, 'uuid': record.uuid, 'mig': []})
+    return gpus
+
+
+def parse_device_list(value):
+    """解析 NVIDIA_VISIBLE_DEVICES / CUDA_VISIBLE_DEVICES 的值
+
+    返回 None (未设置)、'all' 或条目列表 (可能为空列表)。
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if value == 'all':
+        return 'all'
+    if value in ('', 'none', 'void', 'NoDevFiles'):
+        return []
+    return [item.strip() for item in value.split(',')]
+
+
+def _matches(entry, gpu):
+    """NVIDIA_VISIBLE_DEVICES 的条目是否指向该GPU (主机序号、GPU/MIG UUID 或其前缀)"""
+    if entry.isdigit():
+        return int(entry) == gpu['index']
+    uuids = [gpu['uuid']] + [mig['uuid'] for mig in gpu['mig']]
+    return any(uuid.lower().startswith(entry.lower()) for uuid in uuids)
+
+
+def _gpu_key_matches(key, gpu):
+    """主机序号或GPU UUID (及其前缀) 是否指向该GPU；不匹配MIG UUID"""
+    if key.isdigit():
+        return int(key) == gpu['index']
+    return bool(key) and gpu['uuid'].lower().startswith(key.lower())
+
+
+def _with_listed_migs(entries, gpu):
+    """NVIDIA_VISIBLE_DEVICES 只列出了该GPU的部分MIG实例时，返回只含这些实例的副本
+
+    条目可以是整块GPU (主机序号或GPU UUID)、"GPU序号:MIG序号" 或MIG UUID；
+    只有前一种会选中该GPU的全部MIG实例。
+    """
+    if not gpu['mig']:
+        return gpu
+    indexes, prefixes = set(), []
+    for entry in entries:
+        key, sep, mig = entry.partition(':')
+        if not sep:
+            if _gpu_key_matches(key, gpu):
+                return gpu
+            if key:
+                prefixes.append(key.lower())
+        elif _gpu_key_matches(key, gpu) and mig.isdigit():
+            indexes.add(int(mig))
+    return dict(gpu, mig=[mig for mig in gpu['mig']
+                          if mig['index'] in indexes
+                          or any(mig['uuid'].lower().startswith(prefix) for prefix in prefixes)])
+
+
+def cgroup_device_rules(root="/"):
+    """读取 cgroup v1 devices.list，返回允许的 (类型, 主设备号, 次设备号) 列表
+
+    '*' 表示任意；cgroup v2 用 eBPF 程序控制设备访问，没有可读的列表，此时返回 None。
+    """
+    paths = cgroup_paths(root)
+    if 'devices' not in paths:
+        return None
+    base = os.path.join(root, "sys", "fs", "cgroup", "devices")
+    for directory in (os.path.join(base, paths['devices'].lstrip('/')), base):
+        text = read_text(os.path.join(directory, "devices.list"))
+        if text is None:
+            continue
+        rules = []
+        for line in text.splitlines():
+            kind, _, rest = line.partition(' ')
+            numbers = rest.split(' ')[0]
+            if kind == 'a':
+                rules.append(('a', '*', '*'))
+            elif ':' in numbers:
+                major, minor = numbers.split(':', 1)
+                rules.append((kind, major, minor))
+        return rules
+    return None
+
+
+def cgroup_allows(rules, minor):
+    """cgroup 规则是否允许访问 /dev/nvidia{minor}；没有规则时返回 None (未知)"""
+    if rules is None or minor is None:
+        return None
+    for kind, major, rule_minor in rules:
+        if kind not in ('a', 'c'):
+            continue
+        if major in ('*', str(NVIDIA_MAJOR)) and rule_minor in ('*', str(minor)):
+            return True
+    return False
+
+
+def device_node_state(minor, root="/"):
+    """检查 /dev/nvidia{minor}: 'ok'、'missing' (容器内不存在)、'denied' (被 cgroup 拒绝)
+
+    或 'error:<errno名>' (其他打开失败，如 ENXIO 驱动未加载)；只有成功打开才算 'ok'。
+    """
+    if minor is None:
+        return None
+    path = os.path.join(root, "dev", f"nvidia{minor}")
+    if not os.path.exists(path):
+        return 'missing'
+    try:
+        fd = os.open(path, os.O_RDWR)
+    except OSError as e:
+        if e.errno in (errno.EPERM, errno.EACCES):
+            return 'denied'
+        return f"error:{errno.errorcode.get(e.errno, e.errno)}"
+    os.close(fd)
+    return 'ok'
+
+
+def _node_usable(gpu):
+    """cgroup 未拒绝且设备节点能打开 (或未检查) 的GPU才可调度"""
+    return gpu['cgroup_allowed'] is not False and gpu['node'] in ('ok', None)
+
+
+def cuda_order(gpus, order=None):
+    """按 CUDA_DEVICE_ORDER 排列物理GPU，返回 (排列后的列表, 是否确定)
+
+    PCI_BUS_ID 与 nvidia-smi 的顺序一致；默认的 FASTEST_FIRST 由驱动按算力排序，
+    型号全部相同时等同于 PCI 顺序，型号不同时只能按显存大小近似。
+    """
+    if order == 'PCI_BUS_ID' or len({gpu['name'] for gpu in gpus}) <= 1:
+        return list(gpus), True
+    return sorted(gpus, key=lambda gpu: -(gpu.get('memory_total') or 0)), False
+
+
+def resolve_cuda_visible(devices, value):
+    """按 CUDA_VISIBLE_DEVICES 从CUDA可枚举的设备中选出可见设备，返回 (设备列表, 警告)
+
+    条目可为序号、GPU-/MIG- UUID 或其前缀；遇到无效或重复的条目时，
+    CUDA 会忽略该条目及其后的全部条目。
+    """
+    entries = parse_device_list(value)
+    if entries is None or entries == 'all':
+        return list(devices), []
+    selected, warnings = [], []
+    for entry in entries:
+        device = None
+        if re.fullmatch(r'\d+', entry):
+            if int(entry) < len(devices):
+                device = devices[int(entry)]
+        elif entry:
+            candidates = [d for d in devices if d['uuid'].lower().startswith(entry.lower())]
+            device = candidates[0] if len(candidates) == 1 else None
+        if device is None or device in selected:
+            reason = "重复" if device is not None else "无效"
+            warnings.append(f"CUDA_VISIBLE_DEVICES 中的条目 {entry!r} {reason}，该条目及其后的条目被忽略")
+            break
+        selected.append(device)
+    return selected, warnings
+
+
+def resolve(env=None, gpus=None, root="/", nvidia_smi='nvidia-smi', timeout=None, check_nodes=True):
+    """计算本进程实际可调度的CUDA设备及其对应的物理GPU/MIG实例
+
+    gpus 为 parse_gpu_list 的结果，为 None 时复用 nvsmi_query.query_gpus 的结果，
+    只有GPU已创建MIG实例 (或无法判断) 时才运行 nvidia-smi -L。
+    返回 {'devices': [...], 'physical': [...], 'warnings': [...], 'error': ...}。
+    """
+    env = os.environ if env is None else env
+    report = {'devices': [], 'physical': [], 'warnings': [], 'error': None,
+              'nvidia_visible_devices': env.get('NVIDIA_VISIBLE_DEVICES'),
+              'cuda_visible_devices': env.get('CUDA_VISIBLE_DEVICES'),
+              'cuda_device_order': env.get('CUDA_DEVICE_ORDER')}
+    # 从procfs取得每块GPU的次设备号和PCI地址，从 nvidia-smi 查询取得显存大小
+    by_uuid = {gpu.get('uuid', '').lower(): gpu for gpu in gpu_discovery.read_proc_gpus(root)}
+    records, _ = nvsmi_query.query_gpus(timeout, nvidia_smi=nvidia_smi)
+    if gpus is None and records:
+        gpus = gpus_from_records(records, by_uuid, root)
+    if gpus is None:
+        gpus, report['error'] = list_gpus(timeout, nvidia_smi)
+        if gpus is None:
+            return report
+    memory = {record.uuid.lower(): record.memory_total for record in records or () if record.uuid}
+    rules = cgroup_device_rules(root)
+    for gpu in gpus:
+        proc = by_uuid.get(gpu['uuid'].lower(), {})
+        gpu['minor'] = proc.get('minor')
+        gpu['bus'] = proc.get('bus')
+        gpu['memory_total'] = memory.get(gpu['uuid'].lower())
+        gpu['cgroup_allowed'] = cgroup_allows(rules, gpu['minor'])
+        gpu['node'] = device_node_state(gpu['minor'], root) if check_nodes else None
+    report['physical'] = gpus
+
+    # NVIDIA_VISIBLE_DEVICES 由容器运行时在创建容器时生效；nvidia-smi 仍能看到其他GPU时 (如特权容器) 在此过滤
+    visible = parse_device_list(env.get('NVIDIA_VISIBLE_DEVICES'))
+    usable = list(gpus)
+    if isinstance(visible, list):
+        if visible and not all(any(_matches(e, g) for g in gpus) for e in visible if ':' not in e):
+            report['warnings'].append("NVIDIA_VISIBLE_DEVICES 中有条目不对应任何GPU (容器内GPU序号可能已重新编号)")
+        # UUID 条目不受容器内重新编号的影响，总可以用来筛选
+        by_uuid_only = all(not e.split(':')[0].isdigit() for e in visible)
+        if by_uuid_only or len(visible) != len(gpus):
+            usable = [g for g in gpus if any(_matches(e.split(':')[0], g) for e in visible)]
+        usable = [_with_listed_migs(visible, g) for g in usable]
+    for gpu in usable:
+        if not _node_usable(gpu):
+            report['warnings'].append(f"GPU {gpu['index']} ({gpu['uuid']}) 的设备节点不可访问 "
+                                      f"(cgroup允许: {gpu['cgroup_allowed']}, /dev 节点: {gpu['node']})")
+    usable = [g for g in usable if _node_usable(g)]
+
+    # CUDA 枚举: 启用MIG的GPU以其MIG实例作为设备
+    ordered, certain = cuda_order(usable, env.get('CUDA_DEVICE_ORDER'))
+    if not certain:
+        report['warnings'].append("GPU型号不同且未设置 CUDA_DEVICE_ORDER=PCI_BUS_ID，CUDA序号与nvidia-smi序号可能不一致")
+    enumerated = []
+    for gpu in ordered:
+        if gpu['mig']:
+            for mig in gpu['mig']:
+                enumerated.append({'kind': 'mig', 'uuid': mig['uuid'], 'name': f"{gpu['name']} MIG {mig['profile']}",
+                                   'gpu': gpu['index'], 'gpu_uuid': gpu['uuid'], 'mig': mig['index']})
+        else:
+            enumerated.append({'kind': 'gpu', 'uuid': gpu['uuid'], 'name': gpu['name'],
+                               'gpu': gpu['index'], 'gpu_uuid': gpu['uuid'], 'mig': None})
+
+    selected, warnings = resolve_cuda_visible(enumerated, env.get('CUDA_VISIBLE_DEVICES'))
+    report['warnings'] += warnings
+
+    # 单个CUDA进程只能使用一个MIG实例
+    migs = [d for d in selected if d['kind'] == 'mig']
+    if len(migs) > 1:
+        report['warnings'].append(f"可见 {len(migs)} 个MIG实例，但单个CUDA进程只能使用第一个 ({migs[0]['uuid']})")
+        selected = [d for d in selected if d['kind'] != 'mig' or d is migs[0]]
+    for index, device in enumerate(selected):
+        device['cuda_index'] = index
+    report['devices'] = selected
+    return report
+
+
+def format_report(report):
+    """把解析结果格式化为多行文字"""
+    lines = []
+    for name in ('nvidia_visible_devices', 'cuda_visible_devices', 'cuda_device_order'):
+        if report[name] is not None:
+            lines.append(f"{name.upper()}={report[name]}")
+    lines.append(f"可调度的CUDA设备: {len(report['devices'])} 个 (本机可见物理GPU {len(report['physical'])} 块)")
+    for device in report['devices']:
+        target = f"物理GPU {device['gpu']}" + (f" / MIG {device['mig']}" if device['mig'] is not None else "")
+        lines.append(f"  cuda:{device['cuda_index']} -> {target}: {device['name']} ({device['uuid']})")
+    for warning in report['warnings']:
+        lines.append(f"✗ {warning}")
+    return lines
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="计算容器内实际可用的CUDA设备 (环境变量、cgroup、MIG)")
+    parser.add_argument("--root", default="/", help="procfs/sysfs/dev 所在的根目录，默认 /")
+    parser.add_argument("--nvidia-smi", default="nvidia-smi", help="nvidia-smi 可执行文件路径")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    report = resolve(root=args.root, nvidia_smi=args.nvidia_smi)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    elif report['error']:
+        print(f"✗ {report['error']}")
+    else:
+        for line in format_report(report):
+            print(line)
+    return 0 if report['devices'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import os
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import compat_index
+import gpu_discovery
+import nvsmi_query
+import torch_build_info
+
+_CONDA_ROOTS = ('anaconda3', 'miniconda3', 'miniforge3', 'mambaforge')
+
+
+def _subdirs(path):
+    try:
+        with os.scandir(path) as entries:
+            return [entry.path for entry in entries if entry.is_dir()]
+    except OSError:
+        return []
+
+
+def discover_environments(extra=()):
+    """收集本机的Python环境目录 (不启动任何解释器)"""
+    home = os.path.expanduser('~')
+    candidates = [sys.prefix]
+
+    # conda: 当前环境、conda 可执行文件所在的根目录、常见安装位置以及 environments.txt
+    conda_roots = []
+    if os.environ.get('CONDA_PREFIX'):
+        candidates.append(os.environ['CONDA_PREFIX'])
+    if os.environ.get('CONDA_EXE'):
+        conda_roots.append(os.path.dirname(os.path.dirname(os.environ['CONDA_EXE'])))
+    conda_roots += [os.path.join(home, name) for name in _CONDA_ROOTS]
+    conda_roots += [os.path.join('/opt', name) for name in _CONDA_ROOTS + ('conda',)]
+    for root in conda_roots:
+        candidates.append(root)
+        candidates += _subdirs(os.path.join(root, 'envs'))
+    candidates += _subdirs(os.path.join(home, '.conda', 'envs'))
+    try:
+        with open(os.path.join(home, '.conda', 'environments.txt'), encoding='utf-8') as f:
+            candidates += [line.strip() for line in f if line.strip()]
+    except OSError:
+        pass
+
+    # virtualenvwrapper
+    candidates += _subdirs(os.environ.get('WORKON_HOME') or os.path.join(home, '.virtualenvs'))
+
+    # pyenv: 直接读取 versions 目录，等价于 `pyenv versions` 但无需启动进程
+    pyenv_root = os.environ.get('PYENV_ROOT') or os.path.join(home, '.pyenv')
+    for version_dir in _subdirs(os.path.join(pyenv_root, 'versions')):
+        candidates.append(version_dir)
+        candidates += _subdirs(os.path.join(version_dir, 'envs'))
+
+    candidates += list(extra)
+
+    seen = set()
+    environments = []
+    for path in candidates:
+        if not path or not os.path.isdir(path):
+            continue
+        real = os.path.realpath(path)
+        if real not in seen:
+            seen.add(real)
+            environments.append(path)
+    return environments
+
+
+def site_packages(prefix):
+    """返回环境中的 site-packages 目录列表"""
+    paths = glob.glob(os.path.join(prefix, 'lib', 'python*', 'site-packages'))
+    paths += glob.glob(os.path.join(prefix, 'Lib', 'site-packages'))
+    return [p for p in paths if os.path.isdir(p)]
+
+
+def driver_version():
+    """当前驱动版本，优先读取procfs"""
+    driver = gpu_discovery.read_driver_version()
+    if driver and driver['version']:
+        return driver['version']
+    records, _ = nvsmi_query.query_gpus()
+    return records[0].driver_version if records else None
+
+
+def inspect_environment(prefix, driver):
+    """读取单个环境的 torch 元数据"""
+    paths = site_packages(prefix)
+    python = None
+    for path in paths:
+        name = os.path.basename(os.path.dirname(path))
+        if name.startswith('python'):
+            python = name[len('python'):]
+    info = torch_build_info.build_info(path=paths) if paths else {'installed': False}
+    row = {'prefix': prefix, 'python': python, 'torch': None, 'variant': None, 'cuda': None,
+           'compatible': None, 'note': '未安装torch'}
+    if not paths:
+        row['note'] = '未找到site-packages'
+    elif info['installed']:
+        ok, note = compat_index.driver_compatibility(info['cuda'], driver)
+        row.update(torch=info['version'], variant=info['variant'], cuda=info['cuda'],
+                   compatible=ok, note=note)
+    return row
+
+
+def scan(environments, driver, workers=16):
+    """用线程池并行检查所有环境"""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda prefix: inspect_environment(prefix, driver), environments))
+
+
+def print_table(rows):
+    """打印扫描结果表格"""
+    width = max([len(r['prefix']) for r in rows] + [10])
+    print(f"{'环境':<{width - 2}}  {'Python':<8}{'torch':<18}{'变体':<8}结果")
+    for r in rows:
+        mark = {True: '✓', False: '✗', None: '-'}[r['compatible']]
+        print(f"{r['prefix']:<{width}}  {r['python'] or '?':<8}{r['torch'] or '-':<18}"
+              f"{r['variant'] or '-':<10}{mark} {r['note']}")
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="扫描本机所有Python环境中的PyTorch及其CUDA构建")
+    parser.add_argument("paths", nargs="*", help="额外需要检查的环境目录")
+    parser.add_argument("--workers", type=int, default=16, help="并行线程数，默认 16")
+    parser.add_argument("--all", action="store_true", help="同时列出未安装torch的环境")
+    return parser.parse_args(argv)
+
+
+def report(paths=(), workers=16, show_all=False):
+    """扫描并打印结果表格，返回 {'driver': 驱动版本, 'environments': 每个环境的结果}"""
+    started = time.perf_counter()
+    driver = driver_version()
+    environments = discover_environments(paths)
+    rows = scan(environments, driver, workers)
+    shown = rows if show_all else [r for r in rows if r['torch']]
+
+    print(f"NVIDIA驱动版本: {driver or '未检测到'}")
+    if shown:
+        print_table(shown)
+    else:
+        print("未在任何环境中找到PyTorch")
+    usable = sum(1 for r in rows if r['compatible'])
+    print(f"\n共检查 {len(rows)} 个环境，{sum(1 for r in rows if r['torch'])} 个安装了torch，"
+          f"{usable} 个可使用当前驱动运行CUDA，用时 {time.perf_counter() - started:.2f} 秒")
+    return {'driver': driver, 'environments': rows}
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    report(args.paths, args.workers, args.all)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+import os
+import sys
+import json
+import signal
+import shlex
+import time
+import asyncio
+import argparse
+
+from stats_util import percentile
+from probe_report import EXIT_OK, EXIT_FAILED, EXIT_ERROR
+
+DEFAULT_COMMAND = "python3 gpu_check.py --format ndjson"
+
+# 汇总时用于分组的字段 (来自 gpu_check --format ndjson 的汇总事件)
+GROUP_FIELDS = ('driver', 'cuda', 'torch', 'torch_cuda')
+
+# ssh 自身出错 (无法连接、认证失败等) 时的退出码，与远端命令的退出码区分
+SSH_ERROR = 255
+
+
+class Transport:
+    """把目标主机和远端命令转换为本地要执行的命令行"""
+
+    name = 'local'
+
+    def argv(self, target, command):
+        raise NotImplementedError
+
+    def transient(self, returncode):
+        """该退出码是否表示传输失败 (值得重试) 而非检测本身的结果"""
+        return False
+
+
+class SshTransport(Transport):
+    name = 'ssh'
+
+    def __init__(self, connect_timeout=10, options=()):
+        self.connect_timeout = connect_timeout
+        self.options = list(options)
+
+    def argv(self, target, command):
+        args = ['ssh', '-o', 'BatchMode=yes', '-o', f'ConnectTimeout={int(self.connect_timeout)}']
+        for option in self.options:
+            args += ['-o', option]
+        return args + [target, command]
+
+    def transient(self, returncode):
+        return returncode == SSH_ERROR
+
+
+class KubectlTransport(Transport):
+    """目标写作 [命名空间/]Pod 名"""
+
+    name = 'kubectl'
+
+    def __init__(self, container=None, context=None):
+        self.container = container
+        self.context = context
+
+    def argv(self, target, command):
+        namespace, _, pod = target.rpartition('/')
+        args = ['kubectl']
+        if self.context:
+            args += ['--context', self.context]
+        args += ['exec']
+        if namespace:
+            args += ['-n', namespace]
+        args.append(pod)
+        if self.container:
+            args += ['-c', self.container]
+        return args + ['--', 'sh', '-c', command]
+
+    def transient(self, returncode):
+        # kubectl 无法连接API服务器或Pod不存在时返回 1，远端命令的退出码会原样传回
+        return False
+
+
+class LocalTransport(Transport):
+    """在本机执行命令，命令中的 {host} 替换为目标名；用于测试或单机上的多个环境"""
+
+    name = 'local'
+
+    def argv(self, target, command):
+        return ['sh', '-c', command.replace('{host}', shlex.quote(target))]
+
+
+TRANSPORTS = {'ssh': SshTransport, 'kubectl': KubectlTransport, 'local': LocalTransport}
+
+
+def parse_events(lines):
+    """解析远端输出的 NDJSON 事件，返回 (检测事件列表, 汇总事件)；无法解析的行被忽略"""
+    probes, summary = [], None
+    for line in lines:
+        line = line.strip()
+        if not line.startswith('{'):
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if event.get('event') == 'probe':
+            probes.append(event)
+        elif event.get('event') in ('summary', 'report'):
+            summary = event
+            probes.extend(event.get('probes', []))
+    return probes, summary
+
+
+def _kill(process):
+    """结束超时的进程；POSIX 下结束整个进程组，以免子进程继续占用输出管道"""
+    try:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+async def _run_once(transport, target, command, timeout, on_event):
+    """执行一次远端检测，逐行读取输出，返回 (退出码, 输出行, 标准错误)"""
+    process = await asyncio.create_subprocess_exec(
+        *transport.argv(target, command),
+        stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        limit=1 << 22, start_new_session=os.name == 'posix')
+    lines = []
+
+    async def read_stdout():
+        async for raw in process.stdout:
+            line = raw.decode('utf-8', 'replace')
+            lines.append(line)
+            if on_event is not None and line.startswith('{'):
+                on_event(target, line)
+
+    try:
+        _, stderr = await asyncio.wait_for(
+            asyncio.gather(read_stdout(), process.stderr.read()), timeout)
+        returncode = await process.wait()
+    except asyncio.TimeoutError:
+        _kill(process)
+        await process.wait()
+        raise
+    return returncode, lines, stderr.decode('utf-8', 'replace')
+
+
+async def check_host(transport, target, command, semaphore, timeout=120.0, retries=2, backoff=2.0, on_event=None):
+    """在一台主机上运行检测；超时或传输失败时按指数退避重试
+
+    返回结果字典: target、status (ok/failed/error/unreachable)、summary、probes、attempts、
+    elapsed 和 error。
+    """
+    result = {'target': target, 'status': 'unreachable', 'summary': None, 'probes': [],
+              'attempts': 0, 'elapsed': 0.0, 'error': None}
+    async with semaphore:
+        began = time.monotonic()
+        for attempt in range(retries + 1):
+            result['attempts'] = attempt + 1
+            try:
+                returncode, lines, stderr = await _run_once(transport, target, command, timeout, on_event)
+            except asyncio.TimeoutError:
+                result['error'] = f"{timeout:g} 秒内未完成"
+            except OSError as e:
+                result['error'] = f"无法启动 {transport.name}: {e}"
+                break
+            else:
+                probes, summary = parse_events(lines)
+                if summary is not None:
+                    result.update(probes=probes, summary=summary, error=None,
+                                  status={EXIT_OK: 'ok', EXIT_FAILED: 'failed'}.get(summary.get('exit_code'), 'error'))
+                    break
+                message = (stderr.strip() or ''.join(lines).strip()).splitlines()
+                result['error'] = f"退出码 {returncode}: {message[-1] if message else '无输出'}"
+                if not transport.transient(returncode) and returncode != 0:
+                    result['status'] = 'error'
+                    break
+            if attempt < retries:
+                await asyncio.sleep(backoff * 2 ** attempt)
+        result['elapsed'] = time.monotonic() - began
+    return result
+
+
+async def sweep_async(targets, transport, command=DEFAULT_COMMAND, concurrency=64, timeout=120.0,
+                      retries=2, backoff=2.0, on_result=None, on_event=None):
+    """并发检测全部主机，每台主机完成时调用 on_result(结果)，返回按目标顺序排列的结果列表"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(target):
+        result = await check_host(transport, target, command, semaphore, timeout, retries, backoff, on_event)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    return await asyncio.gather(*(run(target) for target in targets))
+
+
+def sweep(targets, transport, **options):
+    return asyncio.run(sweep_async(targets, transport, **options))
+
+
+def group_key(result):
+    data = (result['summary'] or {}).get('data') or {}
+    return tuple(data.get(field) or '-' for field in GROUP_FIELDS)
+
+
+def aggregate(results, slow_factor=3.0):
+    """按驱动/CUDA/torch组合分组，并找出离群的主机
+
+    离群: 所在组合只占少数 (不是最常见的组合)；GPU数量或 cuda_available 与多数主机不同；
+    耗时超过中位数的 slow_factor 倍；以及检测未通过、出错或无法连接的主机。
+    """
+    reached = [r for r in results if r['summary'] is not None]
+    groups = {}
+    for result in reached:
+        groups.setdefault(group_key(result), []).append(result['target'])
+    ordered = sorted(groups.items(), key=lambda item: -len(item[1]))
+    majority = ordered[0][0] if ordered else None
+
+    def mode(field):
+        counts = {}
+        for result in reached:
+            value = result['summary']['data'].get(field)
+            counts[value] = counts.get(value, 0) + 1
+        return max(counts, key=counts.get) if counts else None
+
+    gpu_mode, available_mode = mode('gpu_count'), mode('cuda_available')
+    durations = sorted(r['elapsed'] for r in reached)
+    median = percentile(durations, 50) if durations else None
+    outliers = {}
+    for result in results:
+        reasons = []
+        if result['summary'] is None:
+            reasons.append(f"无法完成检测: {result['error']}")
+        else:
+            data = result['summary']['data']
+            if result['status'] != 'ok':
+                failed = [p['probe'] for p in result['probes'] if p['status'] != 'ok' and p['status'] != 'skipped']
+                reasons.append(f"检测未通过: {', '.join(failed) or result['status']}")
+            if group_key(result) != majority:
+                reasons.append("驱动/CUDA/torch 组合与多数主机不同")
+            if data.get('gpu_count') != gpu_mode:
+                reasons.append(f"GPU数量 {data.get('gpu_count')}，多数主机为 {gpu_mode}")
+            if data.get('cuda_available') != available_mode:
+                reasons.append(f"cuda_available={data.get('cuda_available')}，多数主机为 {available_mode}")
+            if median and len(durations) >= 5 and result['elapsed'] > slow_factor * median:
+                reasons.append(f"耗时 {result['elapsed']:.1f} 秒，中位数 {median:.1f} 秒")
+        if reasons:
+            outliers[result['target']] = reasons
+    return {
+        'hosts': len(results),
+        'reached': len(reached),
+        'groups': [{'key': dict(zip(GROUP_FIELDS, key)), 'count': len(targets), 'targets': targets}
+                   for key, targets in ordered],
+        'outliers': outliers,
+        'median_seconds': median,
+    }
+
+
+def format_result(result):
+    """一台主机完成时输出的一行"""
+    if result['summary'] is None:
+        return f"✗ {result['target']}: {result['error']} (尝试 {result['attempts']} 次)"
+    data = result['summary']['data']
+    mark = "✓" if result['status'] == 'ok' else "✗"
+    return (f"{mark} {result['target']}: 驱动 {data.get('driver') or '-'}，GPU {data.get('gpu_count')}，"
+            f"CUDA {data.get('cuda') or '-'}，torch {data.get('torch') or '-'}，"
+            f"cuda_available={data.get('cuda_available')} ({result['elapsed']:.1f}s)")
+
+
+def print_summary(summary, limit=8):
+    print("\n" + "=" * 60)
+    print(f"共 {summary['hosts']} 台主机，完成检测 {summary['reached']} 台")
+    print("按 驱动/CUDA工具包/torch/torch内置CUDA 分组:")
+    for group in summary['groups']:
+        key = group['key']
+        shown = ', '.join(group['targets'][:limit]) + (" ..." if group['count'] > limit else "")
+        print(f"  {group['count']:>4} 台  {key['driver']} / {key['cuda']} / {key['torch']} / {key['torch_cuda']}: {shown}")
+    if summary['outliers']:
+        print(f"\n需要关注的主机 ({len(summary['outliers'])} 台):")
+        for target, reasons in summary['outliers'].items():
+            print(f"  ✗ {target}: {'；'.join(reasons)}")
+    print("=" * 60)
+
+
+def read_targets(paths):
+    """从文件读取主机列表，每行一个，# 之后为注释"""
+    targets = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    targets.append(line)
+    return targets
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="在多台GPU节点上并发运行 gpu_check 并汇总结果")
+    parser.add_argument("targets", nargs="*", help="主机 (ssh 为 [用户@]主机，kubectl 为 [命名空间/]Pod)")
+    parser.add_argument("-f", "--hosts-file", action="append", default=[], metavar="PATH",
+                        help="主机列表文件，每行一个，可重复指定")
+    parser.add_argument("--transport", choices=sorted(TRANSPORTS), default="ssh", help="执行方式，默认 ssh")
+    parser.add_argument("--command", default=DEFAULT_COMMAND,
+                        help=f"在目标上执行的命令，需输出 NDJSON，默认 \"{DEFAULT_COMMAND}\"")
+    parser.add_argument("-j", "--concurrency", type=int, default=64, help="同时检测的主机数，默认 64")
+    parser.add_argument("--timeout", type=float, default=120.0, help="每台主机单次检测的超时时间 (秒)，默认 120")
+    parser.add_argument("--retries", type=int, default=2, help="超时或连接失败时的重试次数，默认 2")
+    parser.add_argument("--ssh-option", action="append", default=[], metavar="OPTION",
+                        help="传给 ssh 的 -o 选项，可重复指定")
+    parser.add_argument("--container", help="kubectl exec 的容器名")
+    parser.add_argument("--context", help="kubectl 的上下文")
+    parser.add_argument("--format", choices=('text', 'json', 'ndjson'), default="text",
+                        help="text 为逐台输出并汇总；ndjson 为转发远端事件 (附加 target 字段)；json 为单个文档")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数，返回退出码 (0 全部通过，1 有主机未通过或离群，2 有主机无法完成检测)"""
+    args = parse_args(argv)
+    targets = list(dict.fromkeys(args.targets + read_targets(args.hosts_file)))
+    if not targets:
+        print("✗ 未指定任何主机")
+        return EXIT_ERROR
+    if args.transport == 'ssh':
+        transport = SshTransport(min(args.timeout, 10), args.ssh_option)
+    elif args.transport == 'kubectl':
+        transport = KubectlTransport(args.container, args.context)
+    else:
+        transport = LocalTransport()
+
+    on_result = None
+    on_event = None
+    if args.format == 'text':
+        print(f"正在检测 {len(targets)} 台主机 (并发 {args.concurrency}，{transport.name})...")
+        on_result = lambda result: print(format_result(result), flush=True)
+    elif args.format == 'ndjson':
+        def print_event(target, line):
+            try:
+                event = json.loads(line)
+            except ValueError:
+                return
+            event['target'] = target
+            print(json.dumps(event, ensure_ascii=False), flush=True)
+        on_event = print_event
+
+    results = sweep(targets, transport, command=args.command, concurrency=args.concurrency,
+                    timeout=args.timeout, retries=args.retries, on_result=on_result, on_event=on_event)
+    summary = aggregate(results)
+    if args.format == 'text':
+        print_summary(summary)
+    elif args.format == 'json':
+        print(json.dumps({'summary': summary, 'results': results}, ensure_ascii=False, indent=2))
+    else:
+        print(json.dumps({'event': 'fleet_summary', **summary}, ensure_ascii=False), flush=True)
+
+    if summary['reached'] < summary['hosts']:
+        return EXIT_ERROR
+    return EXIT_FAILED if summary['outliers'] else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
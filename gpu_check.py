@@ -1,25 +1,76 @@
 import os
+import re
 import sys
+import argparse
 import subprocess
 import platform
 
-def check_nvidia_smi():
-    """检查是否能运行nvidia-smi命令"""
-    try:
-        result = subprocess.run(['nvidia-smi'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if result.returncode == 0:
-            print("✓ nvidia-smi 命令执行成功，发现NVIDIA显卡")
-            print(result.stdout.split('\n')[0])  # 打印第一行，通常包含驱动版本信息
-            return True
-        else:
-            print("✗ nvidia-smi 命令执行失败，未找到NVIDIA显卡或驱动未正确安装")
-            return False
-    except FileNotFoundError:
-        print("✗ nvidia-smi 命令不存在，未找到NVIDIA驱动")
+import probe_cache
+import probe_memo
+import probe_trace
+import gpu_discovery
+import nvsmi_query
+import cuda_inventory
+import device_resolver
+import gpu_topology
+import probe_report
+from probe_scheduler import Probe, ProbeResult, run_probes, STATUS_SKIPPED, STATUS_TIMEOUT, STATUS_ERROR
+
+@probe_trace.traced()
+def check_nvidia_smi(timeout=None, data=None):
+    """检查NVIDIA驱动和显卡，优先读取procfs/sysfs，无法读取时才运行nvidia-smi
+
+    data 不为 None 时写入驱动版本和GPU列表。
+    """
+    data = {} if data is None else data
+    info = gpu_discovery.discover()
+    if info['driver'] and info['gpus']:
+        data.update(source='procfs', driver=info['driver']['version'], gpus=info['gpus'])
+        print(f"✓ 检测到NVIDIA驱动 (版本 {info['driver']['version']})，发现 {len(info['gpus'])} 块NVIDIA显卡")
+        for i, gpu in enumerate(info['gpus']):
+            print(f"  - GPU {i}: {gpu.get('name', '未知型号')} ({gpu['bus']})")
+        return True
+    if info['pci'] and not info['driver']:
+        drivers = sorted({d['driver'] or '无' for d in info['pci']})
+        print(f"  发现 {len(info['pci'])} 块NVIDIA显卡 (PCI)，但NVIDIA驱动未加载 (当前驱动: {', '.join(drivers)})")
+
+    records, error = nvsmi_query.query_gpus(timeout)
+    if records is None:
+        print(f"✗ {error}")
+        return False
+    data.update(source='nvidia-smi', driver=records[0].driver_version if records else None,
+                gpus=[record.to_dict() for record in records])
+    if not records:
+        print("✗ nvidia-smi 未报告任何GPU，未找到NVIDIA显卡或驱动未正确安装")
         return False
+    print(f"✓ nvidia-smi 命令执行成功，发现 {len(records)} 块NVIDIA显卡 (驱动版本 {records[0].driver_version})")
+    for record in records:
+        print(f"  - {nvsmi_query.format_record(record)}")
+    return True
+
+@probe_trace.traced()
+def check_cuda(timeout=None, data=None):
+    """检查CUDA是否可用及版本，优先读取各工具包的版本文件，找不到时才运行nvcc
+
+    data 不为 None 时写入生效的CUDA版本和全部工具包。
+    """
+    data = {} if data is None else data
+    toolkits = [t for t in cuda_inventory.inventory() if t['version']]
+    if toolkits:
+        active = [t for t in toolkits if t['active']]
+        data.update(source='version_file', version=(active or toolkits)[-1]['version'],
+                    toolkits=[{'path': t['path'], 'version': t['version'], 'active': t['active']}
+                              for t in toolkits])
+        print(f"✓ 发现 {len(toolkits)} 个CUDA工具包")
+        for toolkit in toolkits:
+            lines = cuda_inventory.format_toolkit(toolkit)
+            print(f"  - {lines[0]}")
+            for line in lines[1:]:
+                print(f"    {line}")
+        if not any(t['active'] for t in toolkits):
+            print("✗ 这些工具包均未加入PATH、LD_LIBRARY_PATH或CUDA_HOME")
+        return True
 
-def check_cuda():
-    """检查CUDA是否可用及版本"""
     try:
         if platform.system() == "Windows":
             cuda_path = os.environ.get('CUDA_PATH')
@@ -27,7 +78,8 @@ def check_cuda():
                 print(f"✓ 发现CUDA环境变量: {cuda_path}")
                 nvcc_path = os.path.join(cuda_path, 'bin', 'nvcc.exe')
                 if os.path.exists(nvcc_path):
-                    result = subprocess.run([nvcc_path, '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                    result = probe_memo.run([nvcc_path, '--version'], timeout)
+                    data.update(source='nvcc', version=_nvcc_release(result.stdout))
                     print(f"✓ CUDA版本信息: {result.stdout.strip()}")
                     return True
                 else:
@@ -37,8 +89,9 @@ def check_cuda():
         else:
             # Linux/Mac
             try:
-                result = subprocess.run(['nvcc', '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                result = probe_memo.run(['nvcc', '--version'], timeout)
                 if result.returncode == 0:
+                    data.update(source='nvcc', version=_nvcc_release(result.stdout))
                     print(f"✓ CUDA版本信息: {result.stdout.strip()}")
                     return True
                 else:
@@ -47,22 +100,105 @@ def check_cuda():
             except FileNotFoundError:
                 print("✗ 未找到NVCC命令，CUDA可能未安装")
                 return False
+    except subprocess.TimeoutExpired:
+        print(f"✗ NVCC 在 {timeout:.1f} 秒内未响应")
+        return False
     except Exception as e:
         print(f"✗ 检查CUDA时出错: {e}")
     return False
 
-def check_pytorch():
-    """检查PyTorch是否安装及GPU是否可用"""
+@probe_trace.traced()
+def check_devices(timeout=None, data=None):
+    """计算本进程实际可调度的CUDA设备 (考虑 *_VISIBLE_DEVICES、cgroup 和MIG)
+
+    data 不为 None 时写入可调度设备及其对应的物理GPU/MIG实例。
+    """
+    data = {} if data is None else data
+    report = device_resolver.resolve(timeout=timeout)
+    data.update(devices=report['devices'], warnings=report['warnings'])
+    if report['error']:
+        print(f"✗ {report['error']}")
+        return False
+    for line in device_resolver.format_report(report):
+        if line.startswith("✗"):
+            print(line)
+        else:
+            print(f"  {line}" if line.startswith(" ") else f"  - {line}")
+    return bool(report['devices'])
+
+@probe_trace.traced()
+def check_topology(timeout=None, data=None):
+    """多块GPU时输出GPU间的互联类型 (NVLink/PCIe/跨插槽) 及NUMA亲和性
+
+    data 不为 None 时写入链路矩阵和两块GPU时的推荐组合。
+    """
+    data = {} if data is None else data
+    # 单块GPU时拓扑没有意义；GPU数量优先取自procfs，否则复用 nvidia_smi 检测项已缓存的查询结果
+    info = gpu_discovery.discover()
+    if info['driver'] and info['gpus']:
+        count = len(info['gpus'])
+    else:
+        records, _ = nvsmi_query.query_gpus(timeout)
+        count = len(records or ())
+    if count < 2:
+        return True
+    topology, error = gpu_topology.query_topology(timeout)
+    if topology is None:
+        print(f"✗ 无法获取GPU拓扑: {error}")
+        return False
+    if len(topology['gpus']) < 2:
+        return True
+    best = gpu_topology.recommend(topology, 2)
+    data.update(links={f"{i}-{j}": link for (i, j), link in topology['links'].items()},
+                numa={g['index']: g['numa'] for g in topology['gpus']}, best_pair=best)
+    print("  GPU互联拓扑:")
+    for line in gpu_topology.format_matrix(topology):
+        print(f"    {line}")
+    print(f"  - 互联最好的两块GPU: {best['gpus']} ({gpu_topology.describe_link(best['weakest_link'])})"
+          "，更多组合可运行 python gpu_topology.py -n <数量>")
+    return True
+
+def _nvcc_release(text):
+    """从 nvcc --version 的输出中取出 "release 12.1" 中的版本号"""
+    match = re.search(r'release\s+([\d.]+)', text)
+    return match.group(1) if match else None
+
+@probe_trace.traced()
+def check_cuda_tensor():
+    """测试张量是否能成功移至GPU"""
     try:
-        import torch
+        torch = probe_memo.import_module('torch')
+        x = torch.tensor([1.0])
+        with probe_trace.span('first tensor.cuda()', 'cuda'):
+            x = x.cuda()
+        print("✓ 成功创建GPU张量")
+        return True
+    except Exception as e:
+        print(f"✗ 无法创建GPU张量: {e}")
+        return False
+
+@probe_trace.traced()
+def check_pytorch(tensor_test=True, data=None):
+    """检查PyTorch是否安装及GPU是否可用
+
+    data 不为 None 时写入torch版本、内置CUDA版本和设备信息。
+    """
+    data = {} if data is None else data
+    data['installed'] = False
+    try:
+        torch = probe_memo.import_module('torch')
+        data.update(installed=True, version=torch.__version__, cuda=torch.version.cuda)
         print(f"✓ PyTorch已安装，版本: {torch.__version__}")
         
         # 检查CUDA是否对PyTorch可用
-        cuda_available = torch.cuda.is_available()
+        with probe_trace.span('torch.cuda.is_available()', 'cuda'):
+            cuda_available = torch.cuda.is_available()
+        data['cuda_available'] = cuda_available
         if cuda_available:
             device_count = torch.cuda.device_count()
             current_device = torch.cuda.current_device()
             device_name = torch.cuda.get_device_name(current_device)
+            data.update(device_count=device_count, device_name=device_name)
             
             print(f"✓ PyTorch可以使用CUDA")
             print(f"  - CUDA设备数量: {device_count}")
@@ -72,13 +208,8 @@ def check_pytorch():
             # 显示CUDA版本
             print(f"  - CUDA版本: {torch.version.cuda}")
             
-            # 测试张量是否能成功移至GPU
-            try:
-                x = torch.tensor([1.0])
-                x = x.cuda()
-                print("✓ 成功创建GPU张量")
-            except Exception as e:
-                print(f"✗ 无法创建GPU张量: {e}")
+            if tensor_test:
+                check_cuda_tensor()
         else:
             print("✗ PyTorch无法使用CUDA")
             
@@ -90,35 +221,181 @@ def check_pytorch():
         print(f"✗ 检查PyTorch时出错: {e}")
         return False
 
-def main():
-    """主函数"""
-    print("\n" + "="*50)
-    print("GPU检测工具 - 检测GPU、CUDA和PyTorch")
-    print("="*50 + "\n")
-    
-    print("[1] 系统信息:")
-    print(f"  - 操作系统: {platform.system()} {platform.version()}")
-    print(f"  - Python版本: {platform.python_version()}")
-    print("\n")
-    
-    print("[2] 检测NVIDIA GPU:")
-    nvidia_gpu = check_nvidia_smi()
-    print("\n")
-    
-    print("[3] 检测CUDA安装:")
-    cuda_installed = check_cuda()
-    print("\n")
-    
-    print("[4] 检测PyTorch CUDA支持:")
-    pytorch_cuda = check_pytorch()
-    print("\n")
+def _print_probe(result):
+    """打印单个检测项的输出及异常状态"""
+    if result.output:
+        print(result.output, end="")
+    if result.status == STATUS_TIMEOUT:
+        print(f"✗ 检测超时: {result.error}")
+    elif result.status == STATUS_ERROR:
+        print(f"✗ 检测出错: {result.error}")
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="GPU检测工具 - 检测GPU、CUDA和PyTorch")
+    parser.add_argument("--timeout", type=float, default=20.0,
+                        help="单个检测项的超时时间 (秒)，默认 20")
+    parser.add_argument("--budget", type=float, default=60.0,
+                        help="全部检测的总时间预算 (秒)，默认 60")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不读取也不写入检测结果缓存")
+    parser.add_argument("--refresh", action="store_true",
+                        help="忽略已有缓存，重新检测并更新缓存")
+    parser.add_argument("--cache-ttl", type=float, default=probe_cache.DEFAULT_TTL,
+                        help=f"缓存有效期 (秒)，默认 {probe_cache.DEFAULT_TTL}")
+    parser.add_argument("--profile", action="store_true",
+                        help="记录各检测步骤耗时并输出排序后的明细")
+    parser.add_argument("--trace-file", metavar="PATH",
+                        help="把耗时记录写为 Chrome trace-event JSON (可用 Perfetto 打开)")
+    parser.add_argument("--stats", action="store_true",
+                        help="输出进程内探测结果复用的统计 (节省的外部命令和模块导入次数)")
+    parser.add_argument("--format", choices=probe_report.FORMATS, default="text",
+                        help="输出格式: text 为文字报告，ndjson 为每项检测完成即输出一行JSON，json 为单个JSON文档")
+    return parser.parse_args(argv)
+
+def _dump_results(results):
+    """将检测结果转换为可缓存的字典"""
+    return {
+        name: {
+            'status': r.status,
+            'value': bool(r.value),
+            'output': r.output,
+            'elapsed': r.elapsed,
+            'error': None if r.error is None else str(r.error),
+            'data': r.data,
+        }
+        for name, r in results.items()
+    }
+
+def _load_results(data):
+    """由缓存字典还原检测结果"""
+    return [
+        ProbeResult(name, d['status'], d['value'], d['output'], d['elapsed'], d['error'], d.get('data'))
+        for name, d in data.items()
+    ]
+
+def summarize(results):
+    """从各检测项的结构化结果中提取驱动、CUDA和PyTorch版本等关键信息"""
+    gpu = results["nvidia_smi"].data
+    cuda = results["cuda"].data
+    torch = results["pytorch"].data
+    devices = results["devices"].data
+    return {
+        'driver': gpu.get('driver'),
+        'gpu_count': len(gpu.get('gpus') or []),
+        'schedulable_devices': len(devices.get('devices') or []),
+        'cuda': cuda.get('version'),
+        'torch': torch.get('version'),
+        'torch_cuda': torch.get('cuda'),
+        'cuda_available': bool(torch.get('cuda_available')),
+    }
+
+def main(argv=None):
+    """主函数，返回退出码 (0 全部通过，1 有检测项未通过，2 有检测项出错或超时)"""
+    args = parse_args(argv)
+    if args.profile or args.trace_file:
+        probe_trace.enable()
+    reporter = probe_report.Reporter('gpu_check', args.format)
+    text = not reporter.structured
+
+    if text:
+        print("\n" + "="*50)
+        print("GPU检测工具 - 检测GPU、CUDA和PyTorch")
+        print("="*50 + "\n")
+        
+        print("[1] 系统信息:")
+        print(f"  - 操作系统: {platform.system()} {platform.version()}")
+        print(f"  - Python版本: {platform.python_version()}")
+        print("\n")
+
+    # 各检测项并发执行；没有驱动或PyTorch不支持CUDA时跳过GPU张量测试
+    probes = [
+        Probe("nvidia_smi", check_nvidia_smi, timeout=args.timeout),
+        Probe("devices", check_devices, requires=("nvidia_smi",), timeout=args.timeout),
+        Probe("topology", check_topology, requires=("nvidia_smi",), timeout=args.timeout),
+        Probe("cuda", check_cuda, timeout=args.timeout),
+        Probe("pytorch", lambda timeout, data: check_pytorch(tensor_test=False, data=data),
+              timeout=args.timeout),
+        Probe("cuda_tensor", lambda timeout, data: check_cuda_tensor(),
+              requires=("nvidia_smi", "pytorch"), timeout=args.timeout),
+    ]
+    sections = [
+        ("[2] 检测NVIDIA GPU:", ("nvidia_smi", "devices", "topology")),
+        ("[3] 检测CUDA安装:", ("cuda",)),
+        ("[4] 检测PyTorch CUDA支持:", ("pytorch", "cuda_tensor")),
+    ]
+    results = {}
+
+    def flush_sections(result):
+        # 按固定顺序尽早输出已完成的章节
+        results[result.name] = result
+        while sections and all(name in results for name in sections[0][1]):
+            title, names = sections.pop(0)
+            print(title)
+            for name in names:
+                r = results[name]
+                if r.status == STATUS_SKIPPED:
+                    if name in ("devices", "topology"):
+                        continue
+                    if name == "cuda_tensor" and results["pytorch"].ok:
+                        print("  - 未检测到NVIDIA驱动，跳过GPU张量测试")
+                    continue
+                _print_probe(r)
+            print("\n")
+
+    def emit(result):
+        # 结构化输出时每项检测完成即输出事件，不等待其余检测
+        results[result.name] = result
+        reporter.result(result)
+
+    on_result = flush_sections if text else emit
+    use_cache = not args.no_cache
+    key = probe_cache.fingerprint() if use_cache else None
+    hit = probe_cache.load('gpu_check', args.cache_ttl, key) if use_cache and not args.refresh else None
+    cached_age = None
+    if hit is not None:
+        data, cached_age = hit
+        if text:
+            print(f"(使用 {cached_age:.0f} 秒前的缓存结果，--refresh 可强制重新检测)\n")
+        for result in _load_results(data):
+            on_result(result)
+    else:
+        fresh = run_probes(probes, budget=args.budget, on_result=on_result)
+        # 超时或出错的结果可能是暂时性的，不写入缓存
+        if use_cache and not any(r.status in (STATUS_TIMEOUT, STATUS_ERROR) for r in fresh.values()):
+            probe_cache.store('gpu_check', _dump_results(fresh), key)
+    if args.trace_file:
+        probe_trace.write_chrome_trace(args.trace_file)
+
+    if not text:
+        summary = summarize(results)
+        summary['cached_age'] = cached_age
+        if args.stats:
+            summary['memo'] = probe_memo.stats()
+        if args.profile:
+            summary['profile'] = probe_trace.summary()
+        return reporter.finish(summary)
+
+    nvidia_gpu = results["nvidia_smi"].ok
+    cuda_installed = results["cuda"].ok
+    pytorch_cuda = results["pytorch"].ok
     
     print("="*50)
     print("总结:")
     print(f"  NVIDIA GPU: {'可用' if nvidia_gpu else '不可用'}")
     print(f"  CUDA安装: {'已安装' if cuda_installed else '未安装或不可用'}")
     print(f"  PyTorch CUDA支持: {'支持' if pytorch_cuda else '不支持'}")
+    if args.stats:
+        print(f"  {probe_memo.format_stats()}")
     print("="*50)
 
+    if args.profile:
+        print("\n耗时明细:")
+        for line in probe_trace.format_summary():
+            print(f"  {line}")
+    if args.trace_file:
+        print(f"\n已写出 trace 文件: {args.trace_file}")
+    return probe_report.exit_code(r.status for r in results.values())
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import os
+import re
+
+import probe_trace
+
+# NVIDIA 的 PCI 厂商ID
+NVIDIA_VENDOR_ID = "0x10de"
+
+_DRIVER_VERSION_RE = re.compile(r"Kernel Module(?:\s+for\s+\S+)?\s+(\d+(?:\.\d+)+)")
+
+
+def _path(root, *parts):
+    return os.path.join(root, *parts)
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def read_driver_version(root="/"):
+    """读取 /proc/driver/nvidia/version，返回驱动信息字典；驱动未加载时返回 None"""
+    text = _read(_path(root, "proc", "driver", "nvidia", "version"))
+    if not text:
+        return None
+    banner = text.splitlines()[0].strip()
+    match = _DRIVER_VERSION_RE.search(banner)
+    return {
+        'version': match.group(1) if match else None,
+        'banner': banner,
+        'open_kernel_module': 'Open Kernel Module' in banner,
+    }
+
+
+def read_proc_gpus(root="/"):
+    """读取 /proc/driver/nvidia/gpus/*/information 中的每块GPU信息"""
+    base = _path(root, "proc", "driver", "nvidia", "gpus")
+    try:
+        entries = sorted(os.listdir(base))
+    except OSError:
+        return []
+
+    keys = {
+        'Model': 'name',
+        'GPU UUID': 'uuid',
+        'Bus Location': 'bus',
+        'Device Minor': 'minor',
+        'Video BIOS': 'vbios',
+        'Bus Type': 'bus_type',
+        'IRQ': 'irq',
+    }
+    gpus = []
+    for entry in entries:
+        text = _read(os.path.join(base, entry, "information"))
+        if text is None:
+            continue
+        gpu = {'bus': entry.lower()}
+        for line in text.splitlines():
+            name, sep, value = line.partition(":")
+            if sep and name.strip() in keys:
+                gpu[keys[name.strip()]] = value.strip()
+        gpu['bus'] = gpu['bus'].lower()
+        if 'minor' in gpu and gpu['minor'].isdigit():
+            gpu['minor'] = int(gpu['minor'])
+        gpus.append(gpu)
+    return gpus
+
+
+def read_pci_gpus(root="/"):
+    """扫描 /sys/bus/pci/devices 中厂商为 NVIDIA 的显示设备"""
+    base = _path(root, "sys", "bus", "pci", "devices")
+    try:
+        entries = sorted(os.listdir(base))
+    except OSError:
+        return []
+
+    devices = []
+    for entry in entries:
+        device_dir = os.path.join(base, entry)
+        vendor = (_read(os.path.join(device_dir, "vendor")) or "").strip().lower()
+        if vendor != NVIDIA_VENDOR_ID:
+            continue
+        pci_class = (_read(os.path.join(device_dir, "class")) or "").strip().lower()
+        # 0x03xxxx 为显示控制器，排除同一显卡上的音频、USB等功能
+        if not pci_class.startswith("0x03"):
+            continue
+        driver = os.path.join(device_dir, "driver")
+        devices.append({
+            'bus': entry.lower(),
+            'device_id': (_read(os.path.join(device_dir, "device")) or "").strip().lower(),
+            'class': pci_class,
+            'driver': os.path.basename(os.readlink(driver)) if os.path.islink(driver) else None,
+        })
+    return devices
+
+
+@probe_trace.traced(category='probe')
+def discover(root="/"):
+    """不启动任何进程，从 procfs/sysfs 获取驱动版本和GPU列表
+
+    返回 {'driver': ..., 'gpus': [...], 'pci': [...]}；
+    驱动未加载 (没有 /proc/driver/nvidia/version) 时 driver 为 None。
+    """
+    driver = read_driver_version(root)
+    pci = read_pci_gpus(root)
+    gpus = read_proc_gpus(root) if driver else []
+
+    by_bus = {device['bus']: device for device in pci}
+    for gpu in gpus:
+        device = by_bus.get(gpu['bus'])
+        if device:
+            gpu['device_id'] = device['device_id']
+    return {'driver': driver, 'gpus': gpus, 'pci': pci}
@@ -0,0 +1,240 @@
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+import nvsmi_query
+import probe_trace
+from cgroup_util import cgroup_paths
+
+_MIB = 1024 * 1024
+
+# 一次 nvidia-smi 调用列出全部GPU上的计算进程；进程名可能含逗号，放在最后
+APP_FIELDS = ('pid', 'used_memory', 'gpu_uuid', 'process_name')
+
+# cgroup 路径中的容器ID (docker/containerd/cri-o) 和 Kubernetes Pod UID
+_CONTAINER_RE = re.compile(r'([0-9a-f]{64})')
+_POD_RE = re.compile(r'pod([0-9a-f]{8}[-_][0-9a-f]{4}[-_][0-9a-f]{4}[-_][0-9a-f]{4}[-_][0-9a-f]{12})')
+
+
+def parse_compute_apps(text):
+    """解析 --query-compute-apps 的CSV输出，返回进程列表 (显存单位 MiB)"""
+    apps = []
+    for line in text.splitlines():
+        parts = line.strip().split(',')
+        if len(parts) < len(APP_FIELDS) - 1:
+            continue
+        pid = nvsmi_query.convert_field(parts[0], int)
+        if pid is None:
+            continue
+        apps.append({
+            'pid': pid,
+            'used_mib': nvsmi_query.convert_field(parts[1], int),
+            'gpu_uuid': nvsmi_query.convert_field(parts[2], str),
+            'name': nvsmi_query.convert_field(','.join(parts[3:]), str) if len(parts) > 3 else None,
+        })
+    return apps
+
+
+def query_compute_apps(timeout=None, nvidia_smi='nvidia-smi'):
+    """查询全部GPU上的计算进程，返回 (进程列表, 错误信息)
+
+    显存占用随时变化，因此每次都重新运行 nvidia-smi，不使用进程内缓存。
+    """
+    cmd = [nvidia_smi, '--query-compute-apps=' + ','.join(APP_FIELDS), '--format=csv,noheader,nounits']
+    try:
+        with probe_trace.span(f"spawn {nvidia_smi}", 'subprocess'):
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    text=True, timeout=timeout)
+    except FileNotFoundError:
+        return None, "未找到nvidia-smi命令，NVIDIA驱动可能未安装"
+    except subprocess.TimeoutExpired:
+        return None, f"nvidia-smi 在 {timeout:.1f} 秒内未响应"
+    except OSError as e:
+        return None, f"无法运行nvidia-smi: {e}"
+    if result.returncode != 0:
+        return None, (result.stdout.strip() or result.stderr.strip()).split('\n')[0]
+    return parse_compute_apps(result.stdout), None
+
+
+def process_cgroup(pid, root="/"):
+    """进程所在的 cgroup 路径；进程不在本PID命名空间中 (如容器内看宿主机PID) 时返回 None
+
+    cgroup v2 只有一行 "0::路径"；v1 优先取 memory 控制器的路径。
+    """
+    paths = cgroup_paths(root, pid)
+    return paths.get('') or paths.get('memory') or next(iter(paths.values()), None)
+
+
+def container_of(cgroup):
+    """从 cgroup 路径中识别容器，返回 "pod <UID>"、"container <短ID>" 或 None (宿主机进程)"""
+    if not cgroup:
+        return None
+    pod = _POD_RE.search(cgroup)
+    container = _CONTAINER_RE.search(cgroup)
+    if pod:
+        uid = pod.group(1).replace('_', '-')
+        return f"pod {uid}" + (f" / container {container.group(1)[:12]}" if container else "")
+    if container:
+        return f"container {container.group(1)[:12]}"
+    return None
+
+
+def owner(app):
+    """进程的归属: 容器、宿主机，或无法读取其 cgroup 时记为其他PID命名空间"""
+    return app['container'] or ('宿主机' if app['cgroup'] is not None else '其他PID命名空间')
+
+
+def _torch_uuid(props):
+    """torch 设备属性中的UUID (torch 2.x 起提供)，统一为 nvidia-smi 的 "GPU-..." 形式"""
+    uuid = getattr(props, 'uuid', None)
+    if uuid is None:
+        return None
+    uuid = str(uuid)
+    return uuid if uuid.startswith(('GPU-', 'MIG-')) else f"GPU-{uuid}"
+
+
+def torch_devices(torch):
+    """读取本进程可见的每个CUDA设备的空闲显存和缓存分配器状态 (单位 MiB)
+
+    mem_get_info 返回驱动报告的整卡空闲显存；reserved 为本进程缓存分配器持有的显存，
+    其中未被张量使用的部分 (reserved - allocated) 只能被本进程复用。
+    fragmentation 为缓存中无法整块使用的碎片 (inactive split) 占 reserved 的比例。
+    注意: 对尚未初始化的设备调用 mem_get_info 会在该设备上创建CUDA上下文。
+    """
+    devices = []
+    for index in range(torch.cuda.device_count()):
+        props = torch.cuda.get_device_properties(index)
+        device = {'cuda_index': index, 'name': props.name, 'uuid': _torch_uuid(props),
+                  'total_mib': props.total_memory // _MIB, 'free_mib': None}
+        if hasattr(torch.cuda, 'mem_get_info'):
+            free, total = torch.cuda.mem_get_info(index)
+            device.update(free_mib=free // _MIB, total_mib=total // _MIB)
+        reserved = torch.cuda.memory_reserved(index)
+        allocated = torch.cuda.memory_allocated(index)
+        stats = torch.cuda.memory_stats(index) if hasattr(torch.cuda, 'memory_stats') else {}
+        inactive = stats.get('inactive_split_bytes.all.current', reserved - allocated)
+        device.update(reserved_mib=reserved / _MIB, allocated_mib=allocated / _MIB,
+                      cached_free_mib=(reserved - allocated) / _MIB,
+                      fragmentation=inactive / reserved if reserved else 0.0)
+        devices.append(device)
+    return devices
+
+
+def snapshot(torch=None, timeout=None, nvidia_smi='nvidia-smi', root="/"):
+    """一次性汇总全部GPU的显存使用
+
+    nvidia-smi 提供每块GPU的总量/已用和每个进程的占用；torch 不为 None 时再用 mem_get_info
+    取得本进程视角的空闲显存及缓存分配器状态。进程按 cgroup 归属到容器。
+    返回 {'gpus': [...], 'processes': [...], 'containers': {...}, 'errors': [...]}。
+    """
+    errors = []
+    records, error = nvsmi_query.query_gpus(timeout, nvidia_smi=nvidia_smi, cached=False)
+    if error:
+        errors.append(error)
+    apps, error = query_compute_apps(timeout, nvidia_smi) if records else ([], None)
+    if error:
+        errors.append(error)
+    apps = apps or []
+
+    gpus = []
+    for record in records or ():
+        gpus.append({'index': record.index, 'uuid': record.uuid, 'name': record.name,
+                     'total_mib': record.memory_total, 'used_mib': record.memory_used,
+                     'free_mib': record.memory_free, 'source': 'nvidia-smi',
+                     'processes': [], 'torch': None})
+    by_uuid = {gpu['uuid']: gpu for gpu in gpus if gpu['uuid']}
+
+    if torch is not None:
+        try:
+            devices = torch_devices(torch)
+        except Exception as e:
+            devices = []
+            errors.append(f"无法通过torch读取显存: {e}")
+        for device in devices:
+            gpu = by_uuid.get(device['uuid'])
+            if gpu is None and device['uuid'] is None and len(devices) == len(gpus):
+                # 旧版torch不提供UUID，设备数量一致时按顺序对应
+                gpu = gpus[device['cuda_index']]
+            if gpu is None:
+                gpu = {'index': None, 'uuid': device['uuid'], 'name': device['name'],
+                       'total_mib': None, 'used_mib': None, 'free_mib': None, 'source': None,
+                       'processes': []}
+                gpus.append(gpu)
+            gpu['torch'] = device
+            if device['free_mib'] is not None:
+                gpu.update(total_mib=device['total_mib'], free_mib=device['free_mib'],
+                           used_mib=device['total_mib'] - device['free_mib'], source='mem_get_info')
+
+    containers = {}
+    for app in apps:
+        app['cgroup'] = process_cgroup(app['pid'], root)
+        app['container'] = container_of(app['cgroup'])
+        app['self'] = app['pid'] == os.getpid()
+        gpu = by_uuid.get(app['gpu_uuid'])
+        if gpu is not None:
+            gpu['processes'].append(app)
+        containers[owner(app)] = containers.get(owner(app), 0) + (app['used_mib'] or 0)
+    return {'gpus': gpus, 'processes': apps, 'containers': containers, 'errors': errors}
+
+
+def format_gpu(gpu):
+    """格式化单块GPU的显存情况"""
+    title = f"GPU {gpu['index']}" if gpu['index'] is not None else f"cuda:{gpu['torch']['cuda_index']}"
+    lines = [f"{title}: {gpu['name']}"]
+    if gpu['free_mib'] is not None:
+        lines.append(f"  总显存 {gpu['total_mib']} MiB，已用 {gpu['used_mib']} MiB，"
+                     f"可用 {gpu['free_mib']} MiB (来源: {gpu['source']})")
+    torch = gpu.get('torch')
+    if torch and torch['reserved_mib']:
+        lines.append(f"  本进程缓存: 已保留 {torch['reserved_mib']:.1f} MiB，张量占用 {torch['allocated_mib']:.1f} MiB，"
+                     f"碎片率 {torch['fragmentation']:.0%}")
+    for app in gpu['processes']:
+        mark = " (本进程)" if app['self'] else ""
+        lines.append(f"  - PID {app['pid']}{mark}: {app['used_mib']} MiB  {app['name'] or ''}  [{owner(app)}]")
+    return lines
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="按GPU、进程和容器统计显存使用及可用余量")
+    parser.add_argument("--no-torch", action="store_true",
+                        help="不导入torch，只使用 nvidia-smi (避免在各GPU上创建CUDA上下文)")
+    parser.add_argument("--nvidia-smi", default="nvidia-smi", help="nvidia-smi 可执行文件路径")
+    parser.add_argument("--root", default="/", help="procfs 所在的根目录，默认 /")
+    parser.add_argument("--timeout", type=float, default=20.0, help="nvidia-smi 超时时间 (秒)，默认 20")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    torch = None
+    if not args.no_torch:
+        try:
+            import torch
+            if not torch.cuda.is_available():
+                torch = None
+        except ImportError:
+            torch = None
+    report = snapshot(torch, args.timeout, args.nvidia_smi, args.root)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        for gpu in report['gpus']:
+            for line in format_gpu(gpu):
+                print(line)
+        if report['containers']:
+            print("按容器汇总:")
+            for owner, used in sorted(report['containers'].items(), key=lambda item: -item[1]):
+                print(f"  - {owner}: {used} MiB")
+        for error in report['errors']:
+            print(f"✗ {error}")
+    return 0 if report['gpus'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
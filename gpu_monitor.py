@@ -0,0 +1,196 @@
+import sys
+import json
+import math
+import time
+import argparse
+import subprocess
+from array import array
+
+import nvsmi_query
+from stats_util import summarize
+
+# 每块GPU滚动统计的指标: (输出名称, GpuRecord 属性, 单位)
+METRICS = (
+    ('utilization', 'utilization', '%'),
+    ('memory_used', 'memory_used', ' MiB'),
+    ('temperature', 'temperature', '°C'),
+    ('power_draw', 'power_draw', ' W'),
+)
+
+
+class RingBuffer:
+    """定长环形缓冲区，数据存放在 array('d') 中，缺失值记为 NaN"""
+
+    __slots__ = ('_data', '_pos', '_count')
+
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError("环形缓冲区容量必须大于0")
+        self._data = array('d', [math.nan]) * capacity
+        self._pos = 0
+        self._count = 0
+
+    def append(self, value):
+        self._data[self._pos] = math.nan if value is None else value
+        self._pos = (self._pos + 1) % len(self._data)
+        self._count = min(self._count + 1, len(self._data))
+
+    def __len__(self):
+        return self._count
+
+    def values(self):
+        """按时间顺序返回有效值"""
+        if self._count < len(self._data):
+            items = self._data[:self._count]
+        else:
+            items = self._data[self._pos:] + self._data[:self._pos]
+        return [v for v in items if not math.isnan(v)]
+
+
+class GpuWindow:
+    """单块GPU最近若干个采样的滚动窗口"""
+
+    def __init__(self, record, capacity):
+        self.index = record.index
+        self.uuid = record.uuid
+        self.name = record.name
+        self.buffers = {name: RingBuffer(capacity) for name, _, _ in METRICS}
+        self.samples = 0
+
+    def add(self, record):
+        for name, attr, _ in METRICS:
+            self.buffers[name].append(getattr(record, attr))
+        self.samples += 1
+
+    def stats(self):
+        return {name: summarize(buffer.values()) for name, buffer in self.buffers.items()}
+
+
+def stream_lines(cmd):
+    """启动一个长期运行的采样进程，逐行产出其输出；生成器关闭时终止进程"""
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               text=True, bufsize=1)
+    try:
+        for line in process.stdout:
+            yield line
+    finally:
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        process.stdout.close()
+
+
+def parse_samples(lines):
+    """把CSV行转换为 (接收时间, GpuRecord)，跳过无法解析的行"""
+    for line in lines:
+        record = nvsmi_query.parse_line(line)
+        if record is not None:
+            yield time.monotonic(), record
+
+
+def windowed_stats(samples, capacity, report_every):
+    """把采样放入每块GPU的环形缓冲区，每隔 report_every 秒产出一次滚动统计"""
+    windows = {}
+    next_report = None
+    for timestamp, record in samples:
+        window = windows.get(record.index)
+        if window is None:
+            window = windows[record.index] = GpuWindow(record, capacity)
+        window.add(record)
+
+        if next_report is None:
+            next_report = timestamp + report_every
+        elif timestamp >= next_report:
+            next_report = timestamp + report_every
+            yield [windows[index] for index in sorted(windows)]
+
+
+def _fmt(value, digits=1):
+    if value is None:
+        return "N/A"
+    return f"{value:.{digits}f}"
+
+
+def format_text(windows):
+    """文字格式的滚动统计"""
+    lines = [time.strftime('%H:%M:%S')]
+    for window in windows:
+        stats = window.stats()
+        parts = [f"GPU {window.index} ({window.name})"]
+        for name, _, unit in METRICS:
+            s = stats[name]
+            parts.append(f"{name} min/avg/p95 {_fmt(s['min'])}/{_fmt(s['avg'])}/{_fmt(s['p95'])}{unit}")
+        lines.append("  " + " | ".join(parts))
+    return "\n".join(lines)
+
+
+def format_ndjson(windows):
+    """每块GPU一行JSON"""
+    ts = time.time()
+    return "\n".join(json.dumps({
+        'ts': ts,
+        'gpu': window.index,
+        'uuid': window.uuid,
+        'name': window.name,
+        'samples': window.samples,
+        'window': len(window.buffers['utilization']),
+        **window.stats(),
+    }, ensure_ascii=False) for window in windows)
+
+
+def monitor(interval_ms=100, capacity=600, report_every=1.0, output_format='text',
+            duration=None, nvidia_smi='nvidia-smi', out=None):
+    """持续监控GPU，直到超过 duration 秒或被中断"""
+    out = out or sys.stdout
+    formatter = format_ndjson if output_format == 'ndjson' else format_text
+    lines = stream_lines(nvsmi_query.build_command(nvidia_smi, loop_ms=interval_ms))
+    reports = windowed_stats(parse_samples(lines), capacity, report_every)
+    deadline = time.monotonic() + duration if duration else None
+    try:
+        for windows in reports:
+            out.write(formatter(windows) + "\n")
+            out.flush()
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+    finally:
+        lines.close()
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="GPU实时监控 - 保持一个nvidia-smi采样进程并输出滚动统计")
+    parser.add_argument("--interval", type=int, default=100,
+                        help="采样间隔 (毫秒)，默认 100")
+    parser.add_argument("--window", type=int, default=600,
+                        help="每块GPU保留的采样数量，默认 600")
+    parser.add_argument("--report-every", type=float, default=1.0,
+                        help="统计输出间隔 (秒)，默认 1")
+    parser.add_argument("--format", choices=("text", "ndjson"), default="text",
+                        help="输出格式，默认 text")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="监控时长 (秒)，默认持续到按 Ctrl+C")
+    parser.add_argument("--nvidia-smi", default="nvidia-smi",
+                        help="nvidia-smi 可执行文件路径")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    try:
+        monitor(args.interval, args.window, args.report_every, args.format,
+                args.duration, args.nvidia_smi)
+    except FileNotFoundError:
+        print(f"✗ 未找到 {args.nvidia_smi}，NVIDIA驱动可能未安装", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
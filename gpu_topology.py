@@ -0,0 +1,311 @@
+import re
+import sys
+import json
+import argparse
+import itertools
+import subprocess
+
+import probe_memo
+
+# 链路类型由快到慢的得分；NV# 另按绑定的 NVLink 条数加分
+LINK_SCORES = {
+    'PIX': 40,  # 最多经过一个PCIe交换芯片
+    'PXB': 30,  # 经过多个PCIe交换芯片，不经过主桥
+    'PHB': 20,  # 经过PCIe主桥 (CPU)
+    'NODE': 10,  # 同一NUMA节点内跨主桥
+    'SYS': 0,  # 跨CPU插槽 (QPI/UPI)
+    'SOC': 0,  # 旧版驱动对 SYS 的称呼
+}
+NVLINK_BASE = 100
+
+LINK_DESCRIPTIONS = {
+    'NV': "NVLink",
+    'PIX': "同一PCIe交换芯片",
+    'PXB': "多级PCIe交换芯片",
+    'PHB': "经过CPU的PCIe主桥",
+    'NODE': "同一NUMA节点内跨主桥",
+    'SYS': "跨CPU插槽",
+    'SOC': "跨CPU插槽",
+}
+
+_ANSI_RE = re.compile(r'\x1b\[[0-9;]*m')
+_NVLINK_GPU_RE = re.compile(r'^GPU\s+(\d+):')
+_NVLINK_LINK_RE = re.compile(r'^\s*Link\s+(\d+):\s*(.*)$')
+
+
+def link_score(link):
+    """链路类型的得分，越大越快；未知类型返回 None"""
+    if link.startswith('NV') and link[2:].isdigit():
+        return NVLINK_BASE + int(link[2:])
+    return LINK_SCORES.get(link)
+
+
+def describe_link(link):
+    if link.startswith('NV') and link[2:].isdigit():
+        return f"{LINK_DESCRIPTIONS['NV']} x{link[2:]}"
+    return LINK_DESCRIPTIONS.get(link, link)
+
+
+def _parse_cpus(text):
+    """把 "0-15,32-47" 形式的CPU列表展开为集合"""
+    cpus = set()
+    for part in text.split(','):
+        start, _, end = part.strip().partition('-')
+        if start.isdigit():
+            cpus.update(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def parse_topology(text):
+    """解析 nvidia-smi topo -m 的输出
+
+    返回 {'gpus': [...], 'links': {(i, j): 链路类型}, 'nics': {...}}；
+    每块GPU含 index、cpus (CPU亲和性字符串) 和 numa (NUMA节点，未知时为 None)。
+    """
+    lines = [_ANSI_RE.sub('', line) for line in text.splitlines()]
+    header = next((line for line in lines if line.startswith('\t') and 'GPU0' in line), None)
+    if header is None:
+        raise ValueError("未找到 nvidia-smi topo -m 的表头")
+    columns = [cell.strip() for cell in header.split('\t') if cell.strip()]
+    devices = [c for c in columns if re.fullmatch(r'(GPU|NIC|mlx\d*_)\d+', c)]
+
+    gpus, links, nics = [], {}, {}
+    for line in lines[lines.index(header) + 1:]:
+        if not line.strip():
+            break
+        cells = [cell.strip() for cell in line.split('\t') if cell.strip()]
+        name, values = cells[0], cells[1:]
+        row = dict(zip(columns, values))
+        if name.startswith('GPU'):
+            index = int(name[3:])
+            numa = row.get('NUMA Affinity', '')
+            gpus.append({'index': index, 'cpus': row.get('CPU Affinity'),
+                         'numa': int(numa) if numa.isdigit() else None})
+            for device in devices:
+                link = row.get(device)
+                if device.startswith('GPU') and device != name and link:
+                    links[(index, int(device[3:]))] = link
+                elif not device.startswith('GPU') and link:
+                    nics.setdefault(device, {})[index] = link
+    return {'gpus': gpus, 'links': links, 'nics': nics}
+
+
+def parse_nvlink_status(text):
+    """解析 nvidia-smi nvlink -s 的输出，返回 {GPU序号: [每条活动链路的带宽 GB/s]}"""
+    status, current = {}, None
+    for line in text.splitlines():
+        match = _NVLINK_GPU_RE.match(line)
+        if match:
+            current = status.setdefault(int(match.group(1)), [])
+            continue
+        match = _NVLINK_LINK_RE.match(line)
+        if match and current is not None:
+            speed = re.match(r'([\d.]+)\s*GB/s', match.group(2))
+            if speed:
+                current.append(float(speed.group(1)))
+    return status
+
+
+def _run(args, timeout):
+    """运行 nvidia-smi 子命令，返回 (输出, 错误信息)"""
+    try:
+        result = probe_memo.run(args, timeout)
+    except FileNotFoundError:
+        return None, "未找到nvidia-smi命令"
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return None, f"无法运行 {' '.join(args)}: {e}"
+    if result.returncode != 0:
+        return None, (result.stdout.strip() or result.stderr.strip()).split('\n')[0]
+    return result.stdout, None
+
+
+def query_topology(timeout=None, nvidia_smi='nvidia-smi', nvlink=True):
+    """运行 nvidia-smi topo -m (及 nvlink -s)，返回 (拓扑, 错误信息)"""
+    text, error = _run([nvidia_smi, 'topo', '-m'], timeout)
+    if text is None:
+        return None, error
+    try:
+        topology = parse_topology(text)
+    except ValueError as e:
+        return None, str(e)
+    topology['nvlink'] = {}
+    if nvlink:
+        text, _ = _run([nvidia_smi, 'nvlink', '-s'], timeout)
+        topology['nvlink'] = parse_nvlink_status(text) if text else {}
+    return topology, None
+
+
+def subset_score(topology, subset):
+    """设备子集的得分: (最慢一对的得分, 全部两两得分之和)，用于比较子集"""
+    scores = [link_score(topology['links'].get((i, j), 'SYS')) or 0
+              for i, j in itertools.combinations(subset, 2)]
+    if not scores:
+        return (NVLINK_BASE * 2, 0)
+    return (min(scores), sum(scores))
+
+
+def best_subset(topology, count, candidates=None):
+    """在候选GPU中选出互联最好的 count 块
+
+    先比较子集中最慢的一对 (集合通信受最慢链路限制)，再比较全部链路得分之和，
+    仍相同时取序号较小的组合。GPU数量较多时穷举的组合数可能很大，超过上限时按贪心扩展。
+    """
+    indices = sorted(candidates if candidates is not None else (g['index'] for g in topology['gpus']))
+    if count > len(indices):
+        raise ValueError(f"请求 {count} 块GPU，但只有 {len(indices)} 块可用")
+    combinations = _combinations_count(len(indices), count)
+    if combinations <= 20000:
+        return max(itertools.combinations(indices, count),
+                   key=lambda subset: (subset_score(topology, subset), [-i for i in subset]))
+
+    # 贪心: 以每块GPU为起点，每次加入使得分最高的一块
+    best = None
+    for start in indices:
+        subset = [start]
+        while len(subset) < count:
+            rest = [i for i in indices if i not in subset]
+            subset.append(max(rest, key=lambda i: subset_score(topology, subset + [i])))
+        subset = tuple(sorted(subset))
+        if best is None or subset_score(topology, subset) > subset_score(topology, best):
+            best = subset
+    return best
+
+
+def _combinations_count(n, k):
+    total = 1
+    for i in range(k):
+        total = total * (n - i) // (i + 1)
+    return total
+
+
+def numa_binding(topology, subset):
+    """GPU子集对应的NUMA节点和CPU，返回 {'nodes', 'cpus', 'command'}"""
+    by_index = {g['index']: g for g in topology['gpus']}
+    nodes = sorted({by_index[i]['numa'] for i in subset if by_index[i]['numa'] is not None})
+    cpu_sets = [by_index[i]['cpus'] for i in subset if by_index[i]['cpus'] not in (None, 'N/A')]
+    cpus = sorted(set().union(*(_parse_cpus(text) for text in cpu_sets)))
+    if nodes:
+        node_list = ','.join(str(n) for n in nodes)
+        command = f"numactl --cpunodebind={node_list} --membind={node_list}"
+    elif cpus:
+        command = f"taskset -c {_format_cpus(cpus)}"
+    else:
+        command = None
+    return {'nodes': nodes, 'cpus': _format_cpus(cpus), 'command': command}
+
+
+def _format_cpus(cpus):
+    """把CPU序号列表压缩为 "0-15,32-47" 形式"""
+    ranges = []
+    for cpu in cpus:
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def recommend(topology, count, candidates=None):
+    """推荐 count 块GPU的组合及NUMA绑定"""
+    subset = best_subset(topology, count, candidates)
+    pairs = {(i, j): topology['links'].get((i, j), 'SYS') for i, j in itertools.combinations(subset, 2)}
+    weakest = min(pairs.values(), key=lambda link: link_score(link) or 0) if pairs else None
+    binding = numa_binding(topology, subset)
+    return {
+        'gpus': list(subset),
+        'weakest_link': weakest,
+        'links': {f"{i}-{j}": link for (i, j), link in pairs.items()},
+        'numa': binding,
+        'cuda_visible_devices': ','.join(str(i) for i in subset),
+    }
+
+
+def format_matrix(topology):
+    """格式化GPU间链路矩阵及每块GPU的NUMA节点"""
+    indices = [g['index'] for g in topology['gpus']]
+    width = max([4] + [len(link) for link in topology['links'].values()])
+    lines = ["      " + "".join(f"GPU{i}".ljust(width + 2) for i in indices) + "NUMA  CPU"]
+    for gpu in topology['gpus']:
+        cells = ["X" if i == gpu['index'] else topology['links'].get((gpu['index'], i), '?') for i in indices]
+        numa = '-' if gpu['numa'] is None else str(gpu['numa'])
+        lines.append(f"GPU{gpu['index']}  " + "".join(c.ljust(width + 2) for c in cells)
+                     + f"{numa.ljust(6)}{gpu['cpus'] or '-'}")
+    for index, speeds in sorted(topology.get('nvlink', {}).items()):
+        if speeds:
+            lines.append(f"GPU{index} NVLink: {len(speeds)} 条活动链路，共 {sum(speeds):g} GB/s")
+    return lines
+
+
+def format_recommendation(result):
+    lines = [f"推荐GPU组合: {result['gpus']} (CUDA_VISIBLE_DEVICES={result['cuda_visible_devices']})"]
+    if result['weakest_link']:
+        lines.append(f"  最慢链路: {result['weakest_link']} ({describe_link(result['weakest_link'])})")
+    binding = result['numa']
+    if binding['command']:
+        lines.append(f"  NUMA节点: {binding['nodes'] or '未知'}，CPU: {binding['cpus'] or '未知'}")
+        lines.append(f"  绑定命令: {binding['command']} <训练命令>")
+    if len(binding['nodes']) > 1:
+        lines.append("✗ 所选GPU分布在多个NUMA节点上，跨插槽通信会降低带宽")
+    return lines
+
+
+def _read_file(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="分析多GPU互联拓扑 (NVLink/PCIe/NUMA) 并推荐设备组合")
+    parser.add_argument("-n", "--count", type=int, help="需要的GPU数量；给出时推荐互联最好的组合")
+    parser.add_argument("--gpus", help="候选GPU序号，逗号分隔，默认全部")
+    parser.add_argument("--file", metavar="PATH", help="读取保存的 nvidia-smi topo -m 输出而不运行 nvidia-smi")
+    parser.add_argument("--nvlink-file", metavar="PATH", help="读取保存的 nvidia-smi nvlink -s 输出")
+    parser.add_argument("--nvidia-smi", default="nvidia-smi", help="nvidia-smi 可执行文件路径")
+    parser.add_argument("--timeout", type=float, default=20.0, help="nvidia-smi 超时时间 (秒)，默认 20")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    if args.file:
+        topology = parse_topology(_read_file(args.file))
+        topology['nvlink'] = parse_nvlink_status(_read_file(args.nvlink_file)) if args.nvlink_file else {}
+    else:
+        topology, error = query_topology(args.timeout, args.nvidia_smi)
+        if topology is None:
+            print(f"✗ {error}")
+            return 1
+
+    result = None
+    if args.count:
+        candidates = [int(i) for i in args.gpus.split(',')] if args.gpus else None
+        try:
+            result = recommend(topology, args.count, candidates)
+        except ValueError as e:
+            print(f"✗ {e}")
+            return 1
+
+    if args.json:
+        document = {
+            'gpus': topology['gpus'],
+            'links': {f"{i}-{j}": link for (i, j), link in topology['links'].items()},
+            'nics': topology['nics'],
+            'nvlink': topology['nvlink'],
+            'recommendation': result,
+        }
+        print(json.dumps(document, ensure_ascii=False, indent=2))
+        return 0
+    for line in format_matrix(topology):
+        print(line)
+    if result:
+        print()
+        for line in format_recommendation(result):
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
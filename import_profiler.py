@@ -0,0 +1,193 @@
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+# -X importtime 的输出行: "import time:   self |  cumulative | <缩进>模块名"
+_LINE_RE = re.compile(r'^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)\s*$')
+
+# 子进程中执行的代码: 导入目标模块后，输出其中的原生扩展模块
+_CHILD_CODE = """
+import sys, json, importlib.machinery
+{imports}
+suffixes = tuple(importlib.machinery.EXTENSION_SUFFIXES)
+native = [name for name, module in list(sys.modules.items())
+          if (getattr(module, '__file__', None) or '').endswith(suffixes)]
+sys.stdout.write(json.dumps(native))
+"""
+
+
+def parse_importtime(text):
+    """解析 -X importtime 的 stderr，返回 {模块名: 记录}
+
+    记录含 self_us、cumulative_us、depth 和 parent (导入该模块的上层模块)。
+    输出为后序: 子模块先于父模块出现，缩进越深层级越深。
+    """
+    entries = {}
+    pending = []  # 尚未找到父模块的 (深度, 模块名)
+    for line in text.splitlines():
+        match = _LINE_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        depth = max(0, (len(indent) - 1) // 2)
+        entries[name] = {'self_us': int(self_us), 'cumulative_us': int(cumulative_us),
+                         'depth': depth, 'parent': None}
+        while pending and pending[-1][0] > depth:
+            _, child = pending.pop()
+            entries[child]['parent'] = name
+        pending.append((depth, name))
+    return entries
+
+
+def run_once(modules, python=None, timeout=300):
+    """在新的解释器进程中导入模块，返回 (记录字典, 原生扩展模块集合)"""
+    code = _CHILD_CODE.format(imports="\n".join(f"import {name}" for name in modules))
+    result = subprocess.run([python or sys.executable, '-X', 'importtime', '-c', code],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout)
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        raise RuntimeError(errors[-1] if errors else f"子进程返回码 {result.returncode}")
+    try:
+        native = set(json.loads(result.stdout))
+    except ValueError:
+        native = set()
+    return parse_importtime(result.stderr), native
+
+
+def profile(modules, python=None, repeat=1, timeout=300):
+    """重复导入 repeat 次，每个模块取最小耗时以降低噪声，返回可保存为JSON的结果"""
+    merged = None
+    native = set()
+    for _ in range(max(1, repeat)):
+        entries, run_native = run_once(modules, python, timeout)
+        native |= run_native
+        if merged is None:
+            merged = entries
+            continue
+        for name, entry in entries.items():
+            old = merged.get(name)
+            if old is None:
+                merged[name] = entry
+            else:
+                old['self_us'] = min(old['self_us'], entry['self_us'])
+                old['cumulative_us'] = min(old['cumulative_us'], entry['cumulative_us'])
+
+    for name, entry in merged.items():
+        entry['native'] = name in native
+    total = sum(e['cumulative_us'] for e in merged.values() if e['depth'] == 0)
+    native_us = sum(e['self_us'] for e in merged.values() if e['native'])
+    return {
+        'targets': list(modules),
+        'python': python or sys.executable,
+        'repeat': repeat,
+        'total_us': total,
+        'native_us': native_us,
+        'entries': merged,
+    }
+
+
+def top(report, key='cumulative_us', count=20):
+    """按指定字段排序的前 count 个模块"""
+    items = sorted(report['entries'].items(), key=lambda item: item[1][key], reverse=True)
+    return items[:count]
+
+
+def diff(old, new, count=20):
+    """比较两次结果，返回 (总耗时变化, 按累计耗时变化绝对值排序的模块列表)"""
+    names = set(old['entries']) | set(new['entries'])
+    changes = []
+    for name in names:
+        a = old['entries'].get(name, {})
+        b = new['entries'].get(name, {})
+        changes.append({
+            'name': name,
+            'old_us': a.get('cumulative_us'),
+            'new_us': b.get('cumulative_us'),
+            'delta_us': b.get('cumulative_us', 0) - a.get('cumulative_us', 0),
+            'self_delta_us': b.get('self_us', 0) - a.get('self_us', 0),
+        })
+    changes.sort(key=lambda c: abs(c['delta_us']), reverse=True)
+    return new['total_us'] - old['total_us'], changes[:count]
+
+
+def _ms(us):
+    return "-" if us is None else f"{us / 1000:.1f}"
+
+
+def print_report(report, count=20):
+    """打印导入耗时报告"""
+    total = report['total_us']
+    share = report['native_us'] / total * 100 if total else 0
+    print(f"导入 {', '.join(report['targets'])} 共耗时 {_ms(total)} ms "
+          f"(共 {len(report['entries'])} 个模块，取 {report['repeat']} 次中的最小值)")
+    print(f"其中原生扩展模块 (.so/.pyd) 加载耗时 {_ms(report['native_us'])} ms，占 {share:.1f}%")
+
+    print(f"\n累计耗时最高的 {count} 个模块:")
+    print(f"  {'累计(ms)':>8}{'自身(ms)':>10}  模块")
+    for name, e in top(report, 'cumulative_us', count):
+        print(f"  {_ms(e['cumulative_us']):>10}{_ms(e['self_us']):>10}  {'  ' * e['depth']}{name}")
+
+    print(f"\n自身耗时最高的 {count} 个模块:")
+    print(f"  {'自身(ms)':>8}{'累计(ms)':>10}  模块")
+    for name, e in top(report, 'self_us', count):
+        tag = " [原生]" if e['native'] else ""
+        print(f"  {_ms(e['self_us']):>10}{_ms(e['cumulative_us']):>10}  {name}{tag}")
+
+
+def print_diff(old, new, count=20):
+    """打印两次结果的差异"""
+    delta, changes = diff(old, new, count)
+    sign = "+" if delta >= 0 else ""
+    print(f"总耗时: {_ms(old['total_us'])} ms -> {_ms(new['total_us'])} ms ({sign}{_ms(delta)} ms)")
+    print(f"  {'之前(ms)':>8}{'之后(ms)':>10}{'变化(ms)':>10}  模块")
+    for c in changes:
+        sign = "+" if c['delta_us'] >= 0 else ""
+        print(f"  {_ms(c['old_us']):>10}{_ms(c['new_us']):>10}{sign + _ms(c['delta_us']):>12}  {c['name']}")
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="分析模块导入耗时 (python -X importtime)，找出最慢的子模块和原生扩展")
+    parser.add_argument("modules", nargs="*", default=["torch"],
+                        help="要分析的模块，默认 torch，可附加 torchvision torchaudio 等")
+    parser.add_argument("--top", type=int, default=20, help="显示前 N 个模块，默认 20")
+    parser.add_argument("--repeat", type=int, default=1, help="重复次数，每个模块取最小值，默认 1")
+    parser.add_argument("--python", help="用于测试的解释器，默认为当前解释器")
+    parser.add_argument("--save", metavar="FILE", help="把结果保存为JSON，供之后比较")
+    parser.add_argument("--diff", nargs="+", metavar="FILE",
+                        help="与之前保存的结果比较；给出两个文件时直接比较这两个文件")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    if args.diff and len(args.diff) >= 2:
+        print_diff(_load(args.diff[0]), _load(args.diff[1]), args.top)
+        return 0
+
+    try:
+        report = profile(args.modules, args.python, args.repeat)
+    except (RuntimeError, OSError, subprocess.TimeoutExpired) as e:
+        print(f"✗ 导入 {', '.join(args.modules)} 失败: {e}")
+        return 1
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False)
+
+    if args.diff:
+        print_diff(_load(args.diff[0]), report, args.top)
+    else:
+        print_report(report, args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
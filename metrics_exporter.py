@@ -0,0 +1,241 @@
+import sys
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import gpu_discovery
+import nvsmi_query
+import torch_build_info
+import cuda_inventory
+
+PREFIX = "gpu_ck"
+
+CONTENT_TYPE_TEXT = "text/plain; version=0.0.4; charset=utf-8"
+CONTENT_TYPE_OPENMETRICS = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+_MIB = 1024 * 1024
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class MetricFamily:
+    """同名指标的一组样本 (仅使用 gauge 类型)"""
+
+    __slots__ = ('name', 'help', 'samples')
+
+    def __init__(self, name, help_text):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help_text
+        self.samples = []
+
+    def add(self, value, **labels):
+        if value is not None:
+            self.samples.append((labels, value))
+        return self
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in self.samples:
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            name = f"{self.name}{{{label_text}}}" if label_text else self.name
+            lines.append(f"{name} {_format_value(value)}")
+        return lines
+
+
+def gpu_metrics(nvidia_smi='nvidia-smi', timeout=10, root="/"):
+    """快速探测: 驱动版本和每块GPU的显存、利用率、温度、功耗
+
+    每次都重新运行 nvidia-smi (不使用进程内缓存)；无法运行时退回 procfs 中的驱动信息。
+    """
+    records, error = nvsmi_query.query_gpus(timeout, nvidia_smi=nvidia_smi, cached=False)
+    driver = records[0].driver_version if records else None
+    if driver is None:
+        info = gpu_discovery.read_driver_version(root)
+        driver = info['version'] if info else None
+
+    driver_info = MetricFamily('driver_info', "NVIDIA驱动版本")
+    if driver:
+        driver_info.add(1, version=driver)
+    families = [driver_info, MetricFamily('gpu_count', "nvidia-smi 报告的GPU数量").add(len(records or []))]
+    per_gpu = (
+        ('gpu_memory_total_bytes', "显存总量", lambda r: r.memory_total * _MIB if r.memory_total is not None else None),
+        ('gpu_memory_used_bytes', "已用显存", lambda r: r.memory_used * _MIB if r.memory_used is not None else None),
+        ('gpu_utilization_ratio', "GPU利用率 (0-1)", lambda r: r.utilization / 100 if r.utilization is not None else None),
+        ('gpu_temperature_celsius', "GPU温度", lambda r: r.temperature),
+        ('gpu_power_watts', "GPU功耗", lambda r: r.power_draw),
+        ('gpu_sm_clock_hertz', "SM频率", lambda r: r.sm_clock * 1e6 if r.sm_clock is not None else None),
+    )
+    for name, help_text, getter in per_gpu:
+        family = MetricFamily(name, help_text)
+        for record in records or ():
+            family.add(getter(record), gpu=record.index, uuid=record.uuid, name=record.name)
+        families.append(family)
+    return families, error if records is None else None
+
+
+def build_metrics(bases=None):
+    """慢速探测: torch 构建信息 (不导入torch) 和CUDA工具包清单"""
+    info = torch_build_info.build_info()
+    torch = MetricFamily('torch_info', "已安装的PyTorch版本及其内置CUDA版本")
+    if info['installed']:
+        torch.add(1, version=info['version'], variant=info['variant'] or '',
+                  cuda=info['cuda'] or '', cudnn=info['cudnn'] or '')
+    toolkits = MetricFamily('cuda_toolkit_info', "本机安装的CUDA工具包，active 表示是否在PATH等环境变量中生效")
+    for toolkit in cuda_inventory.inventory(bases):
+        toolkits.add(1, path=toolkit['path'], version=toolkit['version'] or '',
+                     active=str(bool(toolkit['active'])).lower())
+    return [
+        MetricFamily('torch_installed', "PyTorch是否已安装").add(info['installed']),
+        torch,
+        toolkits,
+    ], None
+
+
+class Snapshot:
+    """缓存的指标快照
+
+    各刷新线程替换自己负责的部分后重新生成完整的响应体；抓取时只返回已生成的字节串，
+    耗时与探测本身无关。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parts = {}  # 探测名 -> 指标列表
+        self._status = {}  # 探测名 -> (是否成功, 耗时, 完成时间)
+        self._body = {False: b"", True: b"# EOF\n"}
+
+    def update(self, probe, families, ok, duration):
+        with self._lock:
+            if families is not None:
+                self._parts[probe] = families
+            self._status[probe] = (ok, duration, time.time())
+            self._render()
+
+    def _render(self):
+        success = MetricFamily('probe_success', "最近一次探测是否成功")
+        durations = MetricFamily('probe_duration_seconds', "最近一次探测的耗时")
+        updated = MetricFamily('probe_timestamp_seconds', "最近一次探测完成的时间")
+        for probe, (ok, duration, finished) in sorted(self._status.items()):
+            success.add(ok, probe=probe)
+            durations.add(duration, probe=probe)
+            updated.add(finished, probe=probe)
+        lines = []
+        for probe in sorted(self._parts):
+            for family in self._parts[probe]:
+                lines.extend(family.render())
+        for family in (success, durations, updated):
+            lines.extend(family.render())
+        text = "\n".join(lines) + "\n"
+        self._body = {False: text.encode('utf-8'), True: (text + "# EOF\n").encode('utf-8')}
+
+    def body(self, openmetrics=False):
+        return self._body[openmetrics]
+
+
+class Refresher(threading.Thread):
+    """按固定间隔执行一个探测并更新快照"""
+
+    def __init__(self, snapshot, name, probe, interval, stop):
+        super().__init__(name=f"refresh-{name}", daemon=True)
+        self.snapshot = snapshot
+        self.probe_name = name
+        self.probe = probe
+        self.interval = interval
+        self.stop = stop
+
+    def refresh(self):
+        began = time.monotonic()
+        try:
+            families, error = self.probe()
+            ok = error is None
+        except Exception as e:
+            families, ok = None, False
+            print(f"✗ 探测 {self.probe_name} 失败: {e}", file=sys.stderr)
+        self.snapshot.update(self.probe_name, families, ok, time.monotonic() - began)
+
+    def run(self):
+        while not self.stop.is_set():
+            self.refresh()
+            self.stop.wait(self.interval)
+
+
+def make_handler(snapshot):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+            body = snapshot.body(openmetrics)
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE_OPENMETRICS if openmetrics else CONTENT_TYPE_TEXT)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=9835, fast_interval=15.0, slow_interval=600.0,
+          nvidia_smi='nvidia-smi', timeout=10.0):
+    """启动刷新线程和HTTP服务，返回 (服务器, 停止事件)；调用方负责 serve_forever"""
+    snapshot = Snapshot()
+    stop = threading.Event()
+    refreshers = [
+        Refresher(snapshot, 'gpu', lambda: gpu_metrics(nvidia_smi, timeout), fast_interval, stop),
+        Refresher(snapshot, 'build', build_metrics, slow_interval, stop),
+    ]
+    for refresher in refreshers:
+        refresher.start()
+    server = ThreadingHTTPServer((host, port), make_handler(snapshot))
+    server.daemon_threads = True
+    return server, stop
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="以 Prometheus/OpenMetrics 格式导出GPU、CUDA和PyTorch状态")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认 127.0.0.1")
+    parser.add_argument("--port", type=int, default=9835, help="监听端口，默认 9835")
+    parser.add_argument("--fast-interval", type=float, default=15.0,
+                        help="驱动和显存/利用率的刷新间隔 (秒)，默认 15")
+    parser.add_argument("--slow-interval", type=float, default=600.0,
+                        help="torch构建信息和CUDA工具包清单的刷新间隔 (秒)，默认 600")
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="单次 nvidia-smi 查询的超时时间 (秒)，默认 10")
+    parser.add_argument("--nvidia-smi", default="nvidia-smi", help="nvidia-smi 可执行文件路径")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    server, stop = serve(args.host, args.port, args.fast_interval, args.slow_interval,
+                         args.nvidia_smi, args.timeout)
+    print(f"正在 http://{args.host}:{server.server_address[1]}/metrics 提供指标 (Ctrl+C 退出)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
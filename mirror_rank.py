@@ -0,0 +1,430 @@
+import re
+import ssl
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+from urllib.parse import urljoin, urlsplit, unquote
+
+import compat_index
+import torch_build_info
+
+# 默认的包索引与镜像；URL 中含 {tag} 的为按CUDA构建划分的 PyTorch wheel 源，
+# 其余为 PyPI 镜像，只提供 PyPI 上的默认构建
+DEFAULT_MIRRORS = (
+    ('pytorch.org', 'https://download.pytorch.org/whl/{tag}', 'simple'),
+    ('aliyun-pytorch', 'https://mirrors.aliyun.com/pytorch-wheels/{tag}', 'find-links'),
+    ('sjtu-pytorch', 'https://mirror.sjtu.edu.cn/pytorch-wheels/{tag}', 'find-links'),
+    ('pypi', 'https://pypi.org/simple', 'simple'),
+    ('tuna', 'https://pypi.tuna.tsinghua.edu.cn/simple', 'simple'),
+    ('aliyun', 'https://mirrors.aliyun.com/pypi/simple', 'simple'),
+    ('ustc', 'https://mirrors.ustc.edu.cn/pypi/simple', 'simple'),
+)
+
+MAX_REDIRECTS = 5
+USER_AGENT = "gpu-ck-mirror-rank/1"
+
+_HREF_RE = re.compile(r'href\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+
+
+class Mirror:
+    """一个包索引: 名称、URL 模板和类型 (simple 为 PEP 503 索引，find-links 为平铺的文件列表)"""
+
+    __slots__ = ('name', 'template', 'kind')
+
+    def __init__(self, name, template, kind='simple'):
+        self.name = name
+        self.template = template.rstrip('/')
+        self.kind = kind
+
+    @property
+    def per_tag(self):
+        """是否按CUDA构建划分 (否则为只有默认构建的 PyPI 镜像)"""
+        return '{tag}' in self.template
+
+    def url(self, tag):
+        return self.template.format(tag=tag)
+
+    def page_url(self, tag):
+        base = self.url(tag)
+        return f"{base}/torch/" if self.kind == 'simple' else f"{base}/"
+
+    def pip_option(self, tag):
+        if self.kind == 'find-links':
+            return f"-f {self.url(tag)}"
+        return f"--index-url {self.url(tag)}"
+
+
+class Response:
+    """HTTP 响应及各阶段耗时 (秒)"""
+
+    __slots__ = ('url', 'status', 'headers', 'body', 'connect', 'first_byte', 'elapsed', 'reused')
+
+    def __init__(self, url, status, headers, body, connect, first_byte, elapsed, reused):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.connect = connect
+        self.first_byte = first_byte
+        self.elapsed = elapsed
+        self.reused = reused
+
+    @property
+    def transfer(self):
+        """从收到首字节到读完响应体的时间"""
+        return self.elapsed - self.first_byte
+
+
+class HttpClient:
+    """基于 asyncio 的最小 HTTP/1.1 客户端
+
+    按 (协议, 主机, 端口) 保留空闲连接以复用 keep-alive；信号量限制同时进行的请求数。
+    """
+
+    def __init__(self, concurrency=8, timeout=10.0):
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._idle = {}  # (协议, 主机, 端口) -> [(reader, writer)]
+        self._ssl = None
+
+    async def _connect(self, key):
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        scheme, host, port = key
+        if scheme == 'https' and self._ssl is None:
+            self._ssl = ssl.create_default_context()
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=self._ssl if scheme == 'https' else None)
+        return reader, writer, False
+
+    def _release(self, key, reader, writer, reusable):
+        if reusable:
+            self._idle.setdefault(key, []).append((reader, writer))
+        else:
+            writer.close()
+
+    async def close(self):
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+    async def request(self, method, url, headers=None, max_body=None):
+        """发送请求并跟随重定向；max_body 限制读取的响应体字节数"""
+        async with self._semaphore:
+            for _ in range(MAX_REDIRECTS + 1):
+                response = await asyncio.wait_for(self._request_once(method, url, headers, max_body),
+                                                  self.timeout)
+                location = response.headers.get('location')
+                if response.status in (301, 302, 303, 307, 308) and location:
+                    url = urljoin(url, location)
+                    continue
+                return response
+        raise RuntimeError(f"重定向次数过多: {url}")
+
+    async def _request_once(self, method, url, headers, max_body):
+        parts = urlsplit(url)
+        scheme = parts.scheme or 'http'
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname, port)
+        path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {parts.netloc}", f"User-Agent: {USER_AGENT}",
+                 "Accept: */*", "Accept-Encoding: identity", "Connection: keep-alive"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        payload = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+
+        for attempt in range(2):
+            started = time.perf_counter()
+            reader, writer, reused = await self._connect(key)
+            connect = time.perf_counter() - started
+            try:
+                writer.write(payload)
+                await writer.drain()
+                status_line = await reader.readline()
+            except (ConnectionError, OSError):
+                status_line = b''
+            if status_line:
+                break
+            # 复用的连接可能已被服务器关闭，换一个新连接重试一次
+            writer.close()
+            if not reused or attempt:
+                raise ConnectionError(f"连接被关闭: {url}")
+        first_byte = time.perf_counter() - started
+
+        try:
+            status = int(status_line.split()[1])
+            response_headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                response_headers[name.strip().lower()] = value.strip()
+            body, complete = await self._read_body(reader, method, status, response_headers, max_body)
+        except BaseException:
+            # 超时取消或响应格式错误时连接状态未知，不能再复用
+            writer.close()
+            raise
+        elapsed = time.perf_counter() - started
+        reusable = complete and response_headers.get('connection', '').lower() != 'close'
+        self._release(key, reader, writer, reusable)
+        return Response(url, status, response_headers, body, connect, first_byte, elapsed, reused)
+
+    @staticmethod
+    async def _read_body(reader, method, status, headers, max_body):
+        """读取响应体，返回 (内容, 是否完整读完)；超过 max_body 时提前停止"""
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            return b'', True
+        limit = max_body if max_body is not None else float('inf')
+        chunks = []
+        size = 0
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                length = int((await reader.readline()).split(b';')[0].strip() or b'0', 16)
+                if length == 0:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return b''.join(chunks), True
+                chunks.append(await reader.readexactly(length))
+                await reader.readline()
+                size += length
+                if size >= limit:
+                    return b''.join(chunks), False
+        if 'content-length' in headers:
+            remaining = int(headers['content-length'])
+            while remaining and size < limit:
+                chunk = await reader.read(min(remaining, 65536))
+                if not chunk:
+                    return b''.join(chunks), False
+                chunks.append(chunk)
+                size += len(chunk)
+                remaining -= len(chunk)
+            return b''.join(chunks), remaining == 0
+        while size < limit:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        return b''.join(chunks), False
+
+
+def platform_matches(filename, system=None, machine=None):
+    """wheel 文件名中的平台标签是否适用于本机"""
+    system = system or platform.system()
+    machine = (machine or platform.machine()).lower()
+    tag = filename[:-4].rsplit('-', 1)[-1]
+    if system == "Windows":
+        return tag == 'win_amd64'
+    if system == "Darwin":
+        return tag.startswith('macosx')
+    machine = {'amd64': 'x86_64', 'arm64': 'aarch64'}.get(machine, machine)
+    return 'linux' in tag and tag.endswith(machine)
+
+
+def find_wheel(page, base_url, release, python_tag, local_tag=None, system=None, machine=None):
+    """在索引页面中找出匹配的 torch wheel，返回 (版本, URL)；找不到时返回 None
+
+    local_tag 为 None 时只匹配不带本地标签的版本 (PyPI 默认构建)。
+    """
+    best = None
+    for href in _HREF_RE.findall(page):
+        url = urljoin(base_url, href.split('#', 1)[0])
+        filename = unquote(url.rsplit('/', 1)[-1])
+        if not filename.endswith('.whl') or not filename.startswith('torch-'):
+            continue
+        parts = filename[:-4].split('-')
+        if len(parts) < 5 or parts[2] != python_tag:
+            continue
+        version = parts[1]
+        public, _, local = version.partition('+')
+        if (local or None) != local_tag:
+            continue
+        if public != release and not public.startswith(release + '.'):
+            continue
+        if not platform_matches(filename, system, machine):
+            continue
+        key = compat_index.version_tuple(public)
+        if best is None or key > best[0]:
+            best = (key, version, url)
+    return (best[1], best[2]) if best else None
+
+
+async def probe_mirror(client, mirror, tag, release, python_tag, rounds=3, sample_bytes=1 << 20,
+                       pypi_default=False):
+    """测量一个镜像: 索引页耗时、wheel 的 HEAD 延迟和 Range 下载速度"""
+    result = {'name': mirror.name, 'url': mirror.url(tag), 'kind': mirror.kind, 'ok': False,
+              'error': None, 'version': None, 'wheel': None, 'index_ms': None, 'latency_ms': None,
+              'throughput_mbps': None, 'size': None, 'estimate_s': None}
+    if not mirror.per_tag and not pypi_default:
+        result['error'] = f"PyPI 镜像只提供默认构建，不含 {tag}"
+        return result
+    try:
+        page = await client.request('GET', mirror.page_url(tag), max_body=32 << 20)
+        if page.status != 200:
+            result['error'] = f"索引页返回 HTTP {page.status}"
+            return result
+        result['index_ms'] = page.elapsed * 1000
+        found = find_wheel(page.body.decode('utf-8', 'replace'), page.url, release, python_tag,
+                           None if not mirror.per_tag else tag)
+        if found is None:
+            result['error'] = f"未找到 torch {release} ({tag}, {python_tag}) 的 wheel"
+            return result
+        result['version'], result['wheel'] = found
+
+        latencies = []
+        for _ in range(max(1, rounds)):
+            head = await client.request('HEAD', result['wheel'])
+            if head.status != 200:
+                result['error'] = f"wheel 返回 HTTP {head.status}"
+                return result
+            latencies.append(head.first_byte)
+            if 'content-length' in head.headers:
+                result['size'] = int(head.headers['content-length'])
+        result['latency_ms'] = statistics.median(latencies) * 1000
+
+        sample = await client.request('GET', result['wheel'], {'Range': f"bytes=0-{sample_bytes - 1}"},
+                                      max_body=sample_bytes)
+        if sample.status not in (200, 206) or not sample.body:
+            result['error'] = f"Range 请求返回 HTTP {sample.status}"
+            return result
+        total = sample.headers.get('content-range', '').rpartition('/')[2]
+        if result['size'] is None and total.isdigit():
+            result['size'] = int(total)
+        throughput = len(sample.body) / max(sample.transfer, 1e-6)
+        result['throughput_mbps'] = throughput / 1e6
+        size = result['size'] or len(sample.body)
+        result['estimate_s'] = (result['index_ms'] + result['latency_ms']) / 1000 + size / throughput
+        result['ok'] = True
+    except (asyncio.TimeoutError, TimeoutError):
+        result['error'] = f"超过 {client.timeout:.0f} 秒未响应"
+    except (OSError, ValueError, IndexError, RuntimeError, asyncio.IncompleteReadError) as e:
+        result['error'] = f"请求失败: {e}"
+    return result
+
+
+async def rank_async(mirrors, tag, release, python_tag, concurrency=8, timeout=10.0, rounds=3,
+                     sample_bytes=1 << 20, system=None):
+    client = HttpClient(concurrency, timeout)
+    default = compat_index.TORCH_RELEASES.get(release, (None, None))[1]
+    pypi_default = tag == default and compat_index.column(system) == 0
+    try:
+        results = await asyncio.gather(*(
+            probe_mirror(client, mirror, tag, release, python_tag, rounds, sample_bytes, pypi_default)
+            for mirror in mirrors))
+    finally:
+        await client.close()
+    return sorted(results, key=lambda r: (not r['ok'], r['estimate_s'] or 0))
+
+
+def rank(mirrors, tag, release, python_tag=None, **options):
+    """并发测量全部镜像，返回按预计下载时间排序的结果 (不可用的排在最后)"""
+    python_tag = python_tag or f"cp{sys.version_info.major}{sys.version_info.minor}"
+    return asyncio.run(rank_async(mirrors, tag, release, python_tag, **options))
+
+
+def install_command(result, mirror, tag, release, replace=False):
+    """由测量结果生成 pip 安装命令 (固定为该镜像上找到的 torch 版本)
+
+    replace 为真时先卸载已安装的torch，原因见 compat_index.install_command。
+    """
+    _, _, vision, audio = compat_index.TORCH_RELEASES.get(release, ((), None, None, None))
+    packages = [f"torch=={result['version']}"]
+    if vision:
+        packages += [f"torchvision=={vision}.*", f"torchaudio=={audio}.*"]
+    command = f"pip install {' '.join(packages)} {mirror.pip_option(tag)}"
+    if replace:
+        command = f"pip uninstall -y torch torchvision torchaudio && {command}"
+    return command
+
+
+def default_target():
+    """根据已安装的torch或兼容性诊断确定要下载的 (torch版本, 构建)"""
+    info = torch_build_info.build_info()
+    if info['installed'] and info['cuda']:
+        release = '.'.join(info['version'].split('+')[0].split('.')[:2])
+        return release, torch_build_info.variant_of(info['version'], info['cuda'])
+    latest = max(compat_index.TORCH_RELEASES, key=compat_index.version_tuple)
+    return latest, compat_index.TORCH_RELEASES[latest][1]
+
+
+def print_ranking(results):
+    """打印排名表格"""
+    print(f"  {'镜像':<16}{'索引(ms)':>10}{'延迟(ms)':>10}{'速度(MB/s)':>12}{'预计(s)':>9}  说明")
+    for r in results:
+        if r['ok']:
+            print(f"  {r['name']:<18}{r['index_ms']:>10.0f}{r['latency_ms']:>10.0f}"
+                  f"{r['throughput_mbps']:>13.1f}{r['estimate_s']:>10.1f}  torch {r['version']}")
+        else:
+            print(f"  {r['name']:<18}{'-':>10}{'-':>10}{'-':>13}{'-':>10}  ✗ {r['error']}")
+
+
+def parse_mirror(text, kind):
+    name, sep, url = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"镜像格式应为 名称=URL: {text}")
+    return Mirror(name, url, kind)
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="并发测量各PyTorch下载源的延迟和速度，给出最快的安装命令")
+    parser.add_argument("--torch", help="要安装的torch版本，如 2.3；默认为已安装的版本或最新版本")
+    parser.add_argument("--tag", help="CUDA构建，如 cu121；默认为已安装的构建或该版本的默认构建")
+    parser.add_argument("--python", help="Python标签，如 cp311；默认为当前解释器")
+    parser.add_argument("--mirror", action="append", default=[], metavar="NAME=URL",
+                        type=lambda text: parse_mirror(text, 'simple'),
+                        help="附加的 PEP 503 索引，URL 中可用 {tag} 表示CUDA构建，可重复指定")
+    parser.add_argument("--find-links", action="append", default=[], metavar="NAME=URL",
+                        type=lambda text: parse_mirror(text, 'find-links'),
+                        help="附加的平铺 wheel 目录 (pip -f)，可重复指定")
+    parser.add_argument("--only", action="store_true", help="只测量通过参数指定的源")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时进行的请求数，默认 8")
+    parser.add_argument("--timeout", type=float, default=10.0, help="单个请求的超时时间 (秒)，默认 10")
+    parser.add_argument("--rounds", type=int, default=3, help="每个源的 HEAD 请求次数，取中位数，默认 3")
+    parser.add_argument("--sample-mb", type=float, default=1.0, help="测速时下载的字节数 (MB)，默认 1")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    release, tag = default_target()
+    if args.torch and args.torch != release:
+        release = args.torch
+        tag = compat_index.TORCH_RELEASES.get(release, ((), tag))[1]
+    tag = args.tag or tag
+    mirrors = [] if args.only else [Mirror(*m) for m in DEFAULT_MIRRORS]
+    mirrors += args.mirror + args.find_links
+    by_name = {m.name: m for m in mirrors}
+
+    results = rank(mirrors, tag, release, args.python, concurrency=args.concurrency, timeout=args.timeout,
+                   rounds=args.rounds, sample_bytes=int(args.sample_mb * (1 << 20)))
+    best = next((r for r in results if r['ok']), None)
+    command = install_command(best, by_name[best['name']], tag, release) if best else None
+    if args.json:
+        print(json.dumps({'torch': release, 'tag': tag, 'results': results, 'command': command},
+                         ensure_ascii=False, indent=2))
+        return 0 if best else 1
+
+    print(f"目标: torch {release} ({tag})")
+    print_ranking(results)
+    if best is None:
+        print("\n✗ 没有可用的下载源")
+        return 1
+    print(f"\n✓ 最快的下载源: {best['name']}")
+    print(f"  {command}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import subprocess
+
+import probe_memo
+import probe_trace
+
+# 一次 nvidia-smi 调用查询全部GPU的字段及其类型
+QUERY_FIELDS = (
+    ('index', int),
+    ('uuid', str),
+    ('name', str),
+    ('driver_version', str),
+    ('memory.total', int),
+    ('memory.used', int),
+    ('utilization.gpu', int),
+    ('temperature.gpu', int),
+    ('power.draw', float),
+    ('clocks.sm', int),
+    ('pstate', str),
+)
+
+# nvidia-smi 对不支持或不可用的字段输出的占位值
+_MISSING = {'', 'N/A', '[N/A]', '[Not Supported]', 'Not Supported', '[Unknown Error]', '[Insufficient Permissions]'}
+
+
+class GpuRecord:
+    """单块GPU的查询结果 (显存单位 MiB，功耗单位 W，频率单位 MHz)"""
+
+    __slots__ = ('index', 'uuid', 'name', 'driver_version', 'memory_total', 'memory_used',
+                 'utilization', 'temperature', 'power_draw', 'sm_clock', 'pstate')
+
+    def __init__(self, index, uuid, name, driver_version, memory_total, memory_used,
+                 utilization, temperature, power_draw, sm_clock, pstate):
+        self.index = index
+        self.uuid = uuid
+        self.name = name
+        self.driver_version = driver_version
+        self.memory_total = memory_total
+        self.memory_used = memory_used
+        self.utilization = utilization
+        self.temperature = temperature
+        self.power_draw = power_draw
+        self.sm_clock = sm_clock
+        self.pstate = pstate
+
+    @property
+    def memory_free(self):
+        if self.memory_total is None or self.memory_used is None:
+            return None
+        return self.memory_total - self.memory_used
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"GpuRecord(index={self.index!r}, name={self.name!r}, uuid={self.uuid!r})"
+
+
+def build_command(nvidia_smi='nvidia-smi', loop_ms=None):
+    """构造查询命令；loop_ms 不为空时让 nvidia-smi 按该间隔 (毫秒) 持续输出"""
+    cmd = [nvidia_smi,
+           '--query-gpu=' + ','.join(name for name, _ in QUERY_FIELDS),
+           '--format=csv,noheader,nounits']
+    if loop_ms is not None:
+        cmd.append(f'--loop-ms={int(loop_ms)}')
+    return cmd
+
+
+def convert_field(text, kind):
+    """把一个 --format=csv,nounits 字段转换为 kind 类型；[N/A] 等缺失值或无法转换时返回 None"""
+    text = text.strip()
+    if text in _MISSING:
+        return None
+    if kind is str:
+        return text
+    try:
+        return kind(float(text)) if kind is int else kind(text)
+    except ValueError:
+        return None
+
+
+def parse_line(line):
+    """解析一行CSV输出，格式不符时返回 None"""
+    parts = line.strip().split(',')
+    count = len(QUERY_FIELDS)
+    if len(parts) < count:
+        return None
+    if len(parts) > count:
+        # 型号名称中含逗号时，把多出的部分并回名称字段
+        extra = len(parts) - count
+        parts = parts[:2] + [','.join(parts[2:3 + extra])] + parts[3 + extra:]
+    values = [convert_field(text, kind) for text, (_, kind) in zip(parts, QUERY_FIELDS)]
+    if values[0] is None:
+        return None
+    return GpuRecord(*values)
+
+
+def parse_output(text):
+    """解析全部输出，返回 GpuRecord 列表"""
+    records = []
+    for line in text.splitlines():
+        if line.strip():
+            record = parse_line(line)
+            if record is not None:
+                records.append(record)
+    return records
+
+
+def query_gpus(timeout=None, nvidia_smi='nvidia-smi', cached=True):
+    """调用一次 nvidia-smi 查询所有GPU
+
+    返回 (记录列表, 错误信息)；成功时错误信息为 None，失败时记录列表为 None。
+    cached 为真时同一进程内只运行一次 nvidia-smi；需要最新数值时传入 False。
+    """
+    cmd = build_command(nvidia_smi)
+    try:
+        if cached:
+            result = probe_memo.run(cmd, timeout)
+        else:
+            with probe_trace.span(f"spawn {nvidia_smi}", 'subprocess'):
+                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        text=True, timeout=timeout)
+    except FileNotFoundError:
+        return None, "未找到nvidia-smi命令，NVIDIA驱动可能未安装"
+    except subprocess.TimeoutExpired:
+        return None, f"nvidia-smi 在 {timeout:.1f} 秒内未响应，驱动可能处于异常状态"
+    except OSError as e:
+        return None, f"无法运行nvidia-smi: {e}"
+    if result.returncode != 0:
+        message = (result.stdout.strip() or result.stderr.strip()).split('\n')[0]
+        return None, f"nvidia-smi 执行失败: {message}"
+    return parse_output(result.stdout), None
+
+
+def query_compute_caps(timeout=None, nvidia_smi='nvidia-smi'):
+    """查询每块GPU的计算能力 (如 "8.6")，失败时返回空列表
+
+    compute_cap 字段需要较新的驱动 (510 及以上)，因此不放在 QUERY_FIELDS 中，
+    以免旧驱动因不认识该字段而使整个查询失败。
+    """
+    try:
+        result = probe_memo.run([nvidia_smi, '--query-gpu=compute_cap', '--format=csv,noheader'], timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return []
+    if result.returncode != 0:
+        return []
+    return [line.strip() for line in result.stdout.splitlines() if line.strip() not in _MISSING]
+
+
+def _fmt(value, unit=""):
+    return "N/A" if value is None else f"{value}{unit}"
+
+
+def format_record(record):
+    """把单块GPU的记录格式化为一行文字"""
+    return (f"GPU {record.index}: {record.name} | "
+            f"显存 {_fmt(record.memory_used)}/{_fmt(record.memory_total)} MiB | "
+            f"利用率 {_fmt(record.utilization, '%')} | "
+            f"温度 {_fmt(record.temperature, '°C')} | "
+            f"功耗 {_fmt(record.power_draw, ' W')} | "
+            f"SM {_fmt(record.sm_clock, ' MHz')} | "
+            f"{_fmt(record.pstate)}")
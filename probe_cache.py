@@ -0,0 +1,151 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import platform
+import tempfile
+import contextlib
+
+# 缓存格式版本，格式变化时旧缓存自动失效
+CACHE_VERSION = 4
+# 默认缓存有效期 (秒)
+DEFAULT_TTL = 3600
+
+
+def cache_dir():
+    """返回缓存目录 (可用 GPU_CK_CACHE_DIR 环境变量覆盖)"""
+    path = os.environ.get('GPU_CK_CACHE_DIR')
+    if path:
+        return path
+    if platform.system() == "Windows":
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'gpu_ck')
+
+
+def stat_key(path):
+    """文件路径、修改时间和大小；文件不存在时返回 None"""
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [os.path.realpath(path), st.st_mtime_ns, st.st_size]
+
+
+def _read_text(path):
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _nvcc_path():
+    if platform.system() == "Windows":
+        cuda_path = os.environ.get('CUDA_PATH')
+        return os.path.join(cuda_path, 'bin', 'nvcc.exe') if cuda_path else None
+    return shutil.which('nvcc')
+
+
+def _torch_dist_version():
+    """从 dist-info 读取 torch 版本，不导入 torch"""
+    try:
+        from importlib import metadata
+        return metadata.version('torch')
+    except Exception:
+        return None
+
+
+def fingerprint():
+    """计算环境指纹: 只读取文件元数据和环境变量，不启动任何进程"""
+    parts = {
+        'nvidia_smi': stat_key(shutil.which('nvidia-smi')),
+        'nvcc': stat_key(_nvcc_path()),
+        'driver': _read_text('/proc/driver/nvidia/version'),
+        'torch': _torch_dist_version(),
+        'python': sys.executable,
+        # 新增或删除工具包目录会改变其父目录的修改时间
+        'toolkit_bases': [stat_key(base) for base in ('/usr/local', '/opt')],
+        'CUDA_PATH': os.environ.get('CUDA_PATH'),
+        'CUDA_HOME': os.environ.get('CUDA_HOME'),
+        'LD_LIBRARY_PATH': os.environ.get('LD_LIBRARY_PATH'),
+        'PATH': os.environ.get('PATH'),
+        # 可见设备集合决定了可调度的设备列表和 torch 看到的GPU
+        'CUDA_VISIBLE_DEVICES': os.environ.get('CUDA_VISIBLE_DEVICES'),
+        'NVIDIA_VISIBLE_DEVICES': os.environ.get('NVIDIA_VISIBLE_DEVICES'),
+        'CUDA_DEVICE_ORDER': os.environ.get('CUDA_DEVICE_ORDER'),
+    }
+    raw = json.dumps(parts, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _cache_file(name):
+    return os.path.join(cache_dir(), f"{name}.json")
+
+
+def load(name, ttl=DEFAULT_TTL, key=None):
+    """读取缓存；过期、指纹不符或损坏时返回 None，命中时返回 (数据, 已缓存秒数)"""
+    try:
+        with open(_cache_file(name), encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or entry.get('version') != CACHE_VERSION:
+        return None
+    age = time.time() - entry.get('created', 0)
+    if age < 0 or age > ttl:
+        return None
+    if entry.get('fingerprint') != (key or fingerprint()):
+        return None
+    return entry.get('data'), age
+
+
+def store(name, data, key=None):
+    """原子地写入缓存，写入失败时静默忽略"""
+    entry = {
+        'version': CACHE_VERSION,
+        'fingerprint': key or fingerprint(),
+        'created': time.time(),
+        'data': data,
+    }
+    directory = cache_dir()
+    tmp = None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, _cache_file(name))
+    except OSError:
+        if tmp is not None:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+
+
+def run_cached(name, func, use_cache=True, refresh=False, ttl=DEFAULT_TTL):
+    """执行会打印结果的检测函数并缓存其输出和返回值
+
+    命中缓存时直接重放输出并返回缓存的返回值；返回值需可被 JSON 序列化。
+    """
+    key = fingerprint() if use_cache else None
+    if use_cache and not refresh:
+        hit = load(name, ttl, key)
+        if hit is not None:
+            data, _ = hit
+            print(data['output'], end="")
+            return data['value']
+
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        value = func()
+    output = buffer.getvalue()
+    print(output, end="")
+    if use_cache:
+        store(name, {'output': output, 'value': value}, key)
+    return value
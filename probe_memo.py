@@ -0,0 +1,147 @@
+import threading
+import importlib
+import subprocess
+
+import probe_trace
+
+_lock = threading.Lock()
+_entries = {}  # 键 -> _Flight
+_counters = {}  # 类别 -> {'calls': 调用次数, 'executions': 实际执行次数}
+
+# 外部命令未指定超时时，等待其他线程中同一命令的最长时间 (秒)
+SPAWN_WAIT_TIMEOUT = 60.0
+
+
+class _Flight:
+    """一次正在进行或已完成的执行；并发的相同调用共享同一个结果"""
+
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def call_once(kind, key, func, wait_timeout=None):
+    """在进程内对 (kind, key) 只执行一次 func，其余调用复用结果
+
+    并发调用会等待同一次执行完成。执行抛出异常时，异常会传给所有等待者，
+    但不会被记住，下一次调用将重新执行。指定 wait_timeout 时，等待超过该秒数
+    (如另一线程中的命令卡住) 的调用者改为自行执行 func，其结果不会被缓存。
+    """
+    full_key = (kind, key)
+    with _lock:
+        counter = _counters.setdefault(kind, {'calls': 0, 'executions': 0})
+        counter['calls'] += 1
+        flight = _entries.get(full_key)
+        owner = flight is None
+        if owner:
+            flight = _entries[full_key] = _Flight()
+            counter['executions'] += 1
+
+    if owner:
+        try:
+            flight.value = func()
+        except BaseException as e:
+            flight.error = e
+            with _lock:
+                _entries.pop(full_key, None)
+        finally:
+            flight.event.set()
+    elif not flight.event.wait(wait_timeout):
+        with _lock:
+            counter['executions'] += 1
+        return func()
+
+    if flight.error is not None:
+        raise flight.error
+    return flight.value
+
+
+def _program(cmd):
+    """命令中的可执行文件名，用于耗时记录"""
+    parts = cmd.split() if isinstance(cmd, str) else list(cmd)
+    return parts[0] if parts else ''
+
+
+def run_cmd(cmd, shell=True, timeout=None):
+    """运行命令并返回 (返回码, 标准输出, 标准错误)，不做缓存"""
+    try:
+        with probe_trace.span(f"spawn {_program(cmd)}", 'subprocess'):
+            process = subprocess.run(
+                cmd,
+                shell=shell,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                timeout=timeout
+            )
+        return process.returncode, process.stdout, process.stderr
+    except Exception as e:
+        return -1, "", str(e)
+
+
+def _spawn_wait(timeout):
+    """等待同一命令的其他调用的最长时间: 命令自身的超时，未指定时为 SPAWN_WAIT_TIMEOUT"""
+    return SPAWN_WAIT_TIMEOUT if timeout is None else timeout
+
+
+def cached_cmd(cmd, shell=True, timeout=None):
+    """与 run_cmd 相同，但同一进程内相同命令只运行一次 (仅用于只读的查询命令)"""
+    key = (cmd if isinstance(cmd, str) else tuple(cmd), shell)
+    return call_once('spawn', key, lambda: run_cmd(cmd, shell, timeout), _spawn_wait(timeout))
+
+
+def run(args, timeout=None):
+    """带缓存的 subprocess.run(args)，返回 CompletedProcess
+
+    FileNotFoundError、TimeoutExpired 等异常照常抛出且不缓存。
+    """
+    def spawn():
+        with probe_trace.span(f"spawn {args[0]}", 'subprocess'):
+            return subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                  text=True, timeout=timeout)
+    return call_once('spawn', (tuple(args), False), spawn, _spawn_wait(timeout))
+
+
+def import_module(name):
+    """带缓存的 importlib.import_module，导入失败的结果同样会被记住"""
+    def load():
+        try:
+            with probe_trace.span(f"import {name}", 'import'):
+                return importlib.import_module(name), None
+        except ImportError as e:
+            return None, e
+
+    module, error = call_once('import', name, load)
+    if error is not None:
+        raise error
+    return module
+
+
+def invalidate(kind=None, predicate=None):
+    """清除缓存的结果；可按类别和键的条件筛选"""
+    with _lock:
+        for full_key in list(_entries):
+            if kind is not None and full_key[0] != kind:
+                continue
+            if predicate is not None and not predicate(full_key[1]):
+                continue
+            if _entries[full_key].event.is_set():
+                del _entries[full_key]
+
+
+def stats():
+    """各类别的调用次数、实际执行次数和节省次数"""
+    with _lock:
+        return {kind: dict(c, saved=c['calls'] - c['executions']) for kind, c in _counters.items()}
+
+
+def format_stats():
+    """把统计信息格式化为一行文字"""
+    names = {'spawn': '外部命令', 'import': '模块导入'}
+    parts = []
+    for kind, c in sorted(stats().items()):
+        parts.append(f"{names.get(kind, kind)}: 请求 {c['calls']} 次，实际执行 {c['executions']} 次，节省 {c['saved']} 次")
+    return "；".join(parts) if parts else "没有缓存的探测调用"
@@ -0,0 +1,135 @@
+import io
+import sys
+import json
+import time
+import socket
+import contextlib
+
+from probe_scheduler import STATUS_OK, STATUS_FAILED, STATUS_ERROR, STATUS_TIMEOUT, STATUS_SKIPPED
+
+# 事件格式版本，字段含义变化时递增
+SCHEMA_VERSION = 1
+
+FORMATS = ('text', 'json', 'ndjson')
+
+# 退出码: 全部通过 / 有检测项未通过 / 有检测项出错或超时
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_ERROR = 2
+
+
+def _default(value):
+    """JSON 无法直接序列化的值 (如异常、集合) 转为字符串或列表"""
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    return str(value)
+
+
+def exit_code(statuses):
+    """由各检测项状态计算退出码"""
+    statuses = list(statuses)
+    if any(s in (STATUS_ERROR, STATUS_TIMEOUT) for s in statuses):
+        return EXIT_ERROR
+    if any(s == STATUS_FAILED for s in statuses):
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+class Reporter:
+    """输出检测事件
+
+    text 格式下不输出任何事件，由调用方照常打印文字报告；
+    ndjson 格式下每项检测完成即输出一行事件并立即刷新；
+    json 格式下在 finish 时输出包含全部事件的单个文档。
+    每个事件的字段固定为: schema、event、tool、host、probe、status、duration_ms、data、error。
+    """
+
+    def __init__(self, tool, fmt='text', stream=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"不支持的输出格式: {fmt}")
+        self.tool = tool
+        self.format = fmt
+        self.stream = stream if stream is not None else sys.stdout
+        self.host = socket.gethostname()
+        self.events = []
+        self.started = time.monotonic()
+
+    @property
+    def structured(self):
+        return self.format != 'text'
+
+    def _write(self, document):
+        self.stream.write(json.dumps(document, ensure_ascii=False, default=_default) + "\n")
+        self.stream.flush()
+
+    def probe(self, name, status, duration=0.0, data=None, error=None):
+        """记录一项检测结果；duration 单位为秒"""
+        event = {
+            'schema': SCHEMA_VERSION,
+            'event': 'probe',
+            'tool': self.tool,
+            'host': self.host,
+            'probe': name,
+            'status': status,
+            'duration_ms': round(duration * 1000, 3),
+            'data': data or {},
+            'error': None if error is None else str(error),
+        }
+        self.events.append(event)
+        if self.format == 'ndjson':
+            self._write(event)
+        return event
+
+    def result(self, result):
+        """记录 probe_scheduler.ProbeResult"""
+        return self.probe(result.name, result.status, result.elapsed, result.data, result.error)
+
+    def run(self, name, func, check=bool):
+        """执行会打印结果的检测函数并记录为一个事件，返回函数的返回值
+
+        返回值为字典时作为事件的 data；check(返回值) 为假时记为未通过。文字格式下照常打印，
+        结构化输出时丢弃函数打印的文字，函数抛出的异常记为 error 而不再向上抛出。
+        """
+        began = time.monotonic()
+        if not self.structured:
+            value = func()
+        else:
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    value = func()
+            except Exception as e:
+                self.probe(name, STATUS_ERROR, time.monotonic() - began, error=e)
+                return None
+        data = value if isinstance(value, dict) else {'value': value}
+        status = STATUS_OK if check(value) else STATUS_FAILED
+        self.probe(name, status, time.monotonic() - began, data)
+        return value
+
+    def skip(self, name, reason):
+        return self.probe(name, STATUS_SKIPPED, error=reason)
+
+    def finish(self, data=None):
+        """输出汇总并返回退出码"""
+        code = exit_code(event['status'] for event in self.events)
+        if not self.structured:
+            return code
+        counts = {}
+        for event in self.events:
+            counts[event['status']] = counts.get(event['status'], 0) + 1
+        summary = {
+            'schema': SCHEMA_VERSION,
+            'event': 'summary',
+            'tool': self.tool,
+            'host': self.host,
+            'exit_code': code,
+            'duration_ms': round((time.monotonic() - self.started) * 1000, 3),
+            'counts': counts,
+            'data': data or {},
+        }
+        if self.format == 'ndjson':
+            self._write(summary)
+        else:
+            self._write(dict(summary, event='report', probes=self.events))
+        return code
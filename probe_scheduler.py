@@ -0,0 +1,209 @@
+import io
+import sys
+import time
+import threading
+
+# 检测结果状态
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_ERROR = "error"
+STATUS_TIMEOUT = "timeout"
+STATUS_SKIPPED = "skipped"
+
+# 检测函数自行处理超时 (如终止子进程) 所需的宽限时间
+_GRACE = 0.5
+
+
+class Probe:
+    """一个检测项: 执行函数、依赖关系和超时时间
+
+    func 以剩余可用秒数 (可能为 None) 和一个空字典调用，返回值为真表示检测通过；
+    检测函数可把版本号等结构化结果写入该字典，作为结果的 data。
+    deps 中的检测项完成后才会启动本项；requires 中的检测项必须通过，否则本项直接跳过。
+    """
+
+    def __init__(self, name, func, deps=(), requires=(), timeout=None):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.deps = tuple(dict.fromkeys(tuple(deps) + self.requires))
+        self.timeout = timeout
+
+
+class ProbeResult:
+    """检测项的执行结果"""
+
+    def __init__(self, name, status, value=None, output="", elapsed=0.0, error=None, data=None):
+        self.name = name
+        self.status = status
+        self.value = value
+        self.output = output
+        self.elapsed = elapsed
+        self.error = error
+        self.data = data if data is not None else {}
+
+    @property
+    def ok(self):
+        return self.status == STATUS_OK
+
+    def __repr__(self):
+        return f"ProbeResult({self.name!r}, {self.status!r}, elapsed={self.elapsed:.3f})"
+
+
+class _ThreadOutput(io.TextIOBase):
+    """按线程分流的 stdout: 检测线程的输出写入各自的缓冲区，其余线程照常输出"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._buffers = {}
+
+    def register(self, buffer):
+        self._buffers[threading.get_ident()] = buffer
+
+    def unregister(self):
+        self._buffers.pop(threading.get_ident(), None)
+
+    def write(self, text):
+        buffer = self._buffers.get(threading.get_ident())
+        if buffer is None:
+            return self._stream.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        if threading.get_ident() not in self._buffers:
+            self._stream.flush()
+
+
+def _check_graph(probes):
+    """检查检测项名称唯一、依赖存在且无环"""
+    by_name = {}
+    for probe in probes:
+        if probe.name in by_name:
+            raise ValueError(f"检测项名称重复: {probe.name}")
+        by_name[probe.name] = probe
+
+    for probe in probes:
+        for dep in probe.deps:
+            if dep not in by_name:
+                raise ValueError(f"检测项 {probe.name} 依赖不存在的检测项: {dep}")
+
+    visiting, done = set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"检测项依赖存在循环: {name}")
+        visiting.add(name)
+        for dep in by_name[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for probe in probes:
+        visit(probe.name)
+    return by_name
+
+
+def run_probes(probes, budget=None, on_result=None):
+    """并发执行检测项，返回 {名称: ProbeResult}
+
+    相互独立的检测项同时运行；每项超过自身 timeout 或总预算 budget 时记为超时。
+    超时的子进程由检测函数通过传入的剩余秒数自行终止，进程内的检测 (如 import torch)
+    无法强制中断，其线程会被放弃，不再阻塞整体检测。
+    on_result 在每项得到结果时 (于调用线程中) 被调用。
+    """
+    by_name = _check_graph(probes)
+    results = {}
+    running = {}  # 名称 -> (截止时间, 启动时间, 输出缓冲区, 结构化结果)
+    finished = {}  # 工作线程写入的原始结果
+    cond = threading.Condition()
+    start = time.monotonic()
+    budget_deadline = start + budget if budget is not None else None
+
+    proxy = _ThreadOutput(sys.stdout)
+
+    def worker(probe, timeout, buffer, data):
+        proxy.register(buffer)
+        began = time.monotonic()
+        try:
+            value = probe.func(timeout, data)
+            outcome = (STATUS_OK if value else STATUS_FAILED, value, None)
+        except Exception as e:
+            outcome = (STATUS_ERROR, None, e)
+        finally:
+            proxy.unregister()
+        with cond:
+            finished[probe.name] = outcome + (time.monotonic() - began,)
+            cond.notify()
+
+    def record(result):
+        results[result.name] = result
+        if on_result is not None:
+            on_result(result)
+
+    def launch_ready(now):
+        for probe in probes:
+            name = probe.name
+            if name in results or name in running:
+                continue
+            if any(dep not in results for dep in probe.deps):
+                continue
+            failed = [dep for dep in probe.requires if not results[dep].ok]
+            if failed:
+                record(ProbeResult(name, STATUS_SKIPPED, error=f"依赖未通过: {', '.join(failed)}"))
+                continue
+            deadline = budget_deadline
+            if probe.timeout is not None:
+                own = now + probe.timeout
+                deadline = own if deadline is None else min(deadline, own)
+            if deadline is not None and deadline <= now:
+                record(ProbeResult(name, STATUS_TIMEOUT, error="总时间预算已耗尽"))
+                continue
+            timeout = deadline - now if deadline is not None else None
+            buffer = io.StringIO()
+            data = {}
+            running[name] = (deadline + _GRACE if deadline is not None else None, now, buffer, data)
+            thread = threading.Thread(target=worker, args=(probe, timeout, buffer, data),
+                                      name=f"probe-{name}", daemon=True)
+            thread.start()
+
+    old_stdout = sys.stdout
+    sys.stdout = proxy
+    abandoned = False
+    try:
+        with cond:
+            while True:
+                # 启动就绪项可能立即产生跳过/超时结果，需反复处理直到稳定
+                count = -1
+                while count != len(results):
+                    count = len(results)
+                    launch_ready(time.monotonic())
+                if len(results) == len(by_name):
+                    break
+
+                now = time.monotonic()
+                deadlines = [d for d, _, _, _ in running.values() if d is not None]
+                wait = max(0.0, min(deadlines) - now) if deadlines else None
+                if not finished:
+                    cond.wait(wait)
+
+                now = time.monotonic()
+                for name, outcome in list(finished.items()):
+                    del finished[name]
+                    if name not in running:
+                        continue  # 已判定超时的检测项迟到的结果
+                    status, value, error, elapsed = outcome
+                    _, _, buffer, data = running.pop(name)
+                    record(ProbeResult(name, status, value, buffer.getvalue(), elapsed, error, data))
+                for name, (deadline, began, buffer, data) in list(running.items()):
+                    if deadline is not None and now >= deadline:
+                        del running[name]
+                        abandoned = True
+                        record(ProbeResult(name, STATUS_TIMEOUT, output=buffer.getvalue(),
+                                           elapsed=now - began, error="超过截止时间", data=dict(data)))
+    finally:
+        # 被放弃的线程仍可能输出，此时保留分流的 stdout 以免其内容混入报告
+        if not abandoned:
+            sys.stdout = old_stdout
+    return results
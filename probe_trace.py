@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import threading
+import functools
+
+_enabled = False
+_lock = threading.Lock()
+_spans = []  # (名称, 类别, 开始纳秒, 持续纳秒, 线程ID, 线程名)
+_origin = 0
+
+
+class _Span:
+    """计时区间，退出时记录一条 span"""
+
+    __slots__ = ('name', 'category', 'start')
+
+    def __init__(self, name, category):
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        thread = threading.current_thread()
+        with _lock:
+            _spans.append((self.name, self.category, self.start - _origin, end - self.start,
+                           thread.ident, thread.name))
+        return False
+
+
+class _NullSpan:
+    """未开启追踪时使用的空上下文，不做任何事"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enable():
+    """开启追踪并清空已记录的数据"""
+    global _enabled, _origin
+    with _lock:
+        _spans.clear()
+        _origin = time.perf_counter_ns()
+        _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def span(name, category='probe'):
+    """返回计时上下文；未开启追踪时返回共享的空上下文"""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, category)
+
+
+def traced(name=None, category='check'):
+    """函数装饰器: 开启追踪时记录每次调用的耗时"""
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(label, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def spans():
+    with _lock:
+        return list(_spans)
+
+
+def summary():
+    """按 (类别, 名称) 汇总，返回按总耗时降序排列的列表"""
+    totals = {}
+    for name, category, _, duration, _, _ in spans():
+        entry = totals.setdefault((category, name), [0, 0, 0])
+        entry[0] += 1
+        entry[1] += duration
+        entry[2] = max(entry[2], duration)
+    rows = [{'category': c, 'name': n, 'count': v[0], 'total_ms': v[1] / 1e6, 'max_ms': v[2] / 1e6}
+            for (c, n), v in totals.items()]
+    return sorted(rows, key=lambda r: r['total_ms'], reverse=True)
+
+
+def format_summary():
+    """把汇总结果格式化为文字表格"""
+    rows = summary()
+    if not rows:
+        return ["没有记录到任何耗时数据"]
+    lines = [f"{'总耗时(ms)':>11}{'次数':>6}{'最长(ms)':>10}  类别/名称"]
+    for r in rows:
+        lines.append(f"{r['total_ms']:>14.1f}{r['count']:>8}{r['max_ms']:>12.1f}  {r['category']}/{r['name']}")
+    return lines
+
+
+def write_chrome_trace(path):
+    """写出 Chrome trace-event 格式的JSON，可用 Perfetto 或 chrome://tracing 打开"""
+    pid = os.getpid()
+    events = []
+    threads = {}
+    for name, category, start, duration, tid, thread_name in spans():
+        threads[tid] = thread_name
+        events.append({'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                       'ts': start / 1e3, 'dur': duration / 1e3})
+    for tid, thread_name in threads.items():
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                       'args': {'name': thread_name}})
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
@@ -0,0 +1,312 @@
+import io
+import os
+import sys
+import json
+import time
+import errno
+import ctypes
+import select
+import shutil
+import difflib
+import platform
+import contextlib
+import subprocess
+
+import probe_memo
+import probe_cache
+import cuda_inventory
+import torch_build_info
+
+# inotify 事件掩码 (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+
+class Input:
+    """检测项依赖的一项输入
+
+    value() 返回可比较的当前值 (通常只需 stat 或读取小文件，耗时在毫秒以内)；
+    paths() 返回需要监视的目录，其中任何变化都会触发一次重新取值。
+    """
+
+    __slots__ = ('name', 'value', 'paths')
+
+    def __init__(self, name, value, paths=lambda: ()):
+        self.name = name
+        self.value = value
+        self.paths = paths
+
+
+class WatchedProbe:
+    """可单独重新运行的检测项
+
+    func(results) 打印检测结果并返回结构化数据，results 为各检测项最近一次的返回值；
+    inputs 为依赖的输入名称，after 为依赖的其他检测项 (它们重新运行后本项也重新运行)。
+    """
+
+    __slots__ = ('name', 'func', 'inputs', 'after')
+
+    def __init__(self, name, func, inputs=(), after=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.after = tuple(after)
+
+
+class InotifyWatcher:
+    """通过 ctypes 调用 inotify 监视目录；只判断"有变化"，具体变化由比较输入值得出"""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._watched = set()
+
+    def watch(self, paths):
+        for path in paths:
+            if path in self._watched or not os.path.isdir(path):
+                continue
+            if self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK) >= 0:
+                self._watched.add(path)
+
+    def wait(self, timeout):
+        """等待事件，最多 timeout 秒；有事件时读空队列并返回 True"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return False
+        while True:
+            try:
+                if not os.read(self._fd, 65536):
+                    break
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+        return True
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """不支持 inotify 时的退化实现: 每隔 interval 秒重新比较一次输入值"""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+
+    def watch(self, paths):
+        pass
+
+    def wait(self, timeout):
+        # 无法得知是否有变化，由调用方在醒来后比较输入值
+        time.sleep(self.interval if timeout is None else min(self.interval, timeout))
+        return False
+
+    def close(self):
+        pass
+
+
+# 影响检测结果的环境变量；它们在本进程启动时即已确定，无法在监视中察觉变化，修改后需重新启动监视
+ENV_VARS = ('PATH', 'LD_LIBRARY_PATH', 'CUDA_HOME', 'CUDA_PATH', 'CUDA_VISIBLE_DEVICES',
+            'NVIDIA_VISIBLE_DEVICES', 'PYTHONPATH', 'VIRTUAL_ENV', 'CONDA_PREFIX')
+
+DRIVER_VERSION_FILE = "/proc/driver/nvidia/version"
+
+
+def _path_dirs():
+    return [p for p in os.environ.get('PATH', '').split(os.pathsep) if p]
+
+
+def _read_text(path):
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _toolkit_state():
+    """各工具包根目录及其版本文件的状态 (只 stat，不扫描库文件)"""
+    return sorted([os.path.realpath(root),
+                   probe_cache.stat_key(os.path.join(root, 'version.json')),
+                   probe_cache.stat_key(os.path.join(root, 'version.txt'))]
+                  for root in set(cuda_inventory.candidate_roots()))
+
+
+def _toolkit_dirs():
+    bases = cuda_inventory.WINDOWS_BASES if platform.system() == "Windows" else cuda_inventory.LINUX_BASES
+    return list(bases) + [os.path.realpath(root) for root in cuda_inventory.candidate_roots()]
+
+
+def _torch_state():
+    """torch 发行包的版本和 torch/version.py 的状态；重新安装 (即使版本号相同) 也会改变"""
+    dist = torch_build_info.find_distribution('torch')
+    if dist is None:
+        return None
+    return [dist.version, probe_cache.stat_key(str(dist.locate_file('torch/version.py')))]
+
+
+def _site_dirs():
+    return [path for path in sys.path if path and os.path.isdir(path) and not os.path.isfile(path)]
+
+
+def default_inputs():
+    """版本检测各项依赖的输入: 驱动、nvidia-smi/nvcc、工具包目录、torch 发行包"""
+    return [
+        Input('nvidia_smi', lambda: probe_cache.stat_key(shutil.which('nvidia-smi')), _path_dirs),
+        Input('nvcc', lambda: probe_cache.stat_key(shutil.which('nvcc')), _path_dirs),
+        # procfs 不产生 inotify 事件，依靠定期醒来时重新读取
+        Input('driver', lambda: _read_text(DRIVER_VERSION_FILE)),
+        Input('toolkits', _toolkit_state, _toolkit_dirs),
+        Input('torch_dist', _torch_state, _site_dirs),
+    ]
+
+
+def run_isolated(module, function, timeout=None):
+    """在新的Python进程中运行 module.function() 并转发其输出，返回其 (可JSON序列化的) 返回值
+
+    torch 等扩展模块无法在同一进程中卸载后重新导入，重新安装后只能在新进程中检测。
+    """
+    code = ("import sys, io, json, contextlib\n"
+            f"sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r})\n"
+            f"import {module} as m\n"
+            "buffer = io.StringIO()\n"
+            "with contextlib.redirect_stdout(buffer):\n"
+            f"    value = m.{function}()\n"
+            "sys.stdout.write(json.dumps({'output': buffer.getvalue(), 'value': value}, default=str))\n")
+    result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True, timeout=timeout)
+    try:
+        data = json.loads(result.stdout)
+    except ValueError:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(f"子进程退出码 {result.returncode}: {lines[-1] if lines else '无输出'}")
+    sys.stdout.write(data['output'])
+    return data['value']
+
+
+def make_watcher(polling=False, interval=1.0):
+    """优先使用 inotify (仅 Linux)，不可用时退回轮询"""
+    if not polling and platform.system() == "Linux":
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(interval)
+
+
+def _watch_paths(inputs):
+    """各输入要监视的目录，以及不存在的目录最近的已存在上级 (以便发现其被创建)"""
+    paths = set()
+    for item in inputs:
+        for path in item.paths():
+            path = os.path.abspath(path)
+            while path and not os.path.isdir(path):
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+            paths.add(path)
+    return paths
+
+
+def snapshot(inputs):
+    return {item.name: item.value() for item in inputs}
+
+
+def affected_probes(probes, changed):
+    """输入变化后需要重新运行的检测项 (保持原顺序，并传递到依赖它们的检测项)"""
+    affected = []
+    for probe in probes:
+        if set(probe.inputs) & changed or set(probe.after) & set(affected):
+            affected.append(probe.name)
+    return affected
+
+
+def run_probe(probe, results):
+    """运行检测项并捕获其输出，返回 (输出, 返回值)"""
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        try:
+            value = probe.func(results)
+        except Exception as e:
+            print(f"✗ 检测 {probe.name} 出错: {e}")
+            value = None
+    return buffer.getvalue(), value
+
+
+def diff_output(old, new):
+    """两次输出的差异行 (不含上下文)"""
+    lines = difflib.unified_diff(old.splitlines(), new.splitlines(), lineterm="", n=0)
+    return [line for line in lines if line[:1] in '+-' and not line.startswith(('+++', '---'))]
+
+
+def watch(probes, inputs, debounce=0.3, interval=2.0, polling=False, max_changes=None, out=None):
+    """先运行全部检测项，然后监视输入并只重新运行受影响的检测项
+
+    inotify 只用来尽快醒来；每次醒来 (或每 interval 秒，用于 procfs 等无法监视的输入) 都重新
+    计算全部输入值，值未变化时不运行任何检测。连续的事件 (如 pip 安装写入大量文件) 在静默
+    debounce 秒后才处理。max_changes 用于测试，处理指定次数的变化后返回。
+    """
+    out = out or sys.stdout
+    by_name = {item.name: item for item in inputs}
+    results, outputs = {}, {}
+    for probe in probes:
+        outputs[probe.name], results[probe.name] = run_probe(probe, results)
+        out.write(outputs[probe.name])
+    state = snapshot(inputs)
+
+    watcher = make_watcher(polling, interval)
+    watcher.watch(_watch_paths(inputs))
+    mode = "inotify" if isinstance(watcher, InotifyWatcher) else f"每 {interval:g} 秒轮询"
+    print(f"\n正在监视 {len(inputs)} 项输入 ({mode})，Ctrl+C 退出...", file=out)
+    print(f"注意: 环境变量 ({', '.join(ENV_VARS)}) 在启动时已确定，修改后需重新启动监视", file=out, flush=True)
+    handled = 0
+    try:
+        while max_changes is None or handled < max_changes:
+            if watcher.wait(interval):
+                while watcher.wait(debounce):
+                    pass
+            began = time.perf_counter()
+            current = snapshot(inputs)
+            changed = {name for name in current if current[name] != state[name]}
+            if not changed:
+                continue
+            state = current
+            handled += 1
+            names = affected_probes(probes, changed)
+            stamp = time.strftime('%H:%M:%S')
+            print(f"\n[{stamp}] 变化的输入: {', '.join(sorted(changed))}；重新运行: {', '.join(names) or '无'}",
+                  file=out)
+            # 清除进程内缓存的外部命令结果，否则重新运行时会得到旧的输出
+            probe_memo.invalidate('spawn')
+            for probe in probes:
+                if probe.name not in names:
+                    continue
+                output, results[probe.name] = run_probe(probe, results)
+                lines = diff_output(outputs[probe.name], output)
+                outputs[probe.name] = output
+                print(f"  [{probe.name}] " + ("无变化" if not lines else f"{len(lines)} 行变化:"), file=out)
+                for line in lines:
+                    print(f"    {line}", file=out)
+            print(f"  (用时 {(time.perf_counter() - began) * 1000:.0f} ms)", file=out, flush=True)
+            watcher.watch(_watch_paths(by_name.values()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    return results
@@ -1,45 +1,97 @@
+import os
+import re
 import sys
+import sqlite3
+import argparse
 import platform
-import subprocess
 from datetime import datetime
 
+import probe_cache
+import probe_memo
+import probe_trace
+from probe_memo import cached_cmd
+import compute_benchmark
+import cpu_tuning
+import torch_build_info
+import env_scan
+import cuda_inventory
+import gpu_discovery
+import nvsmi_query
+import import_profiler
+import probe_report
+import compat_index
+import mirror_rank
+import gpu_memory
+import bench_history
+import probe_watch
+import transfer_benchmark
+
 def print_section(title):
     """打印分隔标题"""
     print("\n" + "="*60)
     print(title)
     print("="*60)
 
-def run_cmd(cmd, shell=True):
-    """运行命令并返回结果"""
-    try:
-        process = subprocess.run(
-            cmd, 
-            shell=shell, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        return process.returncode, process.stdout, process.stderr
-    except Exception as e:
-        return -1, "", str(e)
-
+@probe_trace.traced()
 def check_python_environment():
-    """检查Python环境信息"""
+    """检查Python环境信息，返回环境信息字典"""
     print(f"检测时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"操作系统: {platform.system()} {platform.release()} {platform.version()}")
     print(f"Python版本: {platform.python_version()}")
     
     # 检查是否为虚拟环境
-    if hasattr(sys, 'real_prefix') or (hasattr(sys, 'base_prefix') and sys.base_prefix != sys.prefix):
+    virtualenv = hasattr(sys, 'real_prefix') or (hasattr(sys, 'base_prefix') and sys.base_prefix != sys.prefix)
+    if virtualenv:
         print(f"当前在虚拟环境中: {sys.prefix}")
     else:
         print(f"当前为系统Python环境: {sys.prefix}")
+    return {
+        'system': platform.system(),
+        'release': platform.release(),
+        'python': platform.python_version(),
+        'executable': sys.executable,
+        'prefix': sys.prefix,
+        'virtualenv': virtualenv,
+    }
+
+@probe_trace.traced()
+def check_pytorch_build():
+    """不导入torch，从安装元数据读取PyTorch构建信息"""
+    info = torch_build_info.build_info()
+    if not info['installed']:
+        return info
+    print(f"\n✓ PyTorch已安装 (读取自安装元数据，未导入torch)")
+    print(f"  - PyTorch版本: {info['version']}")
+    print(f"  - 构建变体: {info['variant']}")
+    print(f"  - 内置CUDA版本: {info['cuda'] or '无'}")
+    print(f"  - cuDNN版本: {info['cudnn'] or '未知'}")
+    for lib in ('cudart', 'cudnn', 'cublas', 'nccl'):
+        files = info['libraries'].get(lib)
+        if files:
+            print(f"  - {lib}: {', '.join(os.path.basename(f) for f in files[:3])}")
+    for name, version in info['nvidia_packages'].items():
+        print(f"  - {name}: {version}")
+    print(f"  - 安装位置: {info['location']}")
+    return info
+
+def save_benchmark_history(results, torch):
+    """把基准测试结果追加到本机历史记录，供 bench_history.py compare 检查性能退化"""
+    try:
+        bench_history.record_benchmark(results, torch)
+    except (sqlite3.Error, OSError, RuntimeError) as e:
+        print(f"  ✗ 无法保存到历史记录: {e}")
+        return
+    print(f"  结果已保存到历史记录 (python bench_history.py compare 可检查性能退化)")
 
+@probe_trace.traced()
 def check_pytorch():
-    """详细检查PyTorch安装情况"""
+    """详细检查PyTorch安装情况，返回包含版本、CUDA是否可用及测试结果的字典"""
+    cuda_available = False
+    info = {'installed': False, 'cuda_available': False}
     try:
         # 检查PyTorch是否安装
-        import torch
+        torch = probe_memo.import_module('torch')
+        info.update(installed=True, version=torch.__version__, cuda=torch.version.cuda)
         print(f"\n✓ PyTorch已安装")
         print(f"  - PyTorch版本: {torch.__version__}")
         
@@ -51,8 +103,10 @@ def check_pytorch():
             if any(keyword in line.lower() for keyword in ['cuda', 'gpu', 'cudnn', 'nvidia', 'build', 'time']):
                 print(f"  - {line.strip()}")
         
-        # 检查CUDA是否可用
-        cuda_available = torch.cuda.is_available()
+        # 检查CUDA是否可用 (首次调用会初始化CUDA驱动)
+        with probe_trace.span('torch.cuda.is_available()', 'cuda'):
+            cuda_available = torch.cuda.is_available()
+        info['cuda_available'] = cuda_available
         if cuda_available:
             # 是GPU版本且CUDA可用
             print(f"\n✓ PyTorch GPU版本 (CUDA可用)")
@@ -62,34 +116,25 @@ def check_pytorch():
             # 获取CUDA设备信息
             device_count = torch.cuda.device_count()
             print(f"  - 可用GPU数量: {device_count}")
+            info['devices'] = []
+            if hasattr(torch.cuda, 'get_arch_list'):
+                info['arch_list'] = torch.cuda.get_arch_list()
             
             for i in range(device_count):
+                info['devices'].append({'name': torch.cuda.get_device_name(i),
+                                        'capability': list(torch.cuda.get_device_capability(i))})
                 print(f"\n  GPU #{i}:")
                 print(f"    - 设备名称: {torch.cuda.get_device_name(i)}")
                 print(f"    - 设备能力: {torch.cuda.get_device_capability(i)}")
-                
-                # 获取当前设备的可用内存
-                try:
-                    mem_info = torch.cuda.get_device_properties(i).total_memory
-                    free_mem = torch.cuda.memory_reserved(i) - torch.cuda.memory_allocated(i)
-                    print(f"    - 总显存: {mem_info / 1024**3:.2f} GB")
-                    print(f"    - 可用显存: {free_mem / 1024**3:.2f} GB")
-                except:
-                    print(f"    - 无法获取内存信息")
             
-            # 测试一个简单的GPU运算
+            # 测试GPU计算能力 (含预热和设备同步)
             print("\n正在测试GPU计算能力...")
             try:
-                x = torch.rand(1000, 1000).cuda()
-                y = torch.rand(1000, 1000).cuda()
-                
-                start_time = datetime.now()
-                z = torch.matmul(x, y)
-                end_time = datetime.now()
-                
-                elapsed = (end_time - start_time).total_seconds() * 1000  # 毫秒
-                print(f"  - 1000x1000矩阵乘法用时: {elapsed:.2f} ms")
+                results = compute_benchmark.run_suite('cuda', sizes=(1024, 2048), max_time=1.0)
+                info['benchmark'] = results
+                compute_benchmark.print_results(results)
                 print(f"  ✓ GPU计算测试通过")
+                save_benchmark_history(results, torch)
             except Exception as e:
                 print(f"  ✗ GPU计算测试失败: {e}")
         else:
@@ -104,31 +149,26 @@ def check_pytorch():
                 print(f"  - GPU不支持当前的CUDA版本")
                 
                 # 检查NVIDIA驱动
-                returncode, stdout, stderr = run_cmd('nvidia-smi')
-                if returncode == 0:
-                    print(f"\n  NVIDIA驱动已安装，但可能与PyTorch的CUDA版本不兼容")
-                    for line in stdout.split('\n')[:3]:  # 只显示nvidia-smi输出的前几行
-                        if line.strip():
-                            print(f"  {line.strip()}")
+                records, error = nvsmi_query.query_gpus()
+                if records:
+                    print(f"\n  NVIDIA驱动已安装 (版本 {records[0].driver_version})，但可能与PyTorch的CUDA版本不兼容")
+                    for record in records:
+                        print(f"  {nvsmi_query.format_record(record)}")
                 else:
                     print(f"\n  未检测到NVIDIA驱动或无法运行nvidia-smi")
             else:
                 print(f"\n✓ PyTorch纯CPU版本")
                 print(f"  - 不包含CUDA功能")
             
-            # 测试CPU版本性能
+            # 测试CPU版本性能 (含预热，排除线程池启动开销)
             print("\n正在测试CPU计算能力...")
             try:
-                x = torch.rand(1000, 1000)
-                y = torch.rand(1000, 1000)
-                
-                start_time = datetime.now()
-                z = torch.matmul(x, y)
-                end_time = datetime.now()
-                
-                elapsed = (end_time - start_time).total_seconds() * 1000  # 毫秒
-                print(f"  - 1000x1000矩阵乘法用时: {elapsed:.2f} ms")
+                results = compute_benchmark.run_suite('cpu', sizes=(256, 1024), max_time=1.0)
+                info['benchmark'] = results
+                compute_benchmark.print_results(results)
                 print(f"  ✓ CPU计算测试通过")
+                save_benchmark_history(results, torch)
+                print(f"  (可使用 --cpu-tuning 测试不同线程数并获取推荐值)")
             except Exception as e:
                 print(f"  ✗ CPU计算测试失败: {e}")
     
@@ -136,36 +176,85 @@ def check_pytorch():
         print("\n✗ PyTorch未安装")
         print("  请使用以下命令安装PyTorch:")
         print("  - CPU版本: pip install torch torchvision torchaudio")
-        print("  - GPU版本: pip install torch torchvision torchaudio --index-url https://download.pytorch.org/whl/cu118")
-        print("  (根据您需要的CUDA版本选择合适的命令，上面示例为CUDA 11.8)")
+        print("  - GPU版本: 见下方推荐中按驱动和GPU计算能力选择的安装命令")
     
     except Exception as e:
+        info['error'] = str(e)
         print(f"\n✗ 检查PyTorch时出错: {e}")
 
+    return info
+
+@probe_trace.traced()
+def check_gpu_memory():
+    """打印各GPU当前的可用显存和计算进程；显存随时变化，因此不放入检测结果缓存
+
+    torch 已在本进程中导入时用 mem_get_info 读取，否则只运行 nvidia-smi，避免为此导入torch。
+    """
+    torch = sys.modules.get('torch')
+    if torch is not None and not getattr(torch.cuda, 'is_initialized', lambda: False)():
+        torch = None
+    memory = gpu_memory.snapshot(torch)
+    print("\nGPU显存 (实时):")
+    for gpu in memory['gpus']:
+        title = f"GPU {gpu['index']}" if gpu['index'] is not None else f"cuda:{gpu['torch']['cuda_index']}"
+        if gpu['free_mib'] is None:
+            print(f"  - {title}: 无法获取内存信息")
+            continue
+        print(f"  - {title}: 总显存 {gpu['total_mib'] / 1024:.2f} GB，可用 {gpu['free_mib'] / 1024:.2f} GB "
+              f"(计算进程 {len(gpu['processes'])} 个，来源 {gpu['source']})")
+        if gpu['torch'] and gpu['torch']['reserved_mib']:
+            print(f"    本进程缓存: 已保留 {gpu['torch']['reserved_mib']:.0f} MiB，"
+                  f"碎片率 {gpu['torch']['fragmentation']:.0%}")
+    for error in memory['errors']:
+        print(f"  ✗ {error}")
+    return {'gpus': [{key: gpu[key] for key in ('index', 'uuid', 'total_mib', 'free_mib', 'source')}
+                     for gpu in memory['gpus']],
+            'containers': memory['containers']}
+
+@probe_trace.traced()
 def check_cuda_toolkit():
-    """检查CUDA工具包是否安装"""
+    """检查CUDA工具包是否安装，返回驱动版本和CUDA版本"""
     print("\n正在检测CUDA工具包...")
+    result = {'driver': None, 'cuda': None, 'toolkits': []}
     
-    # 检查NVIDIA驱动
-    returncode, stdout, stderr = run_cmd('nvidia-smi')
-    if returncode == 0:
-        print("✓ NVIDIA驱动已安装")
-        # 提取显卡和CUDA版本信息
-        for i, line in enumerate(stdout.split('\n')):
-            if i < 3 and line.strip():  # 只显示前三行
-                print(f"  {line.strip()}")
+    # 检查NVIDIA驱动 (优先读取procfs/sysfs，无需启动nvidia-smi)
+    info = gpu_discovery.discover()
+    if info['driver'] and info['gpus']:
+        result['driver'] = info['driver']['version']
+        print(f"✓ NVIDIA驱动已安装 (版本 {info['driver']['version']})")
+        for i, gpu in enumerate(info['gpus']):
+            print(f"  GPU {i}: {gpu.get('name', '未知型号')} ({gpu['bus']}, {gpu.get('uuid', '')})")
     else:
-        print("✗ 未检测到NVIDIA驱动")
+        records, error = nvsmi_query.query_gpus()
+        if records:
+            result['driver'] = records[0].driver_version
+            print(f"✓ NVIDIA驱动已安装 (版本 {records[0].driver_version})")
+            for record in records:
+                print(f"  {nvsmi_query.format_record(record)}")
+        else:
+            print(f"✗ 未检测到NVIDIA驱动{f' ({error})' if error else ''}")
     
-    # 检查CUDA版本
-    if platform.system() == "Windows":
-        import os
+    # 检查CUDA版本 (优先读取各工具包的版本文件，无需运行nvcc)
+    toolkits = [t for t in cuda_inventory.inventory() if t['version']]
+    if toolkits:
+        active = [t for t in toolkits if t['active']]
+        result['cuda'] = (active or toolkits)[-1]['version']
+        result['toolkits'] = [{'path': t['path'], 'version': t['version'], 'active': t['active']}
+                              for t in toolkits]
+        print(f"\n✓ 发现 {len(toolkits)} 个CUDA工具包:")
+        for toolkit in toolkits:
+            for line in cuda_inventory.format_toolkit(toolkit):
+                print(f"  {line}")
+        if not any(t['active'] for t in toolkits):
+            print("✗ 这些工具包均未加入PATH、LD_LIBRARY_PATH或CUDA_HOME")
+    elif platform.system() == "Windows":
         cuda_path = os.environ.get('CUDA_PATH')
         if cuda_path:
             print(f"\n✓ 发现CUDA环境变量: {cuda_path}")
             nvcc_path = os.path.join(cuda_path, 'bin', 'nvcc.exe')
             if os.path.exists(nvcc_path):
-                returncode, stdout, stderr = run_cmd(f'"{nvcc_path}" --version')
+                returncode, stdout, stderr = cached_cmd(f'"{nvcc_path}" --version')
+                result['cuda'] = _nvcc_release(stdout)
                 print(f"✓ CUDA工具包已安装:")
                 print(f"  {stdout.strip()}")
             else:
@@ -174,48 +263,279 @@ def check_cuda_toolkit():
             print(f"\n✗ 未设置CUDA_PATH环境变量")
     else:
         # Linux/Mac
-        returncode, stdout, stderr = run_cmd('nvcc --version')
+        returncode, stdout, stderr = cached_cmd('nvcc --version')
         if returncode == 0:
+            result['cuda'] = _nvcc_release(stdout)
             print(f"\n✓ CUDA工具包已安装:")
             print(f"  {stdout.strip()}")
         else:
             print(f"\n✗ 未找到CUDA工具包或nvcc命令")
+    return result
 
-def print_recommendations(cuda_available):
-    """打印建议"""
+def _nvcc_release(text):
+    """从 nvcc --version 的输出中取出 "release 12.1" 中的版本号"""
+    match = re.search(r'release\s+([\d.]+)', text)
+    return match.group(1) if match else None
+
+def diagnose_compatibility(driver, build, info):
+    """用离线兼容性索引诊断驱动、PyTorch构建与GPU是否匹配"""
+    version = build.get('version') or info.get('version')
+    cuda = build.get('cuda') if build.get('installed') else info.get('cuda')
+    capabilities = [tuple(d['capability']) for d in info.get('devices', ())]
+    if not capabilities and driver:
+        capabilities = nvsmi_query.query_compute_caps()
+    return compat_index.diagnose(driver, version, cuda, capabilities, info.get('arch_list'))
+
+def print_recommendations(cuda_available, diagnosis=None):
+    """打印建议；diagnosis 为 compat_index.diagnose 的结果"""
+    if diagnosis and diagnosis['problems']:
+        print(f"\n兼容性诊断 (离线索引 {diagnosis['index_version']}):")
+        for problem in diagnosis['problems']:
+            print(f"  ✗ {problem}")
+        if diagnosis['max_cuda']:
+            print(f"  - 当前驱动最高支持 CUDA {diagnosis['max_cuda']}")
     if cuda_available:
         print("\n推荐:")
         print("1. 您的PyTorch已支持GPU加速，可以开始使用")
         print("2. 确保您的深度学习模型使用 .cuda() 或 device='cuda' 以启用GPU加速")
         print("3. 对于大模型，可使用torch.cuda.amp进行混合精度训练提高性能")
+    elif diagnosis and diagnosis['command']:
+        print("\n推荐:")
+        torch_version, tag = diagnosis['recommended']
+        print(f"1. 安装与当前驱动和GPU匹配的PyTorch {torch_version} ({tag}) 版本:")
+        print(f"   {diagnosis['command']}")
+        print("2. 安装后重新运行本工具确认 CUDA 可用")
     else:
         print("\n推荐:")
         print("1. 如果您有NVIDIA显卡，建议安装支持CUDA的PyTorch版本以加速")
         print("2. 访问 https://pytorch.org/get-started/locally/ 选择适合您系统的安装命令")
         print("3. 确保您安装了与PyTorch兼容的NVIDIA驱动和CUDA版本")
 
-def main():
-    """主函数"""
-    print_section("PyTorch GPU/CPU 版本检测工具")
-    
-    check_python_environment()
-    check_cuda_toolkit()
-    
-    # 检查PyTorch
-    pytorch_cuda_available = False
+def check_mirrors(diagnosis):
+    """测量各下载源并给出最快的安装命令；有推荐构建时测量推荐的构建"""
+    if diagnosis and diagnosis['recommended']:
+        release, tag = diagnosis['recommended']
+    else:
+        release, tag = mirror_rank.default_target()
+    print(f"\n正在测量 torch {release} ({tag}) 各下载源的速度...")
+    mirrors = [mirror_rank.Mirror(*m) for m in mirror_rank.DEFAULT_MIRRORS]
+    results = mirror_rank.rank(mirrors, tag, release)
+    mirror_rank.print_ranking(results)
+    best = next((r for r in results if r['ok']), None)
+    if best is None:
+        print("✗ 没有可用的下载源")
+        return None
+    mirror = next(m for m in mirrors if m.name == best['name'])
+    command = mirror_rank.install_command(best, mirror, tag, release, bool(diagnosis and diagnosis['replace']))
+    print(f"✓ 最快的下载源: {best['name']}")
+    print(f"  {command}")
+    return {'torch': release, 'tag': tag, 'best': best['name'], 'command': command, 'results': results}
+
+def check_cpu_tuning():
+    """运行CPU线程诊断，返回推荐的线程数"""
     try:
-        import torch
-        pytorch_cuda_available = torch.cuda.is_available()
-        check_pytorch()
+        return {'recommended_threads': cpu_tuning.run_report()}
     except ImportError:
-        print("\n✗ PyTorch未安装")
+        print("\n✗ PyTorch未安装，无法进行CPU线程诊断")
     except Exception as e:
-        print(f"\n✗ 检查PyTorch时出错: {e}")
+        print(f"\n✗ CPU线程诊断失败: {e}")
+    return None
+
+def check_transfer(cuda_available):
+    """测量CUDA初始化延迟和主机与设备间的数据传输带宽 (无可用GPU时测量CPU的复制带宽)"""
+    device = 'cuda' if cuda_available else 'cpu'
+    print(f"\n正在测试数据传输 ({device})...")
+    try:
+        report = transfer_benchmark.run_suite(device, sizes=(64 << 10, 16 << 20), max_time=0.5)
+    except Exception as e:
+        print(f"  ✗ 数据传输测试失败: {e}")
+        return None
+    transfer_benchmark.print_results(report)
+    return report
+
+def check_import_time(modules):
+    """分析 import torch 耗时，返回总耗时、原生扩展耗时和最慢的模块"""
+    print("\n正在分析 import torch 耗时...")
+    try:
+        report = import_profiler.profile(['torch'] + list(modules))
+    except Exception as e:
+        print(f"✗ 分析导入耗时失败: {e}")
+        return None
+    import_profiler.print_report(report, 10)
+    return {
+        'total_ms': report['total_us'] / 1000,
+        'native_ms': report['native_us'] / 1000,
+        'slowest': [{'module': name, 'cumulative_ms': e['cumulative_us'] / 1000, 'self_ms': e['self_us'] / 1000}
+                    for name, e in import_profiler.top(report, 'self_us', 10)],
+    }
+
+def watch_mode(args):
+    """持续监视检测项的输入，变化时只重新运行受影响的检测项并输出差异"""
+    def pytorch(results):
+        # torch 无法在本进程中重新导入，每次都在新进程中检测
+        return probe_watch.run_isolated('pytorch_version_check', 'check_pytorch')
+
+    def compatibility(results):
+        build = results.get('pytorch_build') or {'installed': False}
+        info = results.get('pytorch') or {}
+        diagnosis = diagnose_compatibility((results.get('cuda_toolkit') or {}).get('driver'), build, info)
+        cuda_available = info.get('cuda_available') if 'pytorch' in results else bool(build.get('cuda'))
+        print_recommendations(cuda_available, diagnosis)
+        return diagnosis
+
+    probes = [
+        probe_watch.WatchedProbe('cuda_toolkit', lambda results: check_cuda_toolkit(),
+                                 inputs=('nvidia_smi', 'nvcc', 'driver', 'toolkits')),
+        probe_watch.WatchedProbe('pytorch_build', lambda results: check_pytorch_build(), inputs=('torch_dist',)),
+    ]
+    if not args.build_only:
+        probes.append(probe_watch.WatchedProbe('pytorch', pytorch, inputs=('torch_dist', 'driver')))
+    probes.append(probe_watch.WatchedProbe('compatibility', compatibility,
+                                           after=('cuda_toolkit', 'pytorch_build', 'pytorch')))
+    print_section("PyTorch GPU/CPU 版本检测工具 (监视模式)")
+    probe_watch.watch(probes, probe_watch.default_inputs(), interval=args.watch_interval, polling=args.poll)
+    return 0
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="PyTorch GPU/CPU 版本检测工具")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不读取也不写入检测结果缓存")
+    parser.add_argument("--refresh", action="store_true",
+                        help="忽略已有缓存，重新检测并更新缓存")
+    parser.add_argument("--cache-ttl", type=float, default=probe_cache.DEFAULT_TTL,
+                        help=f"缓存有效期 (秒)，默认 {probe_cache.DEFAULT_TTL}")
+    parser.add_argument("--build-only", action="store_true",
+                        help="只读取PyTorch构建信息，不导入torch也不进行CUDA运行测试")
+    parser.add_argument("--scan-envs", action="store_true",
+                        help="扫描本机所有conda/venv/pyenv环境中的PyTorch及其与驱动的兼容性")
+    parser.add_argument("--cpu-tuning", action="store_true",
+                        help="诊断CPU线程配置并测试不同线程数，推荐 OMP_NUM_THREADS")
+    parser.add_argument("--import-profile", nargs="*", metavar="MODULE",
+                        help="在新进程中分析 import torch (及附加模块) 的耗时，列出最慢的子模块和原生扩展")
+    parser.add_argument("--transfer", action="store_true",
+                        help="测量CUDA初始化与首次内核延迟、H2D/D2H/D2D带宽 (锁页与可分页内存) 及复制与计算的重叠")
+    parser.add_argument("--rank-mirrors", action="store_true",
+                        help="并发测量PyTorch官方源和国内镜像的延迟与速度，给出最快的安装命令")
+    parser.add_argument("--profile", action="store_true",
+                        help="记录各检测步骤耗时并输出排序后的明细")
+    parser.add_argument("--trace-file", metavar="PATH",
+                        help="把耗时记录写为 Chrome trace-event JSON (可用 Perfetto 打开)")
+    parser.add_argument("--stats", action="store_true",
+                        help="输出进程内探测结果复用的统计 (节省的外部命令和模块导入次数)")
+    parser.add_argument("--format", choices=probe_report.FORMATS, default="text",
+                        help="输出格式: text 为文字报告，ndjson 为每项检测完成即输出一行JSON，json 为单个JSON文档")
+    parser.add_argument("--watch", action="store_true",
+                        help="持续监视驱动、工具包、torch 安装等输入，变化时只重新运行受影响的检测并输出差异")
+    parser.add_argument("--poll", action="store_true",
+                        help="监视模式下使用轮询而非 inotify")
+    parser.add_argument("--watch-interval", type=float, default=2.0,
+                        help="监视模式下的轮询间隔 (秒)，默认 2；使用 inotify 时也按此间隔检查驱动版本")
+    return parser.parse_args(argv)
+
+def run(args):
+    """按已解析的命令行参数运行检测，返回退出码 (0 全部通过，1 有检测项未通过，2 有检测项出错)"""
+    if args.watch:
+        return watch_mode(args)
+    if args.profile or args.trace_file:
+        probe_trace.enable()
+    cache_options = dict(use_cache=not args.no_cache, refresh=args.refresh, ttl=args.cache_ttl)
+    reporter = probe_report.Reporter('pytorch_version_check', args.format)
+    text = not reporter.structured
+
+    if text:
+        print_section("PyTorch GPU/CPU 版本检测工具")
     
-    print_recommendations(pytorch_cuda_available)
+    reporter.run('python', check_python_environment)
+    if args.scan_envs:
+        if text:
+            print("\n正在扫描本机Python环境...")
+        reporter.run('env_scan', env_scan.report)
+    toolkit = reporter.run('cuda_toolkit',
+                           lambda: probe_cache.run_cached('cuda_toolkit', check_cuda_toolkit, **cache_options),
+                           check=lambda r: r['driver'] or r['cuda'])
     
+    # 先读取构建信息 (无需导入torch)，只有需要运行测试时才导入torch
+    build = reporter.run('pytorch_build', check_pytorch_build, check=lambda r: r['installed'])
+    build = build or {'installed': False}
+    info = {}
+    if args.build_only and build['installed']:
+        pytorch_cuda_available = bool(build['cuda'])
+    else:
+        # check_pytorch 自行处理未安装和出错的情况
+        info = reporter.run('pytorch',
+                            lambda: probe_cache.run_cached('pytorch', check_pytorch, **cache_options),
+                            check=lambda r: r['installed'] and 'error' not in r)
+        info = info or {}
+        pytorch_cuda_available = bool(info.get('cuda_available'))
+        if pytorch_cuda_available:
+            reporter.run('gpu_memory', check_gpu_memory)
+
+    diagnosis = reporter.run('compatibility',
+                             lambda: diagnose_compatibility((toolkit or {}).get('driver'), build, info),
+                             check=lambda d: d['ok'])
+
+    if args.cpu_tuning:
+        reporter.run('cpu_tuning', check_cpu_tuning)
+    if args.transfer:
+        if build['installed']:
+            reporter.run('transfer', lambda: check_transfer(pytorch_cuda_available))
+        elif text:
+            print("\n✗ PyTorch未安装，无法测试数据传输")
+        else:
+            reporter.skip('transfer', "PyTorch未安装")
+    if args.rank_mirrors and not text:
+        reporter.run('mirrors', lambda: check_mirrors(diagnosis))
+
+    if args.import_profile is not None:
+        if build['installed']:
+            reporter.run('import_time', lambda: check_import_time(args.import_profile))
+        elif text:
+            print("\n✗ PyTorch未安装，无法分析导入耗时")
+        else:
+            reporter.skip('import_time', "PyTorch未安装")
+    if args.trace_file:
+        probe_trace.write_chrome_trace(args.trace_file)
+
+    if not text:
+        summary = {
+            'driver': (toolkit or {}).get('driver'),
+            'cuda': (toolkit or {}).get('cuda'),
+            'torch': build.get('version') or info.get('version'),
+            'torch_cuda': build.get('cuda') or info.get('cuda'),
+            'cuda_available': pytorch_cuda_available,
+        }
+        if args.stats:
+            summary['memo'] = probe_memo.stats()
+        if args.profile:
+            summary['profile'] = probe_trace.summary()
+        return reporter.finish(summary)
+    
+    print_recommendations(pytorch_cuda_available, diagnosis)
+    if args.rank_mirrors:
+        reporter.run('mirrors', lambda: check_mirrors(diagnosis))
+    
+    if args.stats:
+        print(f"\n{probe_memo.format_stats()}")
+    if args.profile:
+        print("\n耗时明细:")
+        for line in probe_trace.format_summary():
+            print(f"  {line}")
+    if args.trace_file:
+        print(f"\n已写出 trace 文件: {args.trace_file}")
+
     print_section("检测完成")
+    return reporter.finish()
+
+
+def main(argv=None):
+    """主函数，返回退出码"""
+    return run(parse_args(argv))
 
 if __name__ == "__main__":
-    main()
-    input("\n按回车键退出...") 
\ No newline at end of file
+    args = parse_args()
+    code = run(args)
+    # 仅在交互式终端中等待按键，避免被脚本或采集程序调用时阻塞
+    if sys.stdin.isatty() and sys.stdout.isatty() and args.format == 'text' and not args.watch:
+        input("\n按回车键退出...")
+    sys.exit(code)
@@ -0,0 +1,99 @@
+import math
+
+
+def percentile(sorted_values, q):
+    """已排序序列的百分位数 (线性插值)，q 取值 0~100"""
+    if not sorted_values:
+        return None
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lower = math.floor(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    frac = pos - lower
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * frac
+
+
+def summarize(values):
+    """返回 min/avg/p95，忽略 None"""
+    data = sorted(v for v in values if v is not None)
+    if not data:
+        return {'min': None, 'avg': None, 'p95': None}
+    return {
+        'min': data[0],
+        'avg': sum(data) / len(data),
+        'p95': percentile(data, 95),
+    }
+
+
+def mean_ci(values, z=1.96):
+    """均值及其置信区间半宽 (默认95%，正态近似)"""
+    n = len(values)
+    if n == 0:
+        return None, None
+    mean = sum(values) / n
+    if n < 2:
+        return mean, math.inf
+    var = sum((v - mean) ** 2 for v in values) / (n - 1)
+    return mean, z * math.sqrt(var / n)
+
+
+def _betacf(a, b, x, iterations=200, eps=3e-14):
+    """不完全Beta函数的连分式展开 (修正 Lentz 算法)"""
+    tiny = 1e-300
+    qab, qap, qam = a + b, a + 1.0, a - 1.0
+    c, d = 1.0, 1.0 - qab * x / qap
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, iterations + 1):
+        m2 = 2 * m
+        for aa in (m * (b - m) * x / ((qam + m2) * (a + m2)),
+                   -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))):
+            d = 1.0 + aa * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + aa / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1.0) < eps:
+            break
+    return h
+
+
+def betainc(a, b, x):
+    """正则化不完全Beta函数 I_x(a, b)"""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                     + a * math.log(x) + b * math.log1p(-x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1.0 - x) / b
+
+
+def t_sf2(t, df):
+    """t 分布的双侧尾概率 P(|T| >= |t|)"""
+    if math.isinf(t):
+        return 0.0
+    return betainc(df / 2.0, 0.5, df / (df + t * t))
+
+
+def welch_t(a, b):
+    """Welch t 检验 (不假设方差相等)，返回 (t, 自由度, 双侧p值)
+
+    两组都至少需要2个样本；两组方差都为0时 t 取 0 或 ±inf。
+    """
+    na, nb = len(a), len(b)
+    if na < 2 or nb < 2:
+        raise ValueError("Welch t 检验每组至少需要2个样本")
+    ma, mb = sum(a) / na, sum(b) / nb
+    va = sum((x - ma) ** 2 for x in a) / (na - 1)
+    vb = sum((x - mb) ** 2 for x in b) / (nb - 1)
+    se2 = va / na + vb / nb
+    if se2 == 0:
+        t = 0.0 if ma == mb else math.copysign(math.inf, ma - mb)
+        return t, float(na + nb - 2), 1.0 if t == 0 else 0.0
+    t = (ma - mb) / math.sqrt(se2)
+    df = se2 ** 2 / ((va / na) ** 2 / (na - 1) + (vb / nb) ** 2 / (nb - 1))
+    return t, df, t_sf2(t, df)
@@ -0,0 +1,129 @@
+import os
+import re
+import ast
+import sys
+from importlib import metadata
+
+import probe_trace
+
+# 需要在 RECORD 中查找的CUDA运行库 (Linux .so 与 Windows .dll 两种命名)；
+# download.pytorch.org 的 wheel 经 auditwheel 处理，随附的库名带有哈希，如 libcudart-9335f6a2.so.12
+LIBRARY_PATTERNS = {
+    'cudart': re.compile(r'^(?:lib)?cudart(?:64_(\d+))?(?:(?:-[0-9a-f]+)?\.so\.?([\d.]*)|\.dll)$'),
+    'cudnn': re.compile(r'^(?:lib)?cudnn(?:64_(\d+))?(?:(?:-[0-9a-f]+)?\.so\.?([\d.]*)|\.dll)$'),
+    'cublas': re.compile(r'^(?:lib)?cublas(?:64_(\d+))?(?:(?:-[0-9a-f]+)?\.so\.?([\d.]*)|\.dll)$'),
+    'nccl': re.compile(r'^libnccl()(?:-[0-9a-f]+)?\.so\.?([\d.]*)$'),
+}
+
+# torch/version.py 中需要读取的变量
+_VERSION_FIELDS = ('__version__', 'cuda', 'hip', 'git_version', 'debug')
+
+
+def find_distribution(name='torch', path=None):
+    """查找已安装的发行包元数据，path 为 None 时使用当前解释器的 sys.path"""
+    for dist in metadata.distributions(name=name, path=path if path is not None else sys.path):
+        return dist
+    return None
+
+
+def parse_version_py(text):
+    """不执行代码，从 torch/version.py 的文本中读取常量赋值"""
+    values = {}
+    try:
+        tree = ast.parse(text)
+    except SyntaxError:
+        return values
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1:
+            target, value = node.targets[0], node.value
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            target, value = node.target, node.value
+        else:
+            continue
+        if isinstance(target, ast.Name) and target.id in _VERSION_FIELDS:
+            try:
+                values[target.id] = ast.literal_eval(value)
+            except ValueError:
+                pass
+    return values
+
+
+def read_version_py(dist):
+    """读取发行包中的 torch/version.py，找不到时返回空字典"""
+    try:
+        path = dist.locate_file(os.path.join('torch', 'version.py'))
+        with open(path, encoding='utf-8') as f:
+            return parse_version_py(f.read())
+    except OSError:
+        return {}
+
+
+def find_libraries(dists):
+    """在各发行包的 RECORD 中查找CUDA运行库，返回 {库名: [(文件, 主版本号)]}"""
+    found = {}
+    for dist in dists:
+        for file in dist.files or ():
+            filename = file.name
+            for lib, pattern in LIBRARY_PATTERNS.items():
+                match = pattern.match(filename)
+                if match:
+                    version = match.group(1) or match.group(2) or None
+                    found.setdefault(lib, []).append((str(file), version))
+    return found
+
+
+def variant_of(version, cuda=None, hip=None):
+    """由版本号的本地标签或CUDA版本得到构建变体，如 cu121、cpu、rocm5.7"""
+    if version and '+' in version:
+        return version.split('+', 1)[1]
+    if cuda:
+        return 'cu' + cuda.replace('.', '')
+    if hip:
+        return 'rocm' + '.'.join(hip.split('.')[:2])
+    return 'cpu'
+
+
+@probe_trace.traced(category='probe')
+def build_info(path=None):
+    """不导入 torch，读取其构建信息
+
+    返回字典；torch 未安装时返回 {'installed': False}。
+    """
+    dist = find_distribution('torch', path)
+    if dist is None:
+        return {'installed': False}
+
+    version_py = read_version_py(dist)
+    version = dist.version
+    cuda = version_py.get('cuda')
+    hip = version_py.get('hip')
+
+    # PyPI 上的 Linux 版 torch 通过其依赖的 nvidia-* 包提供CUDA运行库
+    nvidia = {}
+    for requirement in dist.requires or ():
+        name = re.split(r'[\s;<>=!~\[(]', requirement, maxsplit=1)[0].lower()
+        if name.startswith('nvidia-') and name not in nvidia:
+            other = find_distribution(name, path)
+            if other is not None:
+                nvidia[name] = other
+    libraries = find_libraries([dist] + list(nvidia.values()))
+
+    cudnn = None
+    for name, other in nvidia.items():
+        if name.startswith('nvidia-cudnn'):
+            cudnn = other.version
+    if cudnn is None and libraries.get('cudnn'):
+        cudnn = libraries['cudnn'][0][1]
+
+    return {
+        'installed': True,
+        'version': version,
+        'variant': variant_of(version, cuda, hip),
+        'cuda': cuda,
+        'hip': hip,
+        'cudnn': cudnn,
+        'git_version': version_py.get('git_version'),
+        'location': str(dist.locate_file('')),
+        'libraries': {lib: [f for f, _ in files] for lib, files in libraries.items()},
+        'nvidia_packages': {name: other.version for name, other in sorted(nvidia.items())},
+    }
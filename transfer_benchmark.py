@@ -0,0 +1,356 @@
+import sys
+import json
+import time
+import argparse
+import contextlib
+import subprocess
+
+import probe_trace
+from compute_benchmark import time_callable
+from stats_util import percentile, mean_ci
+
+# 传输大小 (字节)：小块主要反映每次复制的固定开销，大块反映链路带宽
+DEFAULT_SIZES = (64 << 10, 1 << 20, 16 << 20, 64 << 20)
+_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+_INCREMENT = bytes((i + 1) & 0xFF for i in range(256))
+
+
+class TorchBackend:
+    """通过 torch 在 CPU 或 CUDA 设备上分配缓冲区、复制数据和启动内核"""
+
+    def __init__(self, torch, device):
+        self.torch = torch
+        self.device = torch.device(device)
+        self.name = str(self.device)
+        self.device_memory = self.device.type != 'cpu'
+
+    @property
+    def can_pin(self):
+        # 锁页内存由CUDA运行库分配，纯CPU版torch或没有GPU时不可用
+        return self.torch.cuda.is_available()
+
+    def initialized(self):
+        return self.device.type == 'cuda' and self.torch.cuda.is_initialized()
+
+    def init(self):
+        if self.device.type == 'cuda':
+            self.torch.cuda.init()
+
+    def host(self, nbytes, pinned=False):
+        return self.torch.empty(nbytes, dtype=self.torch.uint8, pin_memory=pinned)
+
+    def device_buffer(self, nbytes):
+        return self.torch.empty(nbytes, dtype=self.torch.uint8, device=self.device)
+
+    def copy(self, dst, src, non_blocking=False):
+        dst.copy_(src, non_blocking=non_blocking)
+
+    def pin(self, buffer):
+        return buffer.pin_memory()
+
+    def kernel(self, buffer):
+        buffer.add_(1)
+
+    def synchronize(self):
+        if self.device.type == 'cuda':
+            self.torch.cuda.synchronize(self.device)
+
+    def stream(self):
+        return self.torch.cuda.Stream(self.device) if self.device.type == 'cuda' else None
+
+    def on_stream(self, stream):
+        return self.torch.cuda.stream(stream) if stream is not None else contextlib.nullcontext()
+
+
+class StubBackend:
+    """不依赖 torch 和GPU的模拟设备: 缓冲区为 bytearray，复制即 memcpy，没有真正的异步执行
+
+    用于在没有GPU的CI中测试整个基准流程；其结果只反映主机内存带宽，重叠率应接近 0。
+    """
+
+    name = 'stub'
+    device_memory = True
+    can_pin = True
+
+    def initialized(self):
+        return False
+
+    def init(self):
+        pass
+
+    def host(self, nbytes, pinned=False):
+        return bytearray(nbytes)
+
+    def device_buffer(self, nbytes):
+        return bytearray(nbytes)
+
+    def copy(self, dst, src, non_blocking=False):
+        memoryview(dst)[:] = src
+
+    def pin(self, buffer):
+        return bytearray(buffer)
+
+    def kernel(self, buffer):
+        memoryview(buffer)[:] = buffer.translate(_INCREMENT)
+
+    def synchronize(self):
+        pass
+
+    def stream(self):
+        return None
+
+    def on_stream(self, stream):
+        return contextlib.nullcontext()
+
+
+def make_backend(device):
+    """按设备名创建后端；stub 不导入 torch"""
+    if device == 'stub':
+        return StubBackend()
+    import torch
+    return TorchBackend(torch, device)
+
+
+def _summary(samples, nbytes=None, **fields):
+    ordered = sorted(samples)
+    median_ns = percentile(ordered, 50)
+    mean, half = mean_ci(samples)
+    fields.update(iterations=len(samples), median_ms=median_ns / 1e6, p95_ms=percentile(ordered, 95) / 1e6,
+                  ci_rel=half / mean if mean else None)
+    if nbytes is not None:
+        # 字节/纳秒 即 GB/s (十进制)
+        fields.update(bytes=nbytes, gbps=nbytes / median_ns if median_ns else None)
+    return fields
+
+
+def measure_startup(backend, **timing):
+    """分别测量CUDA上下文初始化、首次内核 (含显存分配和模块加载) 与稳定后单次内核的延迟
+
+    必须在本进程尚未使用该设备时调用，否则返回的 already_initialized 为 True，初始化耗时无意义。
+    """
+    result = {'device': backend.name, 'already_initialized': backend.initialized()}
+    t0 = time.perf_counter_ns()
+    with probe_trace.span('context init', 'cuda'):
+        backend.init()
+        backend.synchronize()
+    t1 = time.perf_counter_ns()
+    with probe_trace.span('first kernel', 'cuda'):
+        buffer = backend.device_buffer(1) if backend.device_memory else backend.host(1)
+        backend.kernel(buffer)
+        backend.synchronize()
+    t2 = time.perf_counter_ns()
+    timing = dict({'max_time': 0.5}, **timing)
+    samples = time_callable(lambda: backend.kernel(buffer), backend.synchronize, **timing)
+    result.update(init_ms=(t1 - t0) / 1e6, first_kernel_ms=(t2 - t1) / 1e6,
+                  kernel_ms=percentile(sorted(samples), 50) / 1e6)
+    return result
+
+
+def measure_startup_isolated(device, timeout=120):
+    """在新进程中测量 import torch、上下文初始化和首次内核的延迟 (本进程已初始化CUDA时使用)"""
+    cmd = [sys.executable, __file__, '--startup-only', '--device', device, '--json']
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout)
+    try:
+        return json.loads(result.stdout)
+    except ValueError:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(f"子进程退出码 {result.returncode}: {lines[-1] if lines else '无输出'}")
+
+
+def bench_copy(backend, src_kind, dst_kind, nbytes, pinned=False, op=None, **timing):
+    """测量一次 nbytes 字节复制的延迟和带宽；src_kind/dst_kind 为 host 或 device"""
+    def alloc(kind):
+        return backend.device_buffer(nbytes) if kind == 'device' else backend.host(nbytes, pinned)
+
+    src, dst = alloc(src_kind), alloc(dst_kind)
+    op = op or f"{src_kind[0]}2{dst_kind[0]}"
+    memory = 'device' if src_kind == dst_kind == 'device' else ('pinned' if pinned else 'pageable')
+    with probe_trace.span(f"{op} {memory} {nbytes}", 'benchmark'):
+        samples = time_callable(lambda: backend.copy(dst, src), backend.synchronize, **timing)
+    return _summary(samples, nbytes, op=op, device=backend.name, memory=memory)
+
+
+def bench_pin(backend, nbytes, **timing):
+    """测量把可分页张量复制到锁页内存 (pin_memory) 的开销
+
+    首次调用需向驱动注册新的锁页内存 (first_ms)；之后 torch 复用缓存的锁页块，只剩复制的开销。
+    """
+    src = backend.host(nbytes)
+    t0 = time.perf_counter_ns()
+    backend.pin(src)
+    backend.synchronize()
+    first_ns = time.perf_counter_ns() - t0
+    with probe_trace.span(f"pin_memory {nbytes}", 'benchmark'):
+        samples = time_callable(lambda: backend.pin(src), backend.synchronize, **timing)
+    return _summary(samples, nbytes, op='pin_memory', device=backend.name, memory='pageable',
+                    first_ms=first_ns / 1e6)
+
+
+def bench_overlap(backend, nbytes, pinned=True, **timing):
+    """测量 non_blocking 的主机到设备复制能否与计算重叠
+
+    复制在单独的流上以 non_blocking=True 提交，同时在默认流上运行耗时与复制相近的逐元素内核。
+    overlap 为节省的时间占二者中较短者的比例: 1 表示完全重叠，0 表示串行
+    (可分页内存需先经驱动的暂存缓冲区，通常无法重叠)。
+    """
+    host, target, work = backend.host(nbytes, pinned), backend.device_buffer(nbytes), backend.device_buffer(nbytes)
+    memory = 'pinned' if pinned else 'pageable'
+
+    def median_ms(fn):
+        return percentile(sorted(time_callable(fn, backend.synchronize, **timing)), 50) / 1e6
+
+    with probe_trace.span(f"overlap {memory} {nbytes}", 'benchmark'):
+        copy_ms = median_ms(lambda: backend.copy(target, host, non_blocking=True))
+        kernel_ms = median_ms(lambda: backend.kernel(work))
+        repeats = max(1, min(1000, round(copy_ms / kernel_ms))) if kernel_ms else 1
+
+        def compute():
+            for _ in range(repeats):
+                backend.kernel(work)
+
+        side = backend.stream()
+
+        def both():
+            with backend.on_stream(side):
+                backend.copy(target, host, non_blocking=True)
+            compute()
+
+        compute_ms = median_ms(compute)
+        both_ms = median_ms(both)
+    shorter = min(copy_ms, compute_ms)
+    overlap = (copy_ms + compute_ms - both_ms) / shorter if shorter else 0.0
+    return {'op': 'overlap', 'device': backend.name, 'bytes': nbytes, 'memory': memory,
+            'copy_ms': copy_ms, 'compute_ms': compute_ms, 'both_ms': both_ms,
+            'kernel_repeats': repeats, 'overlap': max(0.0, min(1.0, overlap))}
+
+
+def run_suite(device='cpu', sizes=DEFAULT_SIZES, overlap=True, startup=True, **timing):
+    """运行全部数据传输测试，返回 {'device', 'startup', 'copies', 'pin', 'overlap', 'skipped'}
+
+    CUDA 设备测试 H2D/D2H (可分页与锁页)、D2D 带宽和复制与计算的重叠；CPU 设备测试 memcpy 与
+    tensor.copy_ 的带宽；锁页内存可用时测试 pin_memory 的开销。stub 设备不需要 torch 和GPU。
+    """
+    backend = make_backend(device)
+    report = {'device': backend.name, 'startup': None, 'copies': [], 'pin': [], 'overlap': [], 'skipped': []}
+    if startup:
+        if backend.initialized():
+            report['startup'] = measure_startup_isolated(device)
+        else:
+            report['startup'] = measure_startup(backend)
+
+    copies = report['copies']
+    pinned_modes = (False, True) if backend.can_pin else (False,)
+    if not backend.can_pin:
+        report['skipped'].append("锁页内存 (当前torch不支持CUDA，无法分配)")
+    if backend.device_memory:
+        for src_kind, dst_kind in (('host', 'device'), ('device', 'host')):
+            for pinned in pinned_modes:
+                for size in sizes:
+                    copies.append(bench_copy(backend, src_kind, dst_kind, size, pinned, **timing))
+        for size in sizes:
+            copies.append(bench_copy(backend, 'device', 'device', size, **timing))
+    else:
+        for size in sizes:
+            copies.append(bench_copy(StubBackend(), 'host', 'host', size, op='memcpy', **timing))
+            copies.append(bench_copy(backend, 'host', 'host', size, op='copy_', **timing))
+
+    if backend.can_pin:
+        for size in sizes:
+            report['pin'].append(bench_pin(backend, size, **timing))
+    if overlap and backend.device_memory:
+        for pinned in pinned_modes:
+            report['overlap'].append(bench_overlap(backend, max(sizes), pinned, **timing))
+    elif overlap:
+        report['skipped'].append("复制与计算的重叠 (需要CUDA设备)")
+    return report
+
+
+def format_size(nbytes):
+    for unit in ('B', 'KiB', 'MiB'):
+        if nbytes < 1024 or unit == 'MiB' and nbytes < 1 << 30:
+            return f"{nbytes:g} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:g} GiB"
+
+
+def parse_size(text):
+    """解析 64K、16M、1G 或字节数"""
+    text = text.strip().upper().rstrip('B').rstrip('I')
+    unit = text[-1:] if text[-1:] in _UNITS else ''
+    return int(float(text[:len(text) - len(unit)]) * _UNITS[unit])
+
+
+def print_results(report, indent="  "):
+    """以表格形式打印传输测试结果"""
+    startup = report['startup']
+    if startup:
+        note = " (本进程已初始化，数值无意义)" if startup.get('already_initialized') else ""
+        imported = f"import torch {startup['import_ms']:.1f} ms，" if startup.get('import_ms') is not None else ""
+        print(f"{indent}启动延迟{note}: {imported}上下文初始化 {startup['init_ms']:.1f} ms，"
+              f"首次内核 {startup['first_kernel_ms']:.2f} ms，稳定后单次内核 {startup['kernel_ms'] * 1000:.1f} us")
+    if report['copies'] or report['pin']:
+        # 中文表头每个字符占两列宽度，对齐时相应减少填充
+        print(f"{indent}{'操作':<10}{'内存':<8}{'大小':>8}{'次数':>6}{'中位数(ms)':>9}{'p95(ms)':>10}{'±CI':>8}{'GB/s':>9}")
+    for r in report['copies'] + report['pin']:
+        ci = f"{r['ci_rel'] * 100:.1f}%" if r['ci_rel'] is not None else "N/A"
+        gbps = f"{r['gbps']:.2f}" if r['gbps'] is not None else "N/A"
+        print(f"{indent}{r['op']:<12}{r['memory']:<10}{format_size(r['bytes']):>10}{r['iterations']:>8}"
+              f"{r['median_ms']:>12.3f}{r['p95_ms']:>10.3f}{ci:>8}{gbps:>9}")
+    for r in report['pin']:
+        print(f"{indent}pin_memory {format_size(r['bytes'])} 首次调用 (注册锁页内存) {r['first_ms']:.3f} ms")
+    for r in report['overlap']:
+        print(f"{indent}复制与计算重叠 ({r['memory']}, {format_size(r['bytes'])}): 复制 {r['copy_ms']:.3f} ms，"
+              f"计算 {r['compute_ms']:.3f} ms，同时进行 {r['both_ms']:.3f} ms，重叠率 {r['overlap']:.0%}")
+    for item in report['skipped']:
+        print(f"{indent}- 跳过: {item}")
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="数据传输基准测试 - CUDA初始化与首次内核延迟、H2D/D2H/D2D带宽 (锁页与可分页内存) 及复制与计算的重叠")
+    parser.add_argument("--device", default="cpu",
+                        help="测试设备，如 cpu、cuda、cuda:1；stub 为不需要torch和GPU的模拟设备，默认 cpu")
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=list(DEFAULT_SIZES),
+                        help="传输大小列表，可带 K/M/G 后缀，默认 64K 1M 16M 64M")
+    parser.add_argument("--no-overlap", action="store_true", help="不测试复制与计算的重叠")
+    parser.add_argument("--startup-only", action="store_true", help="只测量 import torch、上下文初始化和首次内核延迟")
+    parser.add_argument("--warmup", type=int, default=3, help="预热次数，默认 3")
+    parser.add_argument("--max-time", type=float, default=1.0,
+                        help="每个用例的最长计时时间 (秒)，默认 1")
+    parser.add_argument("--target-ci", type=float, default=0.02,
+                        help="95%%置信区间相对半宽的目标值，默认 0.02")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    timing = dict(warmup=args.warmup, max_time=args.max_time, target_ci=args.target_ci)
+    try:
+        if args.startup_only:
+            t0 = time.perf_counter_ns()
+            backend = make_backend(args.device)
+            import_ms = (time.perf_counter_ns() - t0) / 1e6 if args.device != 'stub' else None
+            report = dict(measure_startup(backend), import_ms=import_ms)
+        else:
+            report = run_suite(args.device, args.sizes, overlap=not args.no_overlap, **timing)
+    except ImportError:
+        print("✗ PyTorch未安装 (可使用 --device stub 测试流程)")
+        return 1
+    except Exception as e:
+        print(f"✗ 基准测试失败: {e}")
+        return 1
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    elif args.startup_only:
+        print_results({'startup': report, 'copies': [], 'pin': [], 'overlap': [], 'skipped': []})
+    else:
+        print(f"设备: {report['device']}")
+        print_results(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
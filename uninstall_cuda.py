@@ -2,13 +2,24 @@ import os
 import sys
 import subprocess
 import platform
-import shutil
-import winreg
 from pathlib import Path
 import ctypes
 
+import nvsmi_query
+import probe_memo
+import cuda_removal
+from probe_memo import run_cmd
+
+# 已安装程序的卸载信息 (64位和32位程序)，读取注册表远快于 wmic product 的逐个MSI包校验
+UNINSTALL_KEYS = (
+    r"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall",
+    r"SOFTWARE\WOW6432Node\Microsoft\Windows\CurrentVersion\Uninstall",
+)
+
 def is_admin():
-    """检查是否具有管理员权限"""
+    """检查是否具有管理员权限 (Linux 下检查是否为 root)"""
+    if platform.system() != "Windows":
+        return os.geteuid() == 0
     try:
         return ctypes.windll.shell32.IsUserAnAdmin()
     except:
@@ -27,19 +38,46 @@ def run_as_admin():
     subprocess.Popen(cmd, shell=True)
     sys.exit(0)  # 退出当前进程
 
-def run_cmd(cmd, shell=True):
-    """运行命令并返回结果"""
-    try:
-        process = subprocess.run(
-            cmd, 
-            shell=shell, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        return process.returncode, process.stdout, process.stderr
-    except Exception as e:
-        return -1, "", str(e)
+def installed_products(keywords=('CUDA',)):
+    """从注册表的卸载信息中查找名称含关键字的已安装程序
+
+    返回列表，每项含 name、version、product_code (MSI 安装的程序) 和 uninstall (卸载命令)。
+    """
+    import winreg
+
+    products = []
+    seen = set()
+    for key_path in UNINSTALL_KEYS:
+        try:
+            root = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, key_path)
+        except OSError:
+            continue
+        with root:
+            for index in range(winreg.QueryInfoKey(root)[0]):
+                try:
+                    name = winreg.EnumKey(root, index)
+                    with winreg.OpenKey(root, name) as key:
+                        values = {}
+                        for value_name in ('DisplayName', 'DisplayVersion', 'UninstallString',
+                                           'QuietUninstallString', 'WindowsInstaller'):
+                            try:
+                                values[value_name] = winreg.QueryValueEx(key, value_name)[0]
+                            except OSError:
+                                pass
+                except OSError:
+                    continue
+                display = values.get('DisplayName') or ''
+                if not any(word.lower() in display.lower() for word in keywords) or display in seen:
+                    continue
+                seen.add(display)
+                is_msi = values.get('WindowsInstaller') == 1 and name.startswith('{')
+                products.append({
+                    'name': display,
+                    'version': values.get('DisplayVersion'),
+                    'product_code': name if is_msi else None,
+                    'uninstall': values.get('QuietUninstallString') or values.get('UninstallString'),
+                })
+    return products
 
 def get_installed_cuda_versions():
     """获取已安装的CUDA版本列表"""
@@ -48,19 +86,16 @@ def get_installed_cuda_versions():
     # 检查控制面板中已安装的程序
     try:
         print("正在查找已安装的CUDA版本...")
-        # 方法1: 通过控制面板列表
-        cmd = 'wmic product where "name like \'%CUDA%\'" get name,version'
-        returncode, stdout, stderr = run_cmd(cmd)
-        
-        if returncode == 0 and stdout.strip():
+        # 方法1: 读取注册表中的已安装程序列表
+        products = installed_products()
+        if products:
             print("从控制面板中找到以下CUDA组件:")
-            print(stdout)
-            for line in stdout.strip().split('\n'):
-                if 'CUDA' in line:
-                    print(f"  - {line.strip()}")
-                    cuda_versions.append(line.strip())
+            for product in products:
+                line = f"{product['name']} {product['version'] or ''}".strip()
+                print(f"  - {line}")
+                cuda_versions.append(line)
         else:
-            print("无法通过wmic查询已安装的CUDA组件")
+            print("注册表中未找到已安装的CUDA组件")
             
         # 方法2: 检查CUDA目录
         potential_paths = [
@@ -92,22 +127,15 @@ def check_gpu_details():
     """检查GPU详细信息"""
     print("\n正在检测GPU信息...")
     
-    try:
-        result = subprocess.run(['nvidia-smi'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if result.returncode == 0:
-            print("✓ 成功检测到NVIDIA GPU:")
-            # 提取关键信息
-            lines = result.stdout.split('\n')
-            for i, line in enumerate(lines):
-                if i < 10:  # 只显示前10行
-                    print(f"  {line}")
-                else:
-                    print("  ...")
-                    break
-        else:
-            print("✗ 未检测到NVIDIA GPU或驱动未正确安装")
-    except FileNotFoundError:
-        print("✗ 未找到nvidia-smi命令，NVIDIA驱动可能未安装")
+    records, error = nvsmi_query.query_gpus()
+    if records:
+        print("✓ 成功检测到NVIDIA GPU:")
+        for record in records:
+            print(f"  驱动版本 {record.driver_version} | {nvsmi_query.format_record(record)}")
+    elif records is not None:
+        print("✗ 未检测到NVIDIA GPU或驱动未正确安装")
+    else:
+        print(f"✗ {error}")
     
     # 检查CUDA是否可用
     try:
@@ -117,7 +145,7 @@ def check_gpu_details():
                 print(f"\n✓ CUDA环境变量: {cuda_path}")
                 nvcc_path = os.path.join(cuda_path, 'bin', 'nvcc.exe')
                 if os.path.exists(nvcc_path):
-                    result = subprocess.run([nvcc_path, '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                    result = probe_memo.run([nvcc_path, '--version'])
                     print(f"✓ CUDA版本信息: {result.stdout.strip()}")
     except Exception as e:
         print(f"检查CUDA时出错: {e}")
@@ -125,7 +153,7 @@ def check_gpu_details():
     # 检查PyTorch是否安装及GPU是否可用
     try:
         print("\n正在检测PyTorch...")
-        import torch
+        torch = probe_memo.import_module('torch')
         print(f"✓ PyTorch已安装，版本: {torch.__version__}")
         
         # 检查CUDA是否对PyTorch可用
@@ -149,10 +177,30 @@ def check_gpu_details():
     except Exception as e:
         print(f"检查PyTorch时出错: {e}")
 
+def uninstall_product(product):
+    """卸载单个程序: MSI 程序用 msiexec 静默卸载，其余执行其注册的卸载命令，返回是否成功"""
+    if product['product_code']:
+        cmd = f'msiexec /x {product["product_code"]} /qn /norestart'
+    elif product['uninstall']:
+        cmd = product['uninstall']
+    else:
+        print(f"  {product['name']} 没有可用的卸载命令")
+        return False
+    print(f"执行命令: {cmd}")
+    returncode, stdout, stderr = run_cmd(cmd)
+    # 3010 表示卸载成功但需要重启
+    if returncode in (0, 3010):
+        print("  命令执行成功")
+        return True
+    print(f"  命令执行失败，错误信息: {stderr or returncode}")
+    return False
+
 def uninstall_cuda():
     """卸载CUDA相关组件"""
     if platform.system() != "Windows":
-        print("当前脚本仅支持Windows系统")
+        print("Linux下CUDA工具包一般通过目录安装，请使用 cuda_removal.py 查看删除计划:")
+        print("  python cuda_removal.py          # 仅显示计划")
+        print("  python cuda_removal.py --yes    # 执行删除 (正在使用的工具包会被保留)")
         return False
     
     print("\n" + "="*60)
@@ -204,34 +252,21 @@ def uninstall_cuda():
     
     print("\n开始卸载CUDA组件...\n")
     
-    # 1. 首先卸载通过控制面板安装的CUDA组件
-    uninstall_commands = [
-        'wmic product where "name like \'%CUDA%\'" call uninstall /nointeractive',
-        'wmic product where "name like \'%NVIDIA%\'" call uninstall /nointeractive'
-    ]
-    
-    for cmd in uninstall_commands:
-        print(f"执行命令: {cmd}")
-        returncode, stdout, stderr = run_cmd(cmd)
-        if returncode == 0:
-            print("  命令执行成功")
-        else:
-            print(f"  命令执行失败，错误信息: {stderr}")
-    
-    # 2. 删除CUDA目录
-    cuda_paths = [
-        "C:\\Program Files\\NVIDIA GPU Computing Toolkit\\CUDA",
-        "C:\\CUDA"
-    ]
+    # 1. 首先卸载通过控制面板安装的CUDA组件，再卸载其余NVIDIA组件
+    for keywords in (('CUDA',), ('NVIDIA',)):
+        for product in installed_products(keywords):
+            uninstall_product(product)
     
+    # 2. 删除CUDA目录 (工具包含大量小文件，用线程池并发删除)
+    cuda_paths = [path for path in cuda_removal.cuda_inventory.WINDOWS_BASES if os.path.exists(path)]
     for path in cuda_paths:
-        if os.path.exists(path):
-            print(f"删除CUDA目录: {path}")
-            try:
-                shutil.rmtree(path)
-                print(f"  成功删除目录: {path}")
-            except Exception as e:
-                print(f"  无法删除目录: {path}，错误: {e}")
+        print(f"删除CUDA目录: {path}")
+    entries = [{'path': path, 'aliases': [], 'remove': True} for path in cuda_paths]
+    for path, errors in cuda_removal.execute(entries).items():
+        if errors:
+            print(f"  无法删除目录: {path}，错误: {errors[0][0]}: {errors[0][1]}")
+        else:
+            print(f"  成功删除目录: {path}")
     
     # 3. 清理环境变量
     try:
@@ -272,8 +307,10 @@ if __name__ == "__main__":
     print("CUDA检测与卸载工具")
     print("="*60)
     
-    # 检查管理员权限，如果没有则重新以管理员权限运行
-    if not is_admin():
+    # 检查管理员权限，如果没有则重新以管理员权限运行 (Linux 下只给出 cuda_removal 的用法)
+    if platform.system() != "Windows":
+        uninstall_cuda()
+    elif not is_admin():
         print("脚本需要管理员权限才能完全卸载CUDA组件")
         print("正在请求管理员权限...")
         run_as_admin()